@@ -1,45 +1,60 @@
 import json
 import re
-import subprocess
 import os
 import sys
 import glob
 import time
 from datetime import datetime
-from typing import List, Dict, Any
+import argparse
+from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
-from llama_cpp import Llama
+from token_ledger import TokenLedger
+from context_packer import HistoryStore, ContextPacker
+from tracing import TraceWriter
+from shell_pool import ShellPool, format_result
+from file_window import read_window, format_window
+from model_loader import ModelHandle, StartupProfile, open_model
+from skill_residency import SkillResidency, describe_load
 
 # --- CONFIGURATION ---
 load_dotenv()
 MODEL_PATH = os.getenv("MODEL_PATH")
 N_CTX = 8192
+# Tokens of the prompt (system + skills + packed history); the rest is left for the answer
+CONTEXT_BUDGET = int(os.getenv("CONTEXT_BUDGET", N_CTX - 1536))
 
-if not MODEL_PATH or not os.path.exists(MODEL_PATH):
-    print(f"❌ Error: Model not found at {MODEL_PATH}")
-    print("Please set MODEL_PATH in your .env file.")
-    sys.exit(1)
+def read_skill(name: str) -> Optional[str]:
+    try:
+        with open(f"skills/{name}/SKILL.md", "r", encoding="utf-8") as f: return f.read()
+    except OSError:
+        return None
 
 # --- CORE AGENT ---
 class SkillAgent:
-    def __init__(self, model_path: str, n_ctx: int = 8192):
-        print(f"⏳ Loading model: {os.path.basename(model_path)}...")
-        self.llm = Llama(
-            model_path=model_path,
-            n_ctx=n_ctx,
-            n_gpu_layers=40, # Adjust based on your GPU
-            main_gpu=0,
-            n_threads=8,
-            verbose=False
-        )
-        self.history = []
-        self.loaded_skills = {} # name -> content
+    def __init__(self, model_path: Optional[str] = None, n_ctx: int = 8192, llm: Optional[Any] = None,
+                 profile: Optional[StartupProfile] = None):
+        self.startup = profile or StartupProfile()
+        start = time.perf_counter()
+        # An injected `llm` (e.g. the scripted model in benchmarks/) skips loading a GGUF;
+        # otherwise the GGUF loads in the background while the first prompt waits for input
+        if llm is None: llm = open_model(model_path, n_ctx, self.startup)
+        self.llm = llm
         self.n_ctx = n_ctx
         
         # Tracing Setup
         self.trace_dir = f"traces/{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
         os.makedirs(self.trace_dir, exist_ok=True)
+        self.tracer = TraceWriter(self.trace_dir)
         print(f"🕵️  Tracing enabled. Logs will be saved to: {self.trace_dir}")
+
+        # Full history lives on disk; the packer fits what matters into the budget
+        self.ledger = TokenLedger(self.count_tokens)
+        self.history = HistoryStore(self.ledger, f"{self.trace_dir}/history.jsonl")
+        self.packer = ContextPacker(self.ledger, min(CONTEXT_BUDGET, n_ctx))
+        # Loaded skills stay in the prompt within a token budget (least recently loaded evicted first)
+        self.skills = SkillResidency(self.ledger.count, read_skill)
+        self.shell = ShellPool(size=1)
+        self.startup.record("agent init", start)
     
     # OBSIDIAN_VAULT_PATH needs to be accessible inside run()
     OBSIDIAN_VAULT_PATH = os.getenv("OBSIDIAN_VAULT_PATH", "(Unknown - ask user if needed)")
@@ -48,54 +63,28 @@ class SkillAgent:
         return len(self.llm.tokenize(text.encode("utf-8")))
 
     def get_context_usage(self):
-        # Rough estimation of history + system prompt
-        total_tokens = sum(self.count_tokens(msg["content"]) for msg in self.history)
-        return total_tokens, self.n_ctx
+        # No tokenization or planning: the last plan plus the cached counts of newer messages
+        fixed = self.ledger.segment_total("system") + self.ledger.segment_total("skills")
+        return self.packer.estimate(self.history, fixed), self.n_ctx
 
     def log_trace(self, step_idx: int, event_type: str, payload: Any):
-        """Logs an event to a JSON file for the current step."""
-        filename = f"{self.trace_dir}/step_{step_idx:03d}.jsonl"
-        entry = {
-            "timestamp": datetime.now().isoformat(),
-            "event": event_type,
-            "data": payload
-        }
-        with open(filename, "a", encoding="utf-8") as f:
-            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        """Queues an event for the background trace writer."""
+        self.tracer.log(f"step_{step_idx:03d}", event_type, payload)
 
     # --- TOOLS (Programmatic) ---
     def execute_shell(self, command: str) -> str:
-        """Executes a shell command and returns output."""
+        """Executes a shell command on a warm bash worker and returns its (capped) output."""
         print(f"    > Executing: {command}")
-        try:
-            result = subprocess.run(
-                command, 
-                shell=True, 
-                capture_output=True, 
-                text=True, 
-                timeout=60, # Increased timeout
-                executable="/bin/bash"
-            )
-            output = result.stdout
-            if result.stderr:
-                # Include stderr for debugging but don't fail just because of it (curl -v writes to stderr)
-                output += f"\n[STDERR]\n{result.stderr}"
-            
-            # Check return code
-            if result.returncode != 0:
-                output += f"\n[EXIT CODE] {result.returncode}"
-                
-            return output.strip() or "(No output)"
-        except subprocess.TimeoutExpired:
-            return f"Error: Command timed out after 60s. Command was: {command}"
-        except Exception as e:
-            return f"Error: {str(e)}"
+        result = self.shell.run(command)
+        print(f"    < exit {result['exit_code']} in {result['elapsed_ms']:.0f} ms, {result['bytes']} bytes{' (truncated)' if result['truncated'] else ''}")
+        # stderr is included for debugging but doesn't fail the call (curl -v writes to stderr)
+        return format_result(result, self.shell.max_bytes, self.shell.max_lines, self.shell.timeout)
 
-    def read_file(self, path: str) -> str:
-        """Reads a file from disk."""
+    def read_file(self, path: str, offset: Optional[int] = None, start_line: Optional[int] = None,
+                  end_line: Optional[int] = None, max_bytes: Optional[int] = None) -> str:
+        """Reads a window of a file from disk (a preview for large files)."""
         try:
-            with open(path, "r") as f:
-                return f.read()
+            return format_window(read_window(path, offset, start_line, end_line, max_bytes))
         except Exception as e:
             return f"Error reading file: {str(e)}"
 
@@ -104,15 +93,11 @@ class SkillAgent:
         skills = glob.glob("skills/*/SKILL.md")
         return [p.split("/")[1] for p in skills]
 
-    def load_skill(self, name: str) -> str:
-        """Loads a skill's instructions into the context."""
-        path = f"skills/{name}/SKILL.md"
-        if not os.path.exists(path):
-            return f"Error: Skill '{name}' not found."
-        
-        content = self.read_file(path)
-        self.loaded_skills[name] = content
-        return f"Skill '{name}' loaded successfully. Instructions added to context."
+    def load_skill(self, name: str, section: Optional[str] = None) -> str:
+        """Loads a skill's instructions into the context (large skills by section)."""
+        try: report = self.skills.load("agent", name, section)
+        except FileNotFoundError: return f"Error: Skill '{name}' not found."
+        return f"Skill '{name}' loaded successfully. Instructions added to context. {describe_load(report)}".rstrip()
 
     def get_tools_schema(self):
         """Returns the JSON schema for the core tools."""
@@ -130,11 +115,15 @@ class SkillAgent:
             },
             {
                 "name": "read_file",
-                "description": "Read the content of a file.",
+                "description": "Read a file. Large files return only a header (size, lines, headings) and a preview; pass a window to read other parts.",
                 "input_schema": {
                     "type": "object",
                     "properties": {
-                        "path": {"type": "string", "description": "Path to the file."}
+                        "path": {"type": "string", "description": "Path to the file."},
+                        "start_line": {"type": "integer", "description": "First line to read (1-based)."},
+                        "end_line": {"type": "integer", "description": "Last line to read (inclusive)."},
+                        "offset": {"type": "integer", "description": "Byte offset to start reading from."},
+                        "max_bytes": {"type": "integer", "description": "Maximum bytes to return."}
                     },
                     "required": ["path"]
                 }
@@ -154,7 +143,8 @@ class SkillAgent:
                 "input_schema": {
                     "type": "object",
                     "properties": {
-                        "name": {"type": "string", "description": "The name of the skill (e.g., 'obsidian')."}
+                        "name": {"type": "string", "description": "The name of the skill (e.g., 'obsidian')."},
+                        "section": {"type": "string", "description": "For large skills: part of a heading to load that section."}
                     },
                     "required": ["name"]
                 }
@@ -178,6 +168,7 @@ class SkillAgent:
                     break
                 
                 self.history.append({"role": "user", "content": user_input})
+                self.skills.set_focus("agent", user_input)
                 
                 # 3. Generation Loop (Thought -> Tool -> Answer)
                 step = 0
@@ -187,7 +178,8 @@ class SkillAgent:
                     global_step_counter += 1
                     
                     # Construct System Prompt
-                    skills_text = "\n\n".join([f"--- SKILL: {name} ---\n{content}" for name, content in self.loaded_skills.items()])
+                    skills_text = self.skills.render("agent", label="SKILL")
+                    self.ledger.set_segment("skills", "resident", skills_text)
                     
                     system_prompt = f"""
                     Você é um Assistente Avançado de IA com acesso a ferramentas locais.\n\nVARIÁVEIS DE AMBIENTE:\n- OBSIDIAN_VAULT_PATH: {self.OBSIDIAN_VAULT_PATH}\n\nFERRAMENTAS PRINCIPAIS:\n{json.dumps(self.get_tools_schema(), indent=2)}\n\nSKILLS CARREGADAS:\n{skills_text if skills_text else '(Nenhuma skill carregada. Você não sabe quais capacidades possui até usar list_skills.)'}\n\nINSTRUÇÕES:
@@ -197,12 +189,17 @@ class SkillAgent:
                     - Formato: <tool_call>{{"name": "...", "arguments": {{"arg": "valor"}}}}</tool_call>
                     """
                     
-                    messages = [{"role": "system", "content": system_prompt}] + self.history[-15:] # Keep last 15 messages
+                    # Skills are tracked as their own ledger segments; memoized, so this only tokenizes when the prompt changes
+                    self.ledger.set_segment("system", "prompt", system_prompt.replace(skills_text, "") if skills_text else system_prompt)
+                    fixed = self.ledger.segment_total("system") + self.ledger.segment_total("skills")
+                    messages, usage = self.packer.pack(self.history, system_prompt, fixed)
+                    print(f"📦 Context: system {usage['system']}, skills {usage['skills']}, history {usage['history']}, tools {usage['tool_results']}, summaries {usage['summaries']} ({usage['compacted_messages']} compacted, {usage['dropped_messages']} dropped)")
                     
                     # --- TRACE START: Log Context ---
                     self.log_trace(global_step_counter, "context", {
                         "system_prompt_length": len(system_prompt),
-                        "loaded_skills": list(self.loaded_skills.keys()),
+                        "loaded_skills": self.skills.resident("agent"),
+                        "usage": usage,
                         "messages": messages
                     })
                     
@@ -249,11 +246,11 @@ class SkillAgent:
                             if name == "execute_shell":
                                 result = self.execute_shell(args["command"])
                             elif name == "read_file":
-                                result = self.read_file(args["path"])
+                                result = self.read_file(args["path"], args.get("offset"), args.get("start_line"), args.get("end_line"), args.get("max_bytes"))
                             elif name == "list_skills":
                                 result = str(self.list_skills())
                             elif name == "load_skill":
-                                result = self.load_skill(args["name"])
+                                result = self.load_skill(args["name"], args.get("section"))
                             
                             print(f"⚙️  Result: {result[:200]}..." if len(result) > 200 else f"⚙️  Result: {result}")
                             
@@ -288,5 +285,16 @@ if __name__ == "__main__":
     if not os.getenv("OBSIDIAN_API_TOKEN"):
         print("⚠️  Warning: OBSIDIAN_API_TOKEN not set. Obsidian skill might fail.")
 
-    agent = SkillAgent(model_path=MODEL_PATH, n_ctx=N_CTX)
+    parser = argparse.ArgumentParser(description="Skill-based Obsidian assistant.")
+    parser.add_argument("--startup-profile", action="store_true", help="Print the startup time per phase once the model is ready, then exit.")
+    args = parser.parse_args()
+
+    profile = StartupProfile()
+    agent = SkillAgent(model_path=MODEL_PATH, n_ctx=N_CTX, profile=profile)
+    if args.startup_profile:
+        profile.record("ready for input", profile.started)
+        if isinstance(agent.llm, ModelHandle): agent.llm.get()
+        profile.record("model ready", profile.started)
+        print(profile.report())
+        sys.exit(0)
     agent.run()
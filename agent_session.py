@@ -0,0 +1,73 @@
+import os
+import uuid
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Optional, Callable, Iterator
+
+from token_ledger import TokenLedger
+from context_packer import ContextPacker
+from tracing import TraceWriter
+from skill_residency import SkillResidency
+from result_store import ResultStore
+
+_CURRENT: "contextvars.ContextVar[Optional[AgentSession]]" = contextvars.ContextVar("agent_session", default=None)
+_AGENT: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar("agent_name", default=None)
+
+class AgentSession:
+    """
+    Everything one conversation owns: token ledger and packer, the skills
+    resident in each agent's prompt, large tool results kept out of it, session context ("ARQUIVO ATIVO"), trace
+    directory and I/O hooks. The engine, the model and the tool workers are shared; the
+    session in effect is the one bound with `use_session()` in the current
+    thread (tool threads inherit it, see ToolExecutor).
+    """
+
+    def __init__(self, count_tokens: Callable[[str], int], context_budget: int, fetch_skill: Callable[[str], Optional[str]],
+                 trace_dir: Optional[str] = None, session_id: Optional[str] = None):
+        self.id = session_id or uuid.uuid4().hex[:12]
+        self.trace_dir = trace_dir or f"traces/{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
+        os.makedirs(self.trace_dir, exist_ok=True)
+        self.tracer = TraceWriter(self.trace_dir)
+        self.ledger = TokenLedger(count_tokens)
+        self.packer = ContextPacker(self.ledger, context_budget)
+        self.skills = SkillResidency(self.ledger.count, fetch_skill)
+        self.results = ResultStore(os.path.join(self.trace_dir, "results"))
+        self.session_context: Dict[str, Any] = {
+            "last_accessed_file": None,
+            "last_action": None
+        }
+        self.history_seq = 0
+
+        # I/O hooks: the CLI reads stdin; server.py feeds user messages and listens to events
+        self.input_fn: Optional[Callable[[str], str]] = None
+        self.on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None
+
+    def emit(self, event: str, **data: Any):
+        if self.on_event: self.on_event(event, data)
+
+    def close(self):
+        self.tracer.close()
+
+@contextmanager
+def use_session(session: AgentSession) -> Iterator[AgentSession]:
+    token = _CURRENT.set(session)
+    try:
+        yield session
+    finally:
+        _CURRENT.reset(token)
+
+def current_session() -> Optional[AgentSession]:
+    return _CURRENT.get()
+
+@contextmanager
+def use_agent(name: str) -> Iterator[str]:
+    """Marks the agent whose loop is running (sub-agents nest), e.g. to scope the skills it loads."""
+    token = _AGENT.set(name)
+    try:
+        yield name
+    finally:
+        _AGENT.reset(token)
+
+def current_agent() -> Optional[str]:
+    return _AGENT.get()
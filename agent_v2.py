@@ -1,69 +1,157 @@
 import json
 import re
-import subprocess
 import os
 import sys
-import glob
 import time
-import frontmatter
-from datetime import datetime
+import argparse
 from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
-from llama_cpp import Llama
+from vault_index import VaultIndex, format_results
+from vault_meta import VaultMetaIndex, format_notes, format_note_info
+from prompt_cache import PrefixStateCache, order_segments
+from context_packer import HistoryStore
+from streaming import stream_chat, TerminalEcho, ExpandRefs
+from tool_grammar import build_tool_grammar, ToolCallStats
+from tool_executor import ToolExecutor, is_read_only_command
+from tool_cache import ToolResultCache, CachedResult, VAULT, VAULT_TTL
+from result_store import INLINE_CHARS as RESULT_INLINE_CHARS
+from obsidian_api import ObsidianClient, WRITE_OPERATIONS, call_operation, format_response
+from skill_catalog import SkillCatalog
+from agent_session import AgentSession, current_session, current_agent, use_agent
+from skill_residency import describe_load
+from shell_pool import ShellPool, format_result
+from file_window import read_window, format_window
+from note_edit import apply_edit, atomic_write
+from model_loader import ModelHandle, StartupProfile, open_model
+from model_pool import ModelPool
 
 # --- CONFIGURATION ---
 load_dotenv()
 MODEL_PATH = os.getenv("MODEL_PATH")
 N_CTX = 8192
-
-if not MODEL_PATH or not os.path.exists(MODEL_PATH):
-    print(f"❌ Error: Model not found at {MODEL_PATH}")
-    print("Please set MODEL_PATH in your .env file.")
-    sys.exit(1)
+# Tokens of the prompt (system + skills + packed history); the rest is left for the answer
+CONTEXT_BUDGET = int(os.getenv("CONTEXT_BUDGET", N_CTX - 1536))
+# Stream tokens and cancel decoding once a tool call is complete
+STREAM_GENERATION = os.getenv("STREAM_GENERATION", "1") != "0"
+# Constrain tool calls with a GBNF grammar built from each agent's allowed tools
+TOOL_GRAMMAR = os.getenv("TOOL_GRAMMAR", "0") == "1"
+
+# Idempotent tools answered from the tool cache, by what their results depend on
+# (read_file is cached inside the tool, keyed by the file's mtime/size)
+CACHED_TOOLS = {
+    "list_agents": "catalog", "get_agent_info": "catalog", "search_skills": "catalog", "list_skills_page": "catalog",
+    "search_vault": "vault", "semantic_search": "vault", "find_notes": "vault", "note_info": "vault", "list_tags": "vault",
+}
+CACHED_TIMING_RE = re.compile(r"\(\d+ ms\)")  # "(12 ms)" in a vault query's header
 
 # --- UTILS ---
+# Skills and agents parsed once; entries are refreshed only when their mtime changes
+CATALOG = SkillCatalog()
+
 def load_agent_config(agent_name: str) -> Dict[str, Any]:
-    path = f"agents/{agent_name.lower()}.md"
-    if not os.path.exists(path):
-        raise ValueError(f"Agent '{agent_name}' not found at {path}")
-    post = frontmatter.load(path)
+    entry = CATALOG.agent(agent_name)
+    if entry is None:
+        raise ValueError(f"Agent '{agent_name}' not found at agents/{agent_name.lower()}.md")
     return {
-        "name": post.metadata.get("name", agent_name),
-        "description": post.metadata.get("description", ""),
-        "model": post.metadata.get("model", "default"),
-        "allowed_tools": post.metadata.get("tools", []),
-        "system_prompt": post.content
+        "name": entry["name"],
+        "description": entry["description"],
+        "model": entry["model"],
+        "allowed_tools": entry["tools"],
+        "system_prompt": entry["body"]
     }
 
+def skill_content(path: str) -> Optional[str]:
+    entry = CATALOG.skill(path) if path.startswith("skills/") else None
+    return entry["content"] if entry else None
+
 # --- ENGINE ---
+def _session_attr(name: str) -> property:
+    """Engine attribute that resolves to the current session's."""
+    return property(lambda self: getattr(self.session, name))
+
 class AgentEngine:
-    def __init__(self, model_path: str, n_ctx: int = 8192):
-        print(f"⏳ Loading model: {os.path.basename(model_path)}...")
-        self.llm = Llama(
-            model_path=model_path,
-            n_ctx=n_ctx,
-            n_gpu_layers=40,
-            main_gpu=0,
-            n_threads=8,
-            verbose=False
-        )
+    def __init__(self, model_path: Optional[str] = None, n_ctx: int = 8192, llm: Optional[Any] = None,
+                 prompt_cache: Optional[PrefixStateCache] = None, trace_dir: Optional[str] = None,
+                 profile: Optional[StartupProfile] = None):
+        self.startup = profile or StartupProfile()
+        start = time.perf_counter()
+        # An injected `llm` (e.g. the scripted model in benchmarks/, or one shared by server.py) skips loading a GGUF;
+        # otherwise the GGUF loads in the background and the first step waits for it
+        if llm is None: llm = open_model(model_path, n_ctx, self.startup)
+        self.llm = llm
         self.n_ctx = n_ctx
-        self.trace_dir = f"traces/{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
-        os.makedirs(self.trace_dir, exist_ok=True)
-        print(f"🕵️  Tracing enabled. Logs: {self.trace_dir}")
-        self.loaded_skills_content = {}
-        
-        # Session Context (Shared Memory)
-        self.session_context = {
-            "last_accessed_file": None,
-            "last_action": None
-        }
+        self.context_budget = min(CONTEXT_BUDGET, n_ctx)
+        self._static_prompts = {}
+        self._grammars = {}
+        self.tool_stats = ToolCallStats()
+        self.tool_executor = ToolExecutor(max_workers=int(os.getenv("TOOL_WORKERS", "4")))
+        self.shell = ShellPool(size=int(os.getenv("SHELL_WORKERS", os.getenv("TOOL_WORKERS", "4"))))
+        # Shared by the brain and its sub-agents: repeated lookups are served without touching disk or indexes
+        self.tool_cache = ToolResultCache()
+
+        # KV prefix cache: state snapshots shared across steps and sub-agents
+        self.prompt_cache = prompt_cache
+        if prompt_cache is None and os.getenv("PROMPT_CACHE", "1") != "0":
+            self.prompt_cache = self._new_prompt_cache(model_path or "injected")
+            self.prompt_cache.attach(self.llm)
+        # Agents whose `model:` names another GGUF (MODEL_PATH_<NAME>) run on it; the rest on self.llm
+        cache_factory = self._new_prompt_cache if os.getenv("PROMPT_CACHE", "1") != "0" else None
+        self.models = ModelPool(self.llm, n_ctx, default_path=model_path, default_cache=self.prompt_cache, cache_factory=cache_factory)
+        self.vault_index = None
+        self.vault_meta = None
+        self.vault_semantic = None
+        self.obsidian = ObsidianClient()
+        with self.startup.phase("skill catalog"):
+            print(f"📚 Catalog: {CATALOG.refresh(force=True)} skill/agent files indexed.")
+
+        # Conversation state (history, skills, ARQUIVO ATIVO, traces) lives in sessions;
+        # the CLI and the benchmarks run in the default one
+        self.default_session = self.new_session(trace_dir)
+        self.startup.record("engine init", start)
+
+    @staticmethod
+    def _new_prompt_cache(model_path: str) -> PrefixStateCache:
+        return PrefixStateCache(
+            capacity_bytes=int(os.getenv("PROMPT_CACHE_RAM_MB", "2048")) << 20,
+            disk_dir=os.path.join(os.getenv("PROMPT_CACHE_DIR", ".cache/kv"), os.path.basename(model_path)),
+            disk_capacity_bytes=int(os.getenv("PROMPT_CACHE_DISK_MB", "8192")) << 20,
+        )
+
+    # --- SESSIONS ---
+    def new_session(self, trace_dir: Optional[str] = None, session_id: Optional[str] = None) -> AgentSession:
+        session = AgentSession(self.count_tokens, self.context_budget, skill_content, trace_dir, session_id)
+        print(f"🕵️  Tracing enabled. Logs: {session.trace_dir} (compression: {session.tracer.compression})")
+        return session
+
+    @property
+    def session(self) -> AgentSession:
+        """The session bound to this thread by `use_session()`, else the default one."""
+        return current_session() or self.default_session
+
+    ledger = _session_attr("ledger")
+    packer = _session_attr("packer")
+    tracer = _session_attr("tracer")
+    trace_dir = _session_attr("trace_dir")
+    skills = _session_attr("skills")
+    results = _session_attr("results")
+    session_context = _session_attr("session_context")
+
+    def emit(self, event: str, **data: Any):
+        self.session.emit(event, **data)
+
+    def close(self):
+        """Releases the engine's workers (the model is left to its owner)."""
+        self.tool_executor.shutdown()
+        self.tool_stats.close()
+        self.shell.close()
+        self.default_session.close()
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.llm.tokenize(text.encode("utf-8"), add_bos=False))
 
     def log_trace(self, step_id: str, event_type: str, payload: Any):
-        filename = f"{self.trace_dir}/{step_id}.jsonl"
-        entry = {"ts": datetime.now().isoformat(), "event": event_type, "data": payload}
-        with open(filename, "a", encoding="utf-8") as f:
-            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        # Written in the background; repeated prompt segments are stored once (see tracing.py)
+        self.tracer.log(step_id, event_type, payload)
 
     # --- UTILS ---
     def _resolve_path(self, path: str) -> str:
@@ -71,83 +159,136 @@ class AgentEngine:
         return os.path.expanduser(os.path.expandvars(path))
 
     # --- CORE TOOLS IMPLEMENTATION ---
-    def execute_shell(self, command: str) -> str:
+    def execute_shell(self, command: str, trace_id: Optional[str] = None) -> str:
         print(f"    > Shell: {command}")
-        try:
-            # Pass current environment (with loaded .env vars) to subprocess
-            result = subprocess.run(
-                command, 
-                shell=True, 
-                capture_output=True, 
-                text=True, 
-                timeout=60, 
-                executable="/bin/bash",
-                env=os.environ.copy()
-            )
-            output = result.stdout + (f"\n[STDERR] {result.stderr}" if result.stderr else "")
-            if result.returncode != 0: output += f"\n[EXIT CODE] {result.returncode}"
-            return output.strip() or "(No output)"
-        except Exception as e: return f"Error: {str(e)}"
-
-    def read_file(self, path: str) -> str:
+        # Warm bash workers (started after load_dotenv, so they see the .env vars); output is capped
+        result = self.shell.run(command)
+        if not is_read_only_command(command): self.tool_cache.invalidate()
+        print(f"    < exit {result['exit_code']} in {result['elapsed_ms']:.0f} ms, {result['bytes']} bytes{' (truncated)' if result['truncated'] else ''}{' (timeout)' if result['timed_out'] else ''}")
+        if trace_id: self.log_trace(trace_id, "shell", {"command": command, **{k: v for k, v in result.items() if k not in ("stdout", "stderr")}})
+        return format_result(result, self.shell.max_bytes, self.shell.max_lines, self.shell.timeout)
+
+    def read_file(self, path: str, offset: Optional[int] = None, start_line: Optional[int] = None,
+                  end_line: Optional[int] = None, max_bytes: Optional[int] = None) -> str:
         path = self._resolve_path(path)
         try:
             # Update Session Context
             self.session_context["last_accessed_file"] = path
             self.session_context["last_action"] = "read"
-            
-            with open(path, "r") as f: 
-                content = f.read()
-                return f"[METADATA] Source: {path}\n[CONTENT]\n{content}"
-        except Exception as e: return f"Error: {str(e)}"        
 
-    def write_file(self, path: str, content: str) -> str:
+            # Large files are memory-mapped and only previewed unless a window is requested
+            return self.tool_cache.call("read_file", (path, offset, start_line, end_line, max_bytes),
+                                        lambda: format_window(read_window(path, offset, start_line, end_line, max_bytes)), paths=[path])
+        except Exception as e: return f"Error: {str(e)}"
+
+    def write_file(self, path: str, content: str, expected_version: Optional[str] = None) -> str:
         path = self._resolve_path(path)
         try:
             # Update Session Context
             self.session_context["last_accessed_file"] = path
             self.session_context["last_action"] = "write"
             
-            with open(path, "w") as f: f.write(content)
+            atomic_write(path, content, expected_version)
+            self.tool_cache.invalidate(path)
             return f"Successfully wrote to {path}"
         except Exception as e: return f"Error: {str(e)}"
 
-    def edit_file(self, path: str, operation: str, text: str, target_text: str = None) -> str:
+    def edit_file(self, path: str, operation: str, text: str, target_text: str = None, heading: str = None,
+                  block_id: str = None, max_replacements: Optional[int] = None, expected_version: Optional[str] = None) -> str:
         path = self._resolve_path(path)
         try:
-            if not os.path.exists(path): return f"Error: File {path} not found."
-            
-            with open(path, "r") as f: content = f.read()
-            
-            if operation == "append":
-                new_content = content + "\n" + text
-            elif operation == "replace":
-                if not target_text: return "Error: 'target_text' is required for replace operation."
-                if target_text not in content: return "Error: 'target_text' not found in file."
-                new_content = content.replace(target_text, text)
-            else:
-                return "Error: Invalid operation. Use 'append' or 'replace'."
-            
-            with open(path, "w") as f: f.write(new_content)
-            
+            # Streaming, atomic edits; heading/block operations avoid echoing large target_text
+            stats = apply_edit(path, operation, text, target_text, heading, block_id, max_replacements, expected_version)
+            self.tool_cache.invalidate(path)
+
             self.session_context["last_accessed_file"] = path
             self.session_context["last_action"] = "edit"
-            return f"Successfully edited {path} (mode: {operation})"
+            detail = f", {stats['replaced']} de {stats['occurrences']} ocorrência(s)" if operation == "replace" else ""
+            return f"Successfully edited {path} (mode: {operation}{detail}; versão {stats['version']})"
+        except Exception as e: return f"Error: {str(e)}"
+
+    def search_vault(self, query: str, limit: int = 10) -> str:
+        vault_path = os.getenv("OBSIDIAN_VAULT_PATH")
+        if not vault_path or not os.path.isdir(os.path.expanduser(vault_path)):
+            return "Error: OBSIDIAN_VAULT_PATH não configurado ou inexistente."
+        try:
+            if self.vault_index is None:
+                self.vault_index = VaultIndex(vault_path, index_path=os.getenv("VAULT_INDEX_PATH", ".cache/vault_index.sqlite"))
+            start = time.perf_counter()
+            results = self.vault_index.search(query, limit=max(1, min(int(limit), 50)))
+            return format_results(query, results, (time.perf_counter() - start) * 1000)
+        except Exception as e: return f"Error: {str(e)}"
+
+    def semantic_search(self, query: str, limit: int = 10) -> str:
+        vault_path = os.getenv("OBSIDIAN_VAULT_PATH")
+        if not vault_path or not os.path.isdir(os.path.expanduser(vault_path)):
+            return "Error: OBSIDIAN_VAULT_PATH não configurado ou inexistente."
+        try:
+            # numpy comes in with the semantic index, only once the tool is used
+            from vault_semantic import SemanticIndex, format_results as format_semantic_results
+            if self.vault_semantic is None:
+                self.vault_semantic = SemanticIndex(vault_path, index_dir=os.getenv("EMBED_INDEX_DIR", ".cache/vault_embeddings"))
+            start = time.perf_counter()
+            results = self.vault_semantic.search(query, limit=max(1, min(int(limit), 50)))
+            text = format_semantic_results(query, results, (time.perf_counter() - start) * 1000)
+            if self.vault_semantic.indexing:
+                text += f"\n(Índice semântico em construção: {self.vault_semantic.stats()['notes']} nota(s) indexadas até agora; resultados parciais.)"
+            return text
+        except Exception as e: return f"Error: {str(e)}"
+
+    def _meta_index(self) -> VaultMetaIndex:
+        vault_path = os.getenv("OBSIDIAN_VAULT_PATH")
+        if not vault_path or not os.path.isdir(os.path.expanduser(vault_path)):
+            raise ValueError("OBSIDIAN_VAULT_PATH não configurado ou inexistente.")
+        if self.vault_meta is None:
+            self.vault_meta = VaultMetaIndex(vault_path, index_path=os.getenv("VAULT_META_PATH", ".cache/vault_meta.sqlite"))
+        return self.vault_meta
+
+    def find_notes(self, tag: str = None, links_to: str = None, linked_from: str = None, modified_within_days: float = None,
+                   modified_after: str = None, property: str = None, folder: str = None, title: str = None, limit: int = 20) -> str:
+        try:
+            index = self._meta_index()
+            start = time.perf_counter()
+            result = index.find(tag=tag, links_to=links_to, linked_from=linked_from, modified_within_days=modified_within_days,
+                                modified_after=modified_after, prop=property, folder=folder, title=title, limit=max(1, min(int(limit), 100)))
+            return format_notes(result, (time.perf_counter() - start) * 1000)
+        except Exception as e: return f"Error: {str(e)}"
+
+    def note_info(self, note: str) -> str:
+        try:
+            return format_note_info(self._meta_index().note_info(note), note)
+        except Exception as e: return f"Error: {str(e)}"
+
+    def list_tags(self, prefix: str = None, limit: int = 50) -> str:
+        try:
+            tags = self._meta_index().tags(prefix, limit=max(1, min(int(limit), 500)))
+            return "\n".join(f"#{tag} ({count})" for tag, count in tags) or "Nenhuma tag encontrada."
+        except Exception as e: return f"Error: {str(e)}"
+
+    def obsidian_api(self, operation: str, path: str = "", content: str = "", period: str = "daily", command_id: str = "") -> str:
+        try:
+            data = call_operation(self.obsidian, operation, path=path, content=content, period=period, command_id=command_id)
+            if operation in ("put", "append"):
+                vault_path = os.getenv("OBSIDIAN_VAULT_PATH")
+                self.tool_cache.invalidate(os.path.join(self._resolve_path(vault_path), path) if vault_path else None)
+            elif operation in WRITE_OPERATIONS:
+                # Opening a note or running an Obsidian command may change any note (templates, plugins)
+                self.tool_cache.invalidate()
+            if path and operation in ("read", "put", "append"):
+                self.session_context["last_accessed_file"] = path
+                self.session_context["last_action"] = {"read": "read", "put": "write", "append": "edit"}[operation]
+            return format_response(data)
         except Exception as e: return f"Error: {str(e)}"
 
     def list_agents(self) -> str:
         agents = []
-        for f in glob.glob("agents/*.md"):
-            try:
-                data = frontmatter.load(f)
-                name = data.metadata.get("name", os.path.basename(f).replace(".md", ""))
-                # Filter out 'brain' to prevent self-delegation
-                if name.lower() != "brain":
-                    agents.append({
-                        "name": name,
-                        "description": data.metadata.get("description", "No description")
-                    })
-            except: continue
+        for entry in CATALOG.agents():
+            # Filter out 'brain' to prevent self-delegation
+            if entry["name"].lower() != "brain":
+                agents.append({
+                    "name": entry["name"],
+                    "description": entry["description"] or "No description"
+                })
         return json.dumps(agents, indent=2)
 
     def get_agent_info(self, agent_name: str) -> str:
@@ -160,98 +301,69 @@ class AgentEngine:
             }, indent=2)
         except Exception as e: return f"Error: {str(e)}"
 
-    def search_skills(self, query: str) -> str:
-        results = []
-        # Tokenize query: split by spaces, lowercase, ignore short words (<3 chars)
-        query_tokens = [t for t in query.lower().split() if len(t) > 2]
-        
-        if not query_tokens:
+    def search_skills(self, query: str, limit: int = 5) -> str:
+        # Ignore short words (<3 chars), as before
+        if not [t for t in query.lower().split() if len(t) > 2]:
             return "Query muito curta ou vazia."
 
-        # Search recursively in all .md files within skills/
-        for filepath in glob.glob("skills/**/*.md", recursive=True):
-            try:
-                with open(filepath, "r", encoding="utf-8") as f:
-                    # Read first 1000 chars for header matching
-                    header = f.read(1000)
-                
-                # Check match: if ANY token is in filepath OR header
-                target_text = (filepath + " " + header).lower()
-                if any(token in target_text for token in query_tokens):
-                    # Extract description from frontmatter if available
-                    desc = "No description"
-                    match = re.search(r"description:\s*(.+)", header, re.IGNORECASE)
-                    if match:
-                        desc = match.group(1).strip()
-                    
-                    results.append(f"- Path: {filepath}\n  Description: {desc}")
-            except Exception: continue
-            
+        results = CATALOG.search(query, limit=max(1, min(int(limit), 20)))
         if not results:
             return "Nenhuma skill encontrada para esses termos."
-        return "\n".join(results)
+        return "\n".join(f"- Path: {e['path']} (score {score})\n  Description: {e['description']}" for e, score in results)
 
     def list_skills_page(self, page: int = 1) -> str:
         # Group by directory
-        skill_dirs = sorted(glob.glob("skills/*/"))
-        total_skills = len(skill_dirs)
+        packages = CATALOG.skill_packages()
+        total_skills = len(packages)
         
         if total_skills == 0: return "Nenhuma skill encontrada."
         
         PAGE_SIZE = 5
         start_idx = (page - 1) * PAGE_SIZE
         end_idx = start_idx + PAGE_SIZE
-        current_batch = skill_dirs[start_idx:end_idx]
+        current_batch = packages[start_idx:end_idx]
         
         if not current_batch: return f"Página {page} vazia. Total de skills: {total_skills}."
         
         results = []
-        for d in current_batch:
-            skill_name = os.path.basename(os.path.normpath(d)).upper()
-            
-            # Get main description
-            desc = "Conjunto de ferramentas."
-            for index_file in ["_index.md", "SKILL.md"]:
-                if os.path.exists(os.path.join(d, index_file)):
-                    try:
-                        data = frontmatter.load(os.path.join(d, index_file))
-                        desc = data.metadata.get("description", desc)
-                        break
-                    except: continue
-            
+        for pkg in current_batch:
+            desc = pkg["description"] or "Conjunto de ferramentas."
             # List sub-files with full relative paths
-            sub_files = [f for f in glob.glob(f"{d}/*.md") if not f.endswith("_index.md") and not f.endswith("SKILL.md")]
-            sub_list = "\n   - ".join(sub_files) if sub_files else "   (Nenhum arquivo extra)"
-            
-            results.append(f"📦 {skill_name}: {desc}\n   - {sub_list}")
+            sub_list = "\n   - ".join(pkg["files"]) if pkg["files"] else "   (Nenhum arquivo extra)"
+            results.append(f"📦 {pkg['name'].upper()}: {desc}\n   - {sub_list}")
             
         footer = f"\n[Página {page} de {((total_skills - 1) // PAGE_SIZE) + 1}. Total: {total_skills} skills]"
         return "\n".join(results) + footer
 
-    def load_skill(self, path: str) -> str:
-        if not os.path.exists(path) or not path.startswith("skills/"):
-            return "Error: Invalid skill path or file not found."
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                content = f.read()
-                # Use path as key to allow multiple files from same skill package
-                self.loaded_skills_content[path] = content
-                return f"Skill instructions from '{path}' loaded."
-        except Exception as e: return f"Error: {str(e)}"
+    def load_skill(self, path: str, section: Optional[str] = None) -> str:
+        # Resident in the calling agent's prompt only, within the skill token budget (see skill_residency.py)
+        try: report = self.skills.load(current_agent() or "brain", path, section)
+        except FileNotFoundError: return "Error: Invalid skill path or file not found."
+        return f"Skill instructions from '{path}' loaded. {describe_load(report)}".rstrip()
 
     # --- AGENT RUNTIME ---
     def run_agent(self, agent_name: str, initial_task: str, context: str = None, parent_trace_id: str = "root") -> str:
+        # Tool calls (and their worker threads) know which agent made them
+        with use_agent(agent_name):
+            return self._agent_loop(agent_name, initial_task, context, parent_trace_id)
+
+    def _agent_loop(self, agent_name: str, initial_task: str, context: str, parent_trace_id: str) -> str:
         try:
             config = load_agent_config(agent_name)
         except Exception as e: return f"Failed to load agent {agent_name}: {e}"
 
         print(f"\n🤖 Activating Agent: {agent_name.upper()}")
-        history = []
+        self.emit("agent", name=agent_name, parent=parent_trace_id)
+        # Full history goes to disk; only what fits the budget is sent to the model
+        session = self.session
+        session.history_seq += 1
+        history = HistoryStore(session.ledger, f"{session.trace_dir}/history/{session.history_seq:03d}_{parent_trace_id}_{agent_name}.jsonl")
         
         if initial_task:
             content = initial_task
             if context: content += f"\n\n--- CONTEXTO ---\n{context}"
             history.append({"role": "user", "content": content})
+            session.skills.set_focus(agent_name, content)
 
         step_counter = 0
         
@@ -259,28 +371,218 @@ class AgentEngine:
             if initial_task and step_counter == 0: pass
             elif len(history) == 0 or history[-1]["role"] == "assistant":
                 try:
-                    user_input = input(f"👤 {agent_name} > ")
+                    user_input = (session.input_fn or input)(f"👤 {agent_name} > ")
                     if user_input.lower() in ["exit", "quit"]: return "User terminated."
                     history.append({"role": "user", "content": user_input})
+                    session.skills.set_focus(agent_name, user_input)
                 except EOFError: return "Session ended."
 
-            allowed_tools = config["allowed_tools"]
-            tools_schema = self._get_tools_schema(allowed_tools)
-            formatted_tools = self._format_tools_display(tools_schema)
+            system_prompt = self._build_system_prompt(agent_name, config)
+            fixed = self.ledger.segment_total("system") + self.ledger.segment_total("skills")
+            messages, usage = self.packer.pack(history, system_prompt, fixed)
+            current_trace_id = f"{parent_trace_id}_{agent_name}_{step_counter}"
+            self.log_trace(current_trace_id, "input", messages)
+            print(f"🧠 Context: {usage['total']}/{self.n_ctx} tokens | system {usage['system']}, skills {usage['skills']}, history {usage['history']}, tools {usage['tool_results']}, summaries {usage['summaries']} ({usage['compacted_messages']} compacted, {usage['dropped_messages']} dropped)")
+            self.log_trace(current_trace_id, "context_usage", usage)
+            skill_stats = session.skills.stats(agent_name)
+            if skill_stats["resident"] or skill_stats["evicted"]:
+                print(f"📚 Skills ({agent_name}): {len(skill_stats['resident'])} resident ({len(skill_stats['sectioned'])} by section), {len(skill_stats['evicted'])} evicted | {skill_stats['tokens']}/{skill_stats['budget']} tokens")
+            self.log_trace(current_trace_id, "skills", skill_stats)
+
+            print(f"⚡ {agent_name} thinking...")
+            # Interactive sessions (no initial task) see the answer token by token, unless someone listens to events
+            echo = TerminalEcho(prefix=f"🤖 {agent_name}: ", expand=self._show_refs) if initial_task is None and session.on_event is None else None
+            grammar = self._tool_grammar(agent_name, config["allowed_tools"])
+            model = self.models.resolve(config["model"])
+            response_text, gen_stats = self._generate(messages, echo, grammar, agent_name, model)
+            gen_stats["model"] = model
+            self.models.record(model, gen_stats)
+            draft = self.models.draft(model)
+            if draft is not None:
+                spec = gen_stats["speculative"] = draft.step(agent_name, gen_stats)
+                if spec["proposed"]:
+                    print(f"🔮 Speculative ({draft.mode}): {spec['accepted']}/{spec['proposed']} draft tokens accepted ({spec['acceptance']:.0%}), {spec['tokens_per_pass']} tokens/pass, ~+{spec['modelled_tokens_per_s_gained']} tok/s (modelled)")
+            history.append({"role": "assistant", "content": response_text})
+            self.log_trace(current_trace_id, "output", response_text)
+            self.log_trace(current_trace_id, "generation", gen_stats)
+            self.emit("generation", agent=agent_name, **gen_stats)
+            prompt_cache = self.models.prompt_cache(model)
+            if prompt_cache:
+                cache_report = prompt_cache.report()
+                print(f"♻️  Prefix cache: {cache_report.get('reused_tokens', 0)}/{cache_report.get('prompt_tokens', 0)} tokens reused ({cache_report.get('source', '-')}, hit ratio {cache_report['hit_ratio']:.0%})")
+                self.log_trace(current_trace_id, "prompt_cache", cache_report)
+
+            tool_blocks = re.findall(r"<tool_call>(.*?)</tool_call>", response_text, re.DOTALL)
             
-            # Format loaded skills showing origin file
-            skills_text = ""
-            if self.loaded_skills_content:
-                skills_text = "\n\n".join([f"--- SKILL FILE: {p} ---\n{c}" for p, c in self.loaded_skills_content.items()])
-            else:
-                skills_text = "(Nenhuma skill carregada. Use search_skills se precisar.)"
+            if tool_blocks:
+                # Parse every call of the turn; malformed ones become Tool Error entries
+                parsed, calls = [], []
+                for block in tool_blocks:
+                    tool_json = block.strip()
+                    if tool_json.startswith("```"): tool_json = tool_json.split("\n", 1)[1].rsplit("\n", 1)[0]
+                    try:
+                        tool_call = json.loads(tool_json)
+                        call = (tool_call["name"], tool_call.get("arguments", {}))
+                        print(f"🛠️  {agent_name} calls {call[0]} with {json.dumps(call[1])}")
+                        self.emit("tool_call", agent=agent_name, name=call[0], arguments=call[1])
+                        parsed.append(len(calls))
+                        calls.append(call)
+                    except Exception as e:
+                        parsed.append(f"Tool Error: {str(e)}")
+
+                # Read-only calls run concurrently; writes and delegations stay serialized
+                outcomes = self.tool_executor.run(calls, lambda n, a: self._dispatch_tool(n, a, current_trace_id))
+
+                # Prefix Agent Name for Clarity
+                result_prefix = f"[AGENTE: {agent_name.upper()}] " if agent_name != "brain" else ""
+                entries = []
+                for item in parsed:
+                    if isinstance(item, str):
+                        entries.append(item)
+                        self.tool_stats.record(grammar is not None, valid=False)
+                        continue
+                    t_name, outcome = calls[item][0], outcomes[item]
+                    result = outcome["result"]
+
+                    # Results go to the session's result store: the handle lets answers cite them ({{@rN}});
+                    # large ones stay there and the model sees a preview
+                    handle = None
+                    if t_name != "fetch_result" and not result.startswith(("Error", "Tool Error")):
+                        handle = self.results.put(t_name, result)
+                    if handle and len(result) > RESULT_INLINE_CHARS:
+                        full_chars, result = len(result), self.results.preview(handle, result)
+                        outcome = {**outcome, "result": result, "handle": handle}
+                        print(f"📦 Stored {t_name} result as {handle} ({full_chars} chars, {len(result)} in context)")
+                        self.log_trace(current_trace_id, "result_store", {"tool": t_name, "handle": handle, "chars": full_chars, "preview_chars": len(result)})
+
+                    # CLI Display Logic
+                    display_result = result
+                    if t_name == "delegate_to_agent" and len(result) > 200:
+                         display_result = result[:200] + "... (truncated)"
+                    print(f"   -> Result ({t_name}, {outcome['elapsed_ms']:.0f} ms{', concurrent' if outcome.get('concurrent') else ''}{', cached' if outcome.get('cached') else ''}): {display_result}")
+
+                    self.emit("tool_result", agent=agent_name, name=t_name, elapsed_ms=outcome["elapsed_ms"], ok=outcome["ok"], result=result, handle=handle)
+                    entries.append(result if result.startswith("Tool Error") else f"TOOL RESULT ({t_name}{', ' + handle if handle else ''}): {result_prefix}{result}")
+                    self.log_trace(current_trace_id, "tool_result", {"tool": t_name, **outcome})
+                    self.tool_stats.record(grammar is not None, valid=outcome["ok"] and result != "Tool unknown.")
+
+                # All results of the turn go back in one message
+                history.append({"role": "user", "content": "\n\n".join(entries)})
+
+                call_stats = self.tool_stats.summary()
+                if grammar is not None:
+                    print(f"🧩 Grammar: {call_stats['constrained']['calls']} constrained calls, ~{call_stats['retries_saved']:.1f} retry steps saved")
+                self.log_trace(current_trace_id, "tool_call_stats", call_stats)
+                cache_stats = self.tool_cache.stats()
+                if cache_stats["hits"]:
+                    print(f"🗃️  Tool cache: {cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']} lookups served from cache ({cache_stats['hit_ratio']:.0%})")
+                self.log_trace(current_trace_id, "tool_cache", cache_stats)
             
-            # INJECT SESSION CONTEXT INTO SYSTEM PROMPT
-            session_info = ""
-            if self.session_context["last_accessed_file"]:
-                session_info = f"\nARQUIVO ATIVO: {self.session_context['last_accessed_file']}"
+            else:
+                # References to earlier results are expanded here, so they are never decoded twice
+                clean_res = re.sub(r"<think>.*?</think>", "", response_text, flags=re.DOTALL).strip()
+                expansions = self.results.totals["expanded_chars"]
+                clean_res = self.results.expand(clean_res)
+                expanded = self.results.totals["expanded_chars"] - expansions
+                if expanded:
+                    print(f"📎 {agent_name}: {expanded} chars passed through from stored results ({gen_stats['decode_tokens']} tokens decoded)")
+                    self.log_trace(current_trace_id, "passthrough", {"expanded_chars": expanded, "decode_tokens": gen_stats["decode_tokens"]})
+                self.emit("answer", agent=agent_name, content=clean_res, final=not initial_task)
+                if initial_task: return clean_res
+                if not (echo and echo.printed): print(f"🤖 {agent_name}: {clean_res}")
 
-            system_prompt = f"""{config['system_prompt']}
+            step_counter += 1
+            if step_counter > 15: return "Error: Max steps reached."
+
+    def _dispatch_tool(self, t_name: str, t_args: Dict[str, Any], trace_id: str) -> str:
+        depends = CACHED_TOOLS.get(t_name)
+        if depends is None: return self._run_tool(t_name, t_args, trace_id)
+        key = json.dumps(t_args, sort_keys=True, ensure_ascii=False, default=str)
+        compute = lambda: self._run_tool(t_name, t_args, trace_id)
+        if depends == "catalog":
+            CATALOG.refresh()
+            return self.tool_cache.call(t_name, key, compute, version=CATALOG.generation)
+        # Semantic results are partial while its index builds; every batch it embeds makes them stale
+        version = self.vault_semantic.rows if t_name == "semantic_search" and self.vault_semantic else None
+        result = self.tool_cache.call(t_name, key, compute, version=version, depends=(VAULT,), ttl=VAULT_TTL)
+        # Vault queries state their run time in the header; a hit did not take it
+        return CachedResult(CACHED_TIMING_RE.sub("(cache)", result, count=1)) if getattr(result, "cached", False) else result
+
+    def _run_tool(self, t_name: str, t_args: Dict[str, Any], trace_id: str) -> str:
+        # Routing Logic (Simplified)
+        if t_name == "delegate_to_agent": return self.run_agent(t_args.get("name"), t_args.get("task"), t_args.get("context"), trace_id)
+        elif t_name == "execute_shell": return self.execute_shell(t_args["command"], trace_id)
+        elif t_name == "read_file": return self.read_file(t_args["path"], t_args.get("offset"), t_args.get("start_line"), t_args.get("end_line"), t_args.get("max_bytes"))
+        elif t_name == "write_file": return self.write_file(t_args["path"], t_args["content"], t_args.get("expected_version"))
+        elif t_name == "edit_file": return self.edit_file(
+            t_args["path"], t_args["operation"], t_args["text"], t_args.get("target_text"), t_args.get("heading"),
+            t_args.get("block_id"), t_args.get("max_replacements"), t_args.get("expected_version"))
+        elif t_name == "obsidian_api": return self.obsidian_api(t_args["operation"], t_args.get("path", ""), t_args.get("content", ""), t_args.get("period", "daily"), t_args.get("command_id", ""))
+        elif t_name == "search_vault": return self.search_vault(t_args["query"], t_args.get("limit", 10))
+        elif t_name == "semantic_search": return self.semantic_search(t_args["query"], t_args.get("limit", 10))
+        elif t_name == "find_notes": return self.find_notes(
+            t_args.get("tag"), t_args.get("links_to"), t_args.get("linked_from"), t_args.get("modified_within_days"),
+            t_args.get("modified_after"), t_args.get("property"), t_args.get("folder"), t_args.get("title"), t_args.get("limit", 20))
+        elif t_name == "note_info": return self.note_info(t_args["note"])
+        elif t_name == "list_tags": return self.list_tags(t_args.get("prefix"), t_args.get("limit", 50))
+        elif t_name == "list_agents": return self.list_agents()
+        elif t_name == "get_agent_info": return self.get_agent_info(t_args["name"])
+        elif t_name == "search_skills": return self.search_skills(t_args["query"], t_args.get("limit", 5))
+        elif t_name == "list_skills_page": return self.list_skills_page(t_args.get("page", 1))
+        elif t_name == "load_skill": return self.load_skill(t_args["path"], t_args.get("section"))
+        elif t_name == "fetch_result": return self.results.fetch(t_args["handle"], t_args.get("start_line"), t_args.get("end_line"), t_args.get("pattern"), t_args.get("context", 0))
+        return "Tool unknown."
+
+    def _tool_grammar(self, agent_name: str, allowed_tools: List[str]) -> Optional[Any]:
+        """Compiled tool-call grammar for an agent (cached), or None when disabled."""
+        if not TOOL_GRAMMAR: return None
+        if agent_name not in self._grammars:
+            from llama_cpp import LlamaGrammar
+            gbnf = build_tool_grammar(self._get_tools_schema(allowed_tools))
+            self._grammars[agent_name] = LlamaGrammar.from_string(gbnf, verbose=False)
+        return self._grammars[agent_name]
+
+    def _show_refs(self, text: str) -> str:
+        """References expanded for display; the emitted answer is what counts towards the passthrough totals."""
+        return self.results.expand(text, count=False)
+
+    def _generate(self, messages: List[Dict[str, Any]], echo: Optional[TerminalEcho] = None, grammar: Optional[Any] = None,
+                  agent_name: Optional[str] = None, model: Optional[str] = None) -> tuple:
+        """Runs one model step on the agent's model (see ModelPool). Returns (text, stats) with TTFT and tokens/s."""
+        with self.models.use(model) as llm:
+            if not STREAM_GENERATION:
+                start = time.perf_counter()
+                output = llm.create_chat_completion(
+                    messages=messages, temperature=0.1, max_tokens=4096, stop=["<|im_end|>"], grammar=grammar
+                )
+                elapsed = time.perf_counter() - start
+                tokens = output.get("usage", {}).get("completion_tokens", 0)
+                return output["choices"][0]["message"]["content"], {
+                    "decode_tokens": tokens, "total_ms": round(elapsed * 1000, 1),
+                    "tokens_per_s": round(tokens / elapsed, 1) if elapsed > 0 else 0.0, "early_stop": False
+                }
+
+            # The echo checks for tool calls on the raw text and expands references itself
+            on_text = echo
+            if self.session.on_event is not None:
+                on_text = ExpandRefs(lambda delta: self.emit("token", agent=agent_name, text=delta), self._show_refs)
+            text, stats = stream_chat(
+                llm, messages, on_text=on_text, cache=self.models.prompt_cache(model),
+                temperature=0.1, max_tokens=4096, stop=["<|im_end|>"], grammar=grammar
+            )
+            if isinstance(on_text, ExpandRefs): on_text.flush()
+        if echo: echo.close()
+        on_model = f" | {model}" if model and model != "default" else ""
+        print(f"⏱️  TTFT {stats['ttft_ms']:.0f} ms | {stats['decode_tokens']} tokens @ {stats['tokens_per_s']} tok/s{' | early stop' if stats['early_stop'] else ''}{on_model}")
+        return text, stats
+
+    # --- PROMPT ASSEMBLY ---
+    def _static_prompt(self, agent_name: str, config: Dict[str, Any]) -> str:
+        """Agent persona, concepts, tools and rules. Built once per agent."""
+        if agent_name in self._static_prompts: return self._static_prompts[agent_name]
+        tools_schema = self._get_tools_schema(config["allowed_tools"])
+        formatted_tools = self._format_tools_display(tools_schema)
+        prompt = f"""{config['system_prompt']}
 
 ---
 CONCEITOS DO SISTEMA:
@@ -295,84 +597,41 @@ CONCEITOS DO SISTEMA:
    - O fluxo lógico obrigatório é: Descobrir o Método (Skill) -> **CARREGAR o Método (`load_skill`)** -> Executar a SINTAXE documentada usando as VARIÁVEIS (ex: $VAR) de forma estritamente literal.
    - **RESOLUÇÃO DE VARIÁVEIS:** O sistema já possui as variáveis ($VAR) configuradas. Use-as literalmente; o shell as resolverá. Nunca as substitua por caminhos manuais.
 
-CONTEXTO DE SESSÃO:
-{session_info if session_info else "(Nenhum arquivo acessado recentemente)"}
-
-SKILLS ATIVAS (Capacidades Carregadas):
-{skills_text}
-
 FERRAMENTAS DISPONÍVEIS:
 {formatted_tools}
 
 REGRAS:
 1. Responda de forma direta.
-2. Use APENAS JSON para tools: <tool_call>{{"name": "...", "arguments": {{...}}}}</tool_call>
+2. Use APENAS JSON para tools: <tool_call>{{"name": "...", "arguments": {{...}}}}</tool_call>. Para várias consultas independentes (ex: ler 3 notas), emita várias tags <tool_call> na mesma resposta; os resultados voltam juntos.
 3. **PESQUISA DE SKILLS:** Busque sempre pelo **COMO** (ação técnica), nunca pelo **O QUE** (assunto do usuário).
-4. **VISIBILIDADE:** O usuário NÃO VÊ as respostas dos agentes. Se um agente encontrar a informação, você DEVE transcrevê-la INTEGRALMENTE na sua resposta final. Jamais oculte dados sob frases como 'está pronto'.
+4. **VISIBILIDADE:** O usuário NÃO VÊ as respostas dos agentes nem os resultados das ferramentas. Se um agente ou ferramenta trouxer a informação, ela DEVE aparecer INTEGRALMENTE na sua resposta final: em vez de copiá-la, escreva a referência do resultado, ex.: {{{{@r3}}}} (ou {{{{@r3:10-40}}}} para as linhas 10 a 40), que é substituída pelo texto completo na entrega. Escreva só o enquadramento ao redor. Jamais oculte dados sob frases como 'está pronto'.
 5. **VARIÁVEIS DISPONÍVEIS:** Todas as variáveis de ambiente (ex: $VAR) citadas nas skills estão carregadas no shell. Use-as literalmente; não tente substituí-las por caminhos manuais.
-6. Se encontrar barreiras, tente de outra forma (pelo menos 2 tentativas).
-"""
-            messages = [{"role": "system", "content": system_prompt}] + history[-15:]
-            current_trace_id = f"{parent_trace_id}_{agent_name}_{step_counter}"
-            self.log_trace(current_trace_id, "input", messages)
-
-            print(f"⚡ {agent_name} thinking...")
-            output = self.llm.create_chat_completion(
-                messages=messages, temperature=0.1, max_tokens=4096, stop=["<|im_end|>"]
-            )
-            response_text = output["choices"][0]["message"]["content"]
-            history.append({"role": "assistant", "content": response_text})
-            self.log_trace(current_trace_id, "output", response_text)
-
-            tool_match = re.search(r"<tool_call>(.*?)</tool_call>", response_text, re.DOTALL)
-            
-            if tool_match:
-                tool_json = tool_match.group(1).strip()
-                if tool_json.startswith("```"): tool_json = tool_json.split("\n", 1)[1].rsplit("\n", 1)[0]
-                
-                try:
-                    tool_call = json.loads(tool_json)
-                    t_name = tool_call["name"]
-                    t_args = tool_call.get("arguments", {})
-                    print(f"🛠️  {agent_name} calls {t_name} with {json.dumps(t_args)}")
-                    
-                    result = "Tool unknown."
-                    # Routing Logic (Simplified)
-                    if t_name == "delegate_to_agent":
-                        sub_res = self.run_agent(t_args.get("name"), t_args.get("task"), t_args.get("context"), current_trace_id)
-                        result = sub_res
-                    elif t_name == "execute_shell": result = self.execute_shell(t_args["command"])
-                    elif t_name == "read_file": result = self.read_file(t_args["path"])
-                    elif t_name == "write_file": result = self.write_file(t_args["path"], t_args["content"])
-                    elif t_name == "edit_file": result = self.edit_file(t_args["path"], t_args["operation"], t_args["text"], t_args.get("target_text"))
-                    elif t_name == "list_agents": result = self.list_agents()
-                    elif t_name == "get_agent_info": result = self.get_agent_info(t_args["name"])
-                    elif t_name == "search_skills": result = self.search_skills(t_args["query"])
-                    elif t_name == "list_skills_page": result = self.list_skills_page(t_args.get("page", 1))
-                    elif t_name == "load_skill": result = self.load_skill(t_args["path"])
-                    
-                    # CLI Display Logic
-                    display_result = result
-                    if t_name == "delegate_to_agent" and len(result) > 200:
-                         display_result = result[:200] + "... (truncated)"
-                    
-                    print(f"   -> Result: {display_result}")
-                    # Prefix Agent Name for Clarity
-                    result_prefix = f"[AGENTE: {agent_name.upper()}] " if agent_name != "brain" else ""
-                    history.append({"role": "user", "content": f"TOOL RESULT ({t_name}): {result_prefix}{result}"})
-                    self.log_trace(current_trace_id, "tool_result", result)
-                    
-                except Exception as e:
-                    history.append({"role": "user", "content": f"Tool Error: {str(e)}"})
-            
-            else:
-                if initial_task: 
-                    clean_res = re.sub(r"<think>.*?</think>", "", response_text, flags=re.DOTALL).strip()
-                    return clean_res
-                print(f"🤖 {agent_name}: {response_text}")
-
-            step_counter += 1
-            if step_counter > 15: return "Error: Max steps reached."
+6. Se encontrar barreiras, tente de outra forma (pelo menos 2 tentativas)."""
+        self._static_prompts[agent_name] = prompt
+        return prompt
+
+    def _build_system_prompt(self, agent_name: str, config: Dict[str, Any]) -> str:
+        """
+        Orders segments from most to least stable (static > skills > session)
+        so consecutive steps share the longest possible token prefix.
+        """
+        # This agent's resident skills, in load order (a stable prefix until one is evicted)
+        skills_text = self.skills.render(agent_name)
+        self.ledger.set_segment("skills", "resident", skills_text)
+        skills_text = skills_text or "(Nenhuma skill carregada. Use search_skills se precisar.)"
+
+        # INJECT SESSION CONTEXT INTO SYSTEM PROMPT (most volatile, goes last)
+        session_info = ""
+        if self.session_context["last_accessed_file"]:
+            session_info = f"ARQUIVO ATIVO: {self.session_context['last_accessed_file']}"
+
+        self.ledger.set_segment("system", "prompt", self._static_prompt(agent_name, config))
+        self.ledger.set_segment("system", "session", session_info)
+        return order_segments([
+            ("static", self._static_prompt(agent_name, config), 2),
+            ("skills", f"SKILLS ATIVAS (Capacidades Carregadas):\n{skills_text}", 1),
+            ("session", f"CONTEXTO DE SESSÃO:\n{session_info or '(Nenhum arquivo acessado recentemente)'}", 0),
+        ])
 
     def _format_tools_display(self, tools_schema: List[Dict]) -> str:
         lines = []
@@ -388,15 +647,22 @@ REGRAS:
         # Full definitions (Simplified for brevity in display, but full logic remains)
         all_definitions = {
             "execute_shell": {"name": "execute_shell", "description": "Executa comandos Shell/Bash. Permite listar (ls), buscar (grep/find), ler (cat), git e outras ferramentas nativas do Linux.", "input_schema": {"type": "object", "properties": {"command": {"type": "string"}}, "required": ["command"]}},
-            "read_file": {"name": "read_file", "description": "Lê o conteúdo de um arquivo local.", "input_schema": {"type": "object", "properties": {"path": {"type": "string"}}, "required": ["path"]}},
-            "write_file": {"name": "write_file", "description": "Escreve ou sobrescreve um arquivo INTEIRO.", "input_schema": {"type": "object", "properties": {"path": {"type": "string"}, "content": {"type": "string"}}, "required": ["path", "content"]}},
-            "edit_file": {"name": "edit_file", "description": "Edita um arquivo parcialmente. Use operation='append' para adicionar ao final, ou 'replace' para substituir texto.", "input_schema": {"type": "object", "properties": {"path": {"type": "string"}, "operation": {"type": "string", "enum": ["append", "replace"]}, "text": {"type": "string"}, "target_text": {"type": "string"}}, "required": ["path", "operation", "text"]}},
+            "read_file": {"name": "read_file", "description": "Lê um arquivo local. Arquivos grandes retornam só cabeçalho (tamanho, linhas, títulos) e prévia; use start_line/end_line (1-based, inclusivo), offset (byte) ou max_bytes para ler uma janela específica.", "input_schema": {"type": "object", "properties": {"path": {"type": "string"}, "start_line": {"type": "integer"}, "end_line": {"type": "integer"}, "offset": {"type": "integer"}, "max_bytes": {"type": "integer"}}, "required": ["path"]}},
+            "write_file": {"name": "write_file", "description": "Escreve ou sobrescreve um arquivo INTEIRO (gravação atômica). expected_version (opcional, de read_file) impede sobrescrever alterações feitas depois da leitura.", "input_schema": {"type": "object", "properties": {"path": {"type": "string"}, "content": {"type": "string"}, "expected_version": {"type": "string"}}, "required": ["path", "content"]}},
+            "edit_file": {"name": "edit_file", "description": "Edita um arquivo parcialmente, de forma atômica. Operações: 'append' (adiciona ao final), 'replace' (troca target_text por text; se target_text aparecer mais de uma vez, informe max_replacements, 0 = todas), 'append_under_heading' / 'prepend_under_heading' / 'replace_under_heading' (fim, início ou todo o conteúdo logo abaixo do título `heading`, ex: '## Tarefas', sem mexer em subtítulos), 'replace_block' / 'insert_after_block' (bloco do Obsidian marcado com ^block_id). Prefira as operações por título ou bloco a repetir trechos grandes em target_text. expected_version (de read_file) evita sobrescrever alterações concorrentes.", "input_schema": {"type": "object", "properties": {"path": {"type": "string"}, "operation": {"type": "string", "enum": ["append", "replace", "append_under_heading", "prepend_under_heading", "replace_under_heading", "replace_block", "insert_after_block"]}, "text": {"type": "string"}, "target_text": {"type": "string"}, "heading": {"type": "string"}, "block_id": {"type": "string"}, "max_replacements": {"type": "integer"}, "expected_version": {"type": "string"}}, "required": ["path", "operation", "text"]}},
+            "search_vault": {"name": "search_vault", "description": "Busca texto no conteúdo das notas do Obsidian (índice local ranqueado). Retorna caminhos absolutos, número da linha e trechos. Use `read_file` no caminho para ler a nota.", "input_schema": {"type": "object", "properties": {"query": {"type": "string"}, "limit": {"type": "integer", "default": 10}}, "required": ["query"]}},
+            "semantic_search": {"name": "semantic_search", "description": "Busca por SIGNIFICADO nas notas do Obsidian (embeddings locais): encontra trechos sobre o mesmo assunto mesmo com outras palavras ou sinônimos. Use quando `search_vault` não achar nada ou a pergunta for conceitual. Retorna caminho absoluto, intervalo de linhas, seção e similaridade.", "input_schema": {"type": "object", "properties": {"query": {"type": "string"}, "limit": {"type": "integer", "default": 10}}, "required": ["query"]}},
+            "find_notes": {"name": "find_notes", "description": "Consulta estruturada no índice de metadados do vault: combina filtros (todos opcionais, aplicados juntos) e responde em uma chamada. Ex.: notas com a tag #projeto, que linkam para [[X]], modificadas nos últimos 7 dias, com `status=ativo` no frontmatter. Retorna caminhos absolutos, título, data e tags.", "input_schema": {"type": "object", "properties": {"tag": {"type": "string", "description": "Tag sem ou com '#'; inclui subtags (projeto/x)."}, "links_to": {"type": "string", "description": "Nome da nota alvo: retorna seus backlinks."}, "linked_from": {"type": "string", "description": "Nome da nota: retorna as notas para as quais ela linka."}, "modified_within_days": {"type": "number"}, "modified_after": {"type": "string", "description": "Data ISO (YYYY-MM-DD)."}, "property": {"type": "string", "description": "Campo do frontmatter: 'chave' ou 'chave=valor'."}, "folder": {"type": "string", "description": "Pasta relativa ao vault."}, "title": {"type": "string", "description": "Trecho do título ou caminho."}, "limit": {"type": "integer", "default": 20}}}},
+            "note_info": {"name": "note_info", "description": "Metadados de uma nota em uma chamada: frontmatter, tags, títulos (com linha), links de saída resolvidos e backlinks. Aceita nome da nota, caminho relativo ou absoluto.", "input_schema": {"type": "object", "properties": {"note": {"type": "string"}}, "required": ["note"]}},
+            "list_tags": {"name": "list_tags", "description": "Tags do vault com número de notas, das mais usadas para as menos usadas.", "input_schema": {"type": "object", "properties": {"prefix": {"type": "string"}, "limit": {"type": "integer", "default": 50}}}},
+            "obsidian_api": {"name": "obsidian_api", "description": "Acessa o Obsidian pela API REST local (sem curl). Operações: read (ler nota em path), list (listar pasta em path), active (nota aberta), periodic (nota periódica, period='daily'), commands (listar comandos), put (criar/sobrescrever nota com content), append (adicionar content ao final), open (abrir nota na interface), run_command (executar command_id). Paths são relativos ao vault.", "input_schema": {"type": "object", "properties": {"operation": {"type": "string", "enum": ["read", "list", "active", "periodic", "commands", "put", "append", "open", "run_command"]}, "path": {"type": "string"}, "content": {"type": "string"}, "period": {"type": "string"}, "command_id": {"type": "string"}}, "required": ["operation"]}},
             "list_agents": {"name": "list_agents", "description": "Lista os agentes disponíveis.", "input_schema": {"type": "object", "properties": {}, "required": []}},
             "get_agent_info": {"name": "get_agent_info", "description": "Obtém detalhes de um agente.", "input_schema": {"type": "object", "properties": {"name": {"type": "string"}}, "required": ["name"]}},
             "delegate_to_agent": {"name": "delegate_to_agent", "description": "Delega uma tarefa para outro agente.", "input_schema": {"type": "object", "properties": {"name": {"type": "string"}, "task": {"type": "string"}, "context": {"type": "string"}}, "required": ["name", "task"]}},
-            "search_skills": {"name": "search_skills", "description": "Localiza MANUAIS DE INSTRUÇÃO e EXTENSÕES DE CONHECIMENTO. A query deve focar no MÉTODO TÉCNICO ou SISTEMA desejado. Não indexa o conteúdo ou assunto do usuário.", "input_schema": {"type": "object", "properties": {"query": {"type": "string"}}, "required": ["query"]}},
+            "search_skills": {"name": "search_skills", "description": "Localiza MANUAIS DE INSTRUÇÃO e EXTENSÕES DE CONHECIMENTO. A query deve focar no MÉTODO TÉCNICO ou SISTEMA desejado. Não indexa o conteúdo ou assunto do usuário. Retorna as skills mais relevantes com score.", "input_schema": {"type": "object", "properties": {"query": {"type": "string"}, "limit": {"type": "integer", "default": 5}}, "required": ["query"]}},
             "list_skills_page": {"name": "list_skills_page", "description": "Lista todas as skills disponíveis paginadas. Use quando a busca falhar.", "input_schema": {"type": "object", "properties": {"page": {"type": "integer", "default": 1}}, "required": []}},
-            "load_skill": {"name": "load_skill", "description": "Carrega as instruções de um arquivo de skill específico.", "input_schema": {"type": "object", "properties": {"path": {"type": "string"}}, "required": ["path"]}},
+            "fetch_result": {"name": "fetch_result", "description": "Lê um resultado grande guardado fora do contexto (handle como '@r3', mostrado na prévia). Use start_line/end_line (1-based, inclusivo) para um trecho, ou pattern (regex) para só as linhas que casam, com `context` linhas ao redor.", "input_schema": {"type": "object", "properties": {"handle": {"type": "string"}, "start_line": {"type": "integer"}, "end_line": {"type": "integer"}, "pattern": {"type": "string"}, "context": {"type": "integer", "default": 0}}, "required": ["handle"]}},
+            "load_skill": {"name": "load_skill", "description": "Carrega as instruções de um arquivo de skill específico. Skills grandes entram por seção: passe `section` (trecho do título) para carregar outra seção.", "input_schema": {"type": "object", "properties": {"path": {"type": "string"}, "section": {"type": "string"}}, "required": ["path"]}},
         }
         schema = []
         for t in allowed_tools:
@@ -404,5 +670,17 @@ REGRAS:
         return schema
 
 if __name__ == "__main__":
-    engine = AgentEngine(model_path=MODEL_PATH, n_ctx=N_CTX)
+    parser = argparse.ArgumentParser(description="Multi-agent Obsidian assistant.")
+    parser.add_argument("--startup-profile", action="store_true", help="Print the startup time per phase once the model is ready, then exit.")
+    args = parser.parse_args()
+
+    profile = StartupProfile()
+    engine = AgentEngine(model_path=MODEL_PATH, n_ctx=N_CTX, profile=profile)
+    if args.startup_profile:
+        profile.record("ready for input", profile.started)
+        if isinstance(engine.llm, ModelHandle): engine.llm.get()
+        profile.record("model ready", profile.started)
+        print(profile.report())
+        engine.close()
+        sys.exit(0)
     engine.run_agent("brain", initial_task=None)
\ No newline at end of file
@@ -0,0 +1,104 @@
+import re
+import zlib
+import json
+from typing import List, Dict, Any, Callable, Iterator, Union
+
+TOKEN_RE = re.compile(r"\w+|[^\w\s]|\s+")
+
+def tool_call(name: str, /, **arguments: Any) -> str:
+    return f"<tool_call>{json.dumps({'name': name, 'arguments': arguments}, ensure_ascii=False)}</tool_call>"
+
+class FakeLlama:
+    """
+    Deterministic stand-in for `llama_cpp.Llama` that replays a script of replies.
+
+    `script` is either a list of replies, consumed in order (then `default_reply`
+    forever), or a callable that receives the messages and returns the reply.
+    Decoding is free, so every millisecond measured around it is engine overhead.
+    """
+
+    def __init__(self, script: Union[List[str], Callable[[List[Dict[str, Any]]], str]],
+                 n_ctx: int = 8192, default_reply: str = "Pronto.", chunk_chars: int = 4):
+        self._script = script if callable(script) else iter(list(script))
+        self._n_ctx = n_ctx
+        self.default_reply = default_reply
+        self.chunk_chars = chunk_chars
+        self.cache = None
+        self.calls: List[Dict[str, Any]] = []
+        self._input_ids: List[int] = []   # tokens "evaluated" so far: the prompt, then each streamed chunk
+
+    # --- Llama API used by the engines ---
+    def tokenize(self, text: bytes, add_bos: bool = True, special: bool = False) -> List[int]:
+        tokens = [zlib.crc32(t.encode("utf-8")) & 0xFFFF for t in TOKEN_RE.findall(text.decode("utf-8", errors="ignore"))]
+        return ([1] if add_bos else []) + tokens
+
+    def detokenize(self, tokens: List[int]) -> bytes:
+        return b" " * len(tokens)
+
+    def n_ctx(self) -> int:
+        return self._n_ctx
+
+    def set_cache(self, cache: Any):
+        self.cache = cache
+
+    def save_state(self) -> "FakeState":
+        return FakeState(list(self._input_ids))
+
+    def load_state(self, state: "FakeState"):
+        self._input_ids = list(state.input_ids)
+
+    def create_chat_completion(self, messages: List[Dict[str, Any]], stream: bool = False, **kwargs) -> Union[Dict[str, Any], Iterator[Dict[str, Any]]]:
+        reply = self._next_reply(messages)
+        prompt_chars = sum(len(m["content"]) for m in messages)
+        self._input_ids = self.tokenize("".join(m["content"] for m in messages).encode("utf-8"))
+        self.calls.append({"messages": len(messages), "prompt_chars": prompt_chars, "reply_chars": len(reply)})
+        if not stream:
+            return {
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": max(1, len(reply) // self.chunk_chars)},
+            }
+        return self._stream(reply)
+
+    # --- internals ---
+    def _next_reply(self, messages: List[Dict[str, Any]]) -> str:
+        if callable(self._script): return self._script(messages)
+        return next(self._script, self.default_reply)
+
+    def _stream(self, reply: str) -> Iterator[Dict[str, Any]]:
+        yield {"choices": [{"index": 0, "delta": {"role": "assistant"}, "finish_reason": None}]}
+        for i in range(0, len(reply), self.chunk_chars):
+            # Like llama.cpp, a sampled token is evaluated when the next one is requested
+            if i: self._input_ids += self.tokenize(reply[i - self.chunk_chars:i].encode("utf-8"), add_bos=False)
+            yield {"choices": [{"index": 0, "delta": {"content": reply[i:i + self.chunk_chars]}, "finish_reason": None}]}
+        yield {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+
+class FakeState:
+    """What `FakeLlama.save_state()` returns: the evaluated tokens, sized like a small KV snapshot."""
+
+    def __init__(self, input_ids: List[int]):
+        self.input_ids = input_ids
+        self.llama_state_size = 4 * len(input_ids)
+
+class FakeEmbedder:
+    """
+    Deterministic stand-in for a GGUF embedding model: a hashed bag of words,
+    so notes sharing vocabulary land close together and embedding costs
+    almost nothing next to the indexing and search code around it.
+    """
+
+    name = "fake-embedder"
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.calls = 0
+
+    def embed(self, texts: Union[str, List[str]]) -> List[List[float]]:
+        self.calls += 1
+        out = []
+        for text in [texts] if isinstance(texts, str) else texts:
+            vec = [0.0] * self.dim
+            for word in re.findall(r"\w+", text.lower()):
+                h = zlib.crc32(word.encode("utf-8"))
+                vec[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+            out.append(vec)
+        return out
@@ -0,0 +1,526 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import resource
+import argparse
+import builtins
+import contextlib
+import statistics
+from collections import defaultdict
+from typing import Dict, Any, List, Callable, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_llm import FakeLlama, FakeEmbedder, tool_call, TOKEN_RE
+from vault_gen import generate_vault, WORDS
+from vault_index import VaultIndex
+from tracing import TraceWriter
+
+DEFAULT_BASELINE = os.path.join(".cache", "benchmarks", "baseline.json")
+
+# --- MEASUREMENT ---
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1 << 20) if sys.platform == "darwin" else rss / 1024, 1)
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    if not samples: return {}
+    ordered = sorted(samples)
+    return {
+        "n": len(samples),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p50_ms": round(ordered[len(ordered) // 2], 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+    }
+
+class Probe:
+    """Wall-clock samples for instance methods, wrapped in place."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def wrap(self, obj: Any, attr: str, label: Optional[str] = None, key: Optional[Callable[..., str]] = None):
+        fn = getattr(obj, attr)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try: return fn(*args, **kwargs)
+            finally: self.samples[key(*args, **kwargs) if key else label].append((time.perf_counter() - start) * 1000)
+        setattr(obj, attr, timed)
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        return {label: summarize(values) for label, values in sorted(self.samples.items())}
+
+@contextlib.contextmanager
+def quiet(enabled: bool = True):
+    if not enabled:
+        yield
+        return
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+@contextlib.contextmanager
+def scripted_input(lines: List[str]):
+    """Feeds `input()` from a list, then 'exit'."""
+    it = iter(lines)
+    original = builtins.input
+    builtins.input = lambda prompt="": next(it, "exit")
+    try: yield
+    finally: builtins.input = original
+
+# --- SCENARIOS ---
+def bench_search(vault: str, workdir: str, queries: int, seed: int) -> Dict[str, Any]:
+    index_path = os.path.join(workdir, "bench_index.sqlite")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(index_path + suffix): os.remove(index_path + suffix)
+    index = VaultIndex(vault, index_path=index_path, refresh_interval=0)
+
+    start = time.perf_counter()
+    index.refresh(force=True)
+    build_s = time.perf_counter() - start
+    n_notes = index.stats()["notes"]
+
+    start = time.perf_counter()
+    index.refresh(force=True)
+    noop_ms = (time.perf_counter() - start) * 1000
+
+    rng = random.Random(seed)
+    terms = [f"{rng.choice(WORDS)} {rng.choice(WORDS)}" for _ in range(queries)]
+    latencies = []
+    for q in terms:
+        start = time.perf_counter()
+        index.search(q, limit=10)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        "notes": n_notes,
+        "build_s": round(build_s, 3),
+        "build_notes_per_s": round(n_notes / build_s, 1) if build_s > 0 else 0.0,
+        "noop_refresh_ms": round(noop_ms, 3),
+        "query": summarize(latencies),
+        "queries_per_s": round(len(latencies) / (sum(latencies) / 1000), 1) if latencies else 0.0,
+    }
+
+def bench_trace(workdir: str, steps: int) -> Dict[str, Any]:
+    trace_dir = os.path.join(workdir, "trace_bench")
+    shutil.rmtree(trace_dir, ignore_errors=True)
+    writer = TraceWriter(trace_dir, compression="none")
+    system = {"role": "system", "content": "S" * 8000}
+    history, enqueue = [], []
+    for i in range(steps):
+        history.append({"role": "user" if i % 2 else "assistant", "content": f"mensagem {i} " + "x" * 600})
+        start = time.perf_counter()
+        writer.log(f"root_brain_{i}", "input", [system] + history)
+        writer.log(f"root_brain_{i}", "output", "ok")
+        enqueue.append((time.perf_counter() - start) * 1000)
+    start = time.perf_counter()
+    writer.close()
+    flush_ms = (time.perf_counter() - start) * 1000
+    return {"enqueue": summarize(enqueue), "drain_ms": round(flush_ms, 3), **{k: v for k, v in writer.stats.items() if k != "files"}}
+
+def bench_semantic(vault: str, workdir: str, chunks: int, queries: int, seed: int) -> Dict[str, Any]:
+    import numpy as np
+    from vault_semantic import SemanticIndex
+    index_dir = os.path.join(workdir, "bench_embeddings")
+    shutil.rmtree(index_dir, ignore_errors=True)
+    embedder = FakeEmbedder()
+    index = SemanticIndex(vault, index_dir=index_dir, embedder=embedder, refresh_interval=0)
+
+    # chunking, batching and storage around a near-free embedder
+    start = time.perf_counter()
+    built = index.refresh(force=True)["chunks"]
+    build_s = time.perf_counter() - start
+    start = time.perf_counter()
+    index.refresh(force=True)
+    noop_ms = (time.perf_counter() - start) * 1000
+
+    # pad the matrix with random unit vectors up to `chunks` rows
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    for base in range(index.rows, chunks, 8192):
+        n = min(8192, chunks - base)
+        index.append(rng.standard_normal((n, embedder.dim), dtype=np.float32),
+                     [(f"synthetic/{base + i}.md", 1, 1, "", "") for i in range(n)])
+    append_s = time.perf_counter() - start
+    index._open()
+    index.refresh_interval = float("inf")
+
+    words = random.Random(seed)
+    latencies = []
+    for _ in range(queries):
+        q = " ".join(words.choice(WORDS) for _ in range(4))
+        start = time.perf_counter()
+        index.search(q, limit=10)
+        latencies.append((time.perf_counter() - start) * 1000)
+    stats = index.stats()
+    return {
+        "vault_chunks": built,
+        "build_s": round(build_s, 3),
+        "build_chunks_per_s": round(built / build_s, 1) if build_s > 0 else 0.0,
+        "noop_refresh_ms": round(noop_ms, 3),
+        "rows": stats["rows"],
+        "matrix_mb": round(stats["bytes"] / (1 << 20), 1),
+        "append_rows_per_s": round((stats["rows"] - built) / append_s, 1) if append_s > 0 else 0.0,
+        "query": summarize(latencies),
+    }
+
+def agent_v2_script(notes: List[str], rounds: int) -> List[str]:
+    replies = []
+    for r in range(rounds):
+        a, b = notes[(2 * r) % len(notes)], notes[(2 * r + 1) % len(notes)]
+        target = notes[-1 - r % len(notes)]
+        replies += [
+            # brain: look around, then delegate research
+            tool_call("list_agents") + tool_call("get_agent_info", name="researcher"),
+            tool_call("delegate_to_agent", name="researcher", task=f"Resuma o que há sobre {WORDS[r % len(WORDS)]}"),
+            # researcher: search, read two notes in parallel, answer
+            tool_call("search_vault", query=WORDS[r % len(WORDS)]) + tool_call("search_skills", query="buscar notas obsidian"),
+            tool_call("read_file", path=a) + tool_call("read_file", path=b) + tool_call("execute_shell", command=f"grep -rl {WORDS[r % len(WORDS)]} {os.path.dirname(a)}"),
+            f"Resumo da rodada {r}: encontrei 2 notas relevantes.",
+            # brain: delegate an edit
+            tool_call("delegate_to_agent", name="executor", task=f"Adicione uma linha em {target}"),
+            tool_call("edit_file", path=target, operation="append", text=f"- revisado na rodada {r}"),
+            "Linha adicionada.",
+            f"Rodada {r} concluída.",
+        ]
+    return replies
+
+def bench_agent_v2(notes: List[str], rounds: int, verbose: bool) -> Dict[str, Any]:
+    from agent_v2 import AgentEngine
+
+    llm = FakeLlama(agent_v2_script(notes, rounds))
+    with quiet(not verbose):
+        engine = AgentEngine(llm=llm)
+    probe = Probe()
+    probe.wrap(engine, "_build_system_prompt", "prompt.system")
+    probe.wrap(engine.packer, "pack", "prompt.pack")
+    probe.wrap(engine, "_generate", "generate")
+    probe.wrap(engine, "log_trace", "trace.enqueue")
+    probe.wrap(engine, "_dispatch_tool", key=lambda name, args, trace_id: f"tool.{name}")
+
+    start = time.perf_counter()
+    with quiet(not verbose):
+        for r in range(rounds):
+            engine.run_agent("brain", initial_task=f"Tarefa de benchmark {r}")
+    wall_s = time.perf_counter() - start
+    start = time.perf_counter()
+    engine.tracer.flush()
+    flush_ms = (time.perf_counter() - start) * 1000
+
+    steps = len(llm.calls)
+    generate_ms = sum(probe.samples["generate"])
+    # Sub-agent steps run inside delegate_to_agent and are counted in `generate` as well
+    return {
+        "steps": steps,
+        "wall_s": round(wall_s, 3),
+        "overhead_per_step_ms": round((wall_s * 1000 - generate_ms) / max(steps, 1), 3),
+        "trace_flush_ms": round(flush_ms, 3),
+        "trace_bytes": engine.tracer.stats["bytes_written"],
+        "tool_cache_misses": engine.tool_cache.stats()["misses"],
+        "tool_cache_hits": engine.tool_cache.stats()["hits"],
+        "model_steps": {name: m["steps"] for name, m in engine.models.stats()["models"].items()},
+        "results_stored": engine.results.stats()["stored"],
+        "result_bytes_kept_out": engine.results.stats()["stored_bytes"] - engine.results.stats()["preview_bytes"],
+        "timings": probe.report(),
+    }
+
+def bench_passthrough(notes: List[str], rounds: int, verbose: bool) -> Dict[str, Any]:
+    """Decoded tokens per session when answers transcribe earlier results (before) vs cite them as {{@rN}} (after)."""
+    from agent_v2 import AgentEngine
+
+    def script(cite: bool) -> List[str]:
+        replies = []
+        for r in range(rounds):
+            a, b = notes[(2 * r) % len(notes)], notes[(2 * r + 1) % len(notes)]
+            # Handles in a fresh session: the researcher's reads are @r(3r+1) and @r(3r+2), its answer @r(3r+3)
+            base = 3 * r
+            quoted = "\n\n".join(open(p, encoding="utf-8").read() for p in (a, b))
+            answer = f"Encontrei duas notas:\n\n{{{{@r{base + 1}}}}}\n\n{{{{@r{base + 2}}}}}" if cite else f"Encontrei duas notas:\n\n{quoted}"
+            replies += [
+                tool_call("delegate_to_agent", name="researcher", task=f"Traga as notas sobre {WORDS[r % len(WORDS)]}"),
+                tool_call("read_file", path=a) + tool_call("read_file", path=b),
+                answer,
+                f"Aqui está o que o researcher encontrou:\n\n{{{{@r{base + 3}}}}}" if cite else f"Aqui está o que o researcher encontrou:\n\n{answer}",
+            ]
+        return replies
+
+    results = {}
+    for mode, cite in (("transcribe", False), ("cite", True)):
+        llm = FakeLlama(script(cite))
+        with quiet(not verbose):
+            engine = AgentEngine(llm=llm)
+        with quiet(not verbose):
+            answers = [engine.run_agent("brain", initial_task=f"Tarefa de benchmark {r}") for r in range(rounds)]
+        engine.tracer.close()
+        results[mode] = {"decoded_tokens": sum(max(1, c["reply_chars"] // llm.chunk_chars) for c in llm.calls),
+                         "answer_chars": sum(len(a) for a in answers),
+                         "expanded_chars": engine.results.stats()["expanded_chars"]}
+    results["decoded_tokens_saved"] = round(1 - results["cite"]["decoded_tokens"] / results["transcribe"]["decoded_tokens"], 3)
+    return results
+
+def bench_skill_agent(notes: List[str], rounds: int, verbose: bool) -> Dict[str, Any]:
+    from agent import SkillAgent
+
+    replies, inputs = [], []
+    for r in range(rounds):
+        inputs.append(f"Leia a nota {r} e me diga do que se trata.")
+        replies += [
+            tool_call("list_skills"),
+            tool_call("load_skill", name="terminal"),
+            tool_call("read_file", path=notes[r % len(notes)]),
+            f"A nota {r} trata de {WORDS[r % len(WORDS)]}.",
+        ]
+    llm = FakeLlama(replies)
+    with quiet(not verbose):
+        agent = SkillAgent(llm=llm)
+    probe = Probe()
+    probe.wrap(agent.packer, "pack", "prompt.pack")
+    probe.wrap(agent.llm, "create_chat_completion", "generate")
+    probe.wrap(agent, "log_trace", "trace.enqueue")
+    for name in ("execute_shell", "read_file", "list_skills", "load_skill"):
+        probe.wrap(agent, name, f"tool.{name}")
+
+    start = time.perf_counter()
+    with quiet(not verbose), scripted_input(inputs):
+        agent.run()
+    wall_s = time.perf_counter() - start
+    agent.tracer.flush()
+    steps = len(llm.calls)
+    return {
+        "steps": steps,
+        "wall_s": round(wall_s, 3),
+        "overhead_per_step_ms": round((wall_s * 1000 - sum(probe.samples["generate"])) / max(steps, 1), 3),
+        "trace_bytes": agent.tracer.stats["bytes_written"],
+        "timings": probe.report(),
+    }
+
+def bench_edit(notes: List[str], workdir: str, ops: int, verbose: bool) -> Dict[str, Any]:
+    from agent_v2 import AgentEngine
+
+    edit_dir = os.path.join(workdir, "edit_bench")
+    shutil.rmtree(edit_dir, ignore_errors=True)
+    os.makedirs(edit_dir)
+    copies = []
+    for i, src in enumerate(notes[:min(len(notes), 50)]):
+        dst = os.path.join(edit_dir, f"{i:03d}.md")
+        shutil.copyfile(src, dst)
+        copies.append(dst)
+    with quiet(not verbose):
+        engine = AgentEngine(llm=FakeLlama([]))
+
+    results = {}
+    for operation in ("append", "replace"):
+        latencies = []
+        for i in range(ops):
+            path = copies[i % len(copies)]
+            start = time.perf_counter()
+            if operation == "append": engine.edit_file(path, "append", f"- linha {i}")
+            else: engine.edit_file(path, "replace", f"- linha {i} (editada)", target_text=f"- linha {i}", max_replacements=1)
+            latencies.append((time.perf_counter() - start) * 1000)
+        results[operation] = {**summarize(latencies), "ops_per_s": round(len(latencies) / (sum(latencies) / 1000), 1)}
+    engine.tracer.close()
+    return results
+
+def simulate_decode(prompt: List[int], reply: List[int], draft: Optional[Callable] = None,
+                    pass_ms: float = 25.0, verify_ms: float = 1.0) -> Dict[str, float]:
+    """
+    Replays `reply` through llama.cpp's speculative loop: each pass verifies the
+    draft's proposal in one batch, keeps the matching prefix and samples one
+    more token. A pass costs `pass_ms` plus `verify_ms` per proposed token
+    (GPU-like); the time spent in the draft itself is measured for real.
+    """
+    import numpy as np
+    ids, produced, passes, model_ms, draft_ms = list(prompt) + [reply[0]], 1, 1, pass_ms, 0.0
+    while produced < len(reply):
+        proposal = []
+        if draft is not None:
+            start = time.perf_counter()
+            proposal = draft(np.array(ids, dtype=np.intc)).tolist()
+            draft_ms += (time.perf_counter() - start) * 1000
+        k = 0
+        while k < len(proposal) and produced + k < len(reply) and proposal[k] == reply[produced + k]: k += 1
+        take = min(k + 1, len(reply) - produced)
+        ids += reply[produced:produced + take]
+        produced += take
+        passes += 1
+        model_ms += pass_ms + verify_ms * len(proposal)
+    total_ms = model_ms + draft_ms
+    return {"tokens": produced, "passes": passes, "draft_ms": draft_ms, "tokens_per_s": produced / (total_ms / 1000)}
+
+def bench_speculative(notes: List[str], rounds: int, seed: int) -> Dict[str, Any]:
+    """
+    MODELLED, not measured: scripted replies (one copied verbatim from the
+    prompt) replayed through `simulate_decode`'s cost model. Only the draft's
+    own time is real. See `bench_speculative_model` for wall-clock numbers.
+    """
+    from agent_session import use_agent
+    from speculative import DraftTracker, PromptLookupDraft
+
+    vocab: Dict[str, int] = {}
+    tokenize = lambda text: [vocab.setdefault(t, len(vocab)) for t in TOKEN_RE.findall(text)]
+    rng = random.Random(seed)
+    tracker = DraftTracker(PromptLookupDraft(), "lookup")
+    cases: Dict[str, List[Dict[str, float]]] = defaultdict(list)
+    for r in range(rounds):
+        found = "\n\n".join(open(notes[(r * 2 + i) % len(notes)], encoding="utf-8").read()[:1500] for i in range(2))
+        prompt = tokenize(f"Você é o brain.\n\nTOOL RESULT (delegate_to_agent): [AGENTE: RESEARCHER] {found}")
+        # brain: transcribes the sub-agent's answer in full (rule 4); researcher: writes new text
+        replies = {"brain": tokenize(f"Aqui está o que o researcher encontrou:\n\n{found}\n\nPosso ajudar em mais algo?"),
+                   "researcher": tokenize(" ".join(rng.choice(WORDS) for _ in range(300)))}
+        for agent, reply in replies.items():
+            off = simulate_decode(prompt, reply)
+            with use_agent(agent):
+                on = simulate_decode(prompt, reply, tracker)
+                step = tracker.step(agent, {"decode_tokens": on["tokens"], "total_ms": on["tokens"] / on["tokens_per_s"] * 1000})
+            cases[agent].append({**step, "off": off["tokens_per_s"], "on": on["tokens_per_s"], "draft_ms": on["draft_ms"] / on["passes"]})
+
+    results: Dict[str, Any] = {"cost_model": "modelled: 25 ms per pass + 1 ms per drafted token, scripted replies"}
+    for agent, steps in cases.items():
+        proposed, accepted = sum(s["proposed"] for s in steps), sum(s["accepted"] for s in steps)
+        off, on = statistics.fmean(s["off"] for s in steps), statistics.fmean(s["on"] for s in steps)
+        results[agent] = {"modelled_acceptance": round(accepted / proposed, 3) if proposed else 0.0,
+                          "modelled_tokens_per_pass": round(statistics.fmean(s["tokens_per_pass"] for s in steps), 2),
+                          "modelled_off_tokens_per_s": round(off, 1), "modelled_on_tokens_per_s": round(on, 1),
+                          "modelled_speedup": round(on / off, 2),
+                          "draft_ms_per_pass": round(statistics.fmean(s["draft_ms"] for s in steps), 3)}
+    return results
+
+def bench_speculative_model(notes: List[str], rounds: int) -> Dict[str, Any]:
+    """
+    Measured: wall-clock decode speed of a real GGUF (SPEC_BENCH_MODEL) asked
+    to transcribe notes, with and without prompt-lookup drafts. Skipped when
+    llama_cpp or the model is missing.
+    """
+    from llama_cpp import Llama
+    path = os.getenv("SPEC_BENCH_MODEL")
+    if not path or not os.path.exists(path): raise FileNotFoundError(f"SPEC_BENCH_MODEL is not a GGUF file: {path!r}")
+    from agent_session import use_agent
+    from model_loader import model_params
+    from speculative import DraftTracker, PromptLookupDraft
+    from streaming import stream_chat
+
+    results: Dict[str, Any] = {}
+    for mode in ("off", "lookup"):
+        tracker = DraftTracker(PromptLookupDraft(), mode) if mode == "lookup" else None
+        llm = Llama(model_path=path, n_ctx=4096, verbose=False, draft_model=tracker, **model_params())
+        tokens, decode_ms, total_ms = 0, 0.0, 0.0
+        for r in range(rounds):
+            found = open(notes[r % len(notes)], encoding="utf-8").read()[:1500]
+            messages = [{"role": "system", "content": "Transcreva INTEGRALMENTE o texto que o usuário enviar, sem comentários."},
+                        {"role": "user", "content": found}]
+            with use_agent("brain"):
+                _, stats = stream_chat(llm, messages, stop_on_tool_call=False, temperature=0.0, max_tokens=512)
+            tokens += stats["decode_tokens"]
+            decode_ms += stats["total_ms"] - stats["ttft_ms"]
+            total_ms += stats["total_ms"]
+        results[mode] = {"decode_tokens": tokens, "tokens_per_s": round(tokens / (decode_ms / 1000), 1) if decode_ms else 0.0,
+                         "total_ms": round(total_ms, 1)}
+        if tracker is not None:
+            spec = tracker.step("brain", {"decode_tokens": tokens, "total_ms": decode_ms})
+            results[mode].update(acceptance=spec["acceptance"], tokens_per_pass=spec["tokens_per_pass"])
+        if hasattr(llm, "close"): llm.close()
+    results["speedup"] = round(results["lookup"]["tokens_per_s"] / results["off"]["tokens_per_s"], 2) if results["off"]["tokens_per_s"] else 0.0
+    return results
+
+# --- BASELINE ---
+def flatten(data: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for k, v in data.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict): flat.update(flatten(v, key + "."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool): flat[key] = v
+    return flat
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Prints metric deltas against the baseline; returns the regressed metrics."""
+    cur, base = flatten(current["results"]), flatten(baseline["results"])
+    regressions = []
+    print(f"\n{'metric':<52} {'baseline':>12} {'current':>12} {'delta':>8}")
+    for key in sorted(cur.keys() & base.keys()):
+        if key.endswith((".n", ".steps", ".notes")) or base[key] == 0: continue
+        delta = (cur[key] - base[key]) / abs(base[key])
+        higher_is_better = key.endswith(("_per_s", "speedup", "acceptance", "tokens_per_pass", "_saved"))
+        worse = -delta if higher_is_better else delta
+        flag = ""
+        if worse > threshold and not key.endswith(("bytes_deduplicated", "segments", "events", "_hits", "_kept_out")):
+            regressions.append(key)
+            flag = " ⚠️"
+        print(f"{key:<52} {base[key]:>12.3f} {cur[key]:>12.3f} {delta:>+7.1%}{flag}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline engine benchmarks (scripted fake model, synthetic vault).")
+    parser.add_argument("--notes", type=int, default=1000, help="synthetic vault size (1k-100k)")
+    parser.add_argument("--rounds", type=int, default=10, help="scripted agent rounds")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--edits", type=int, default=500)
+    parser.add_argument("--semantic-chunks", type=int, default=100000, help="rows in the semantic search matrix")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=os.path.join(".cache", "benchmarks"))
+    parser.add_argument("--only", nargs="*", choices=["search", "trace", "semantic", "agent_v2", "skill_agent", "edit", "speculative", "speculative_model", "passthrough"])
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change flagged as regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--verbose", action="store_true", help="keep the engines' console output")
+    args = parser.parse_args()
+
+    # The engines resolve skills/, agents/ and traces/ relative to the repo root
+    os.chdir(ROOT)
+    workdir = os.path.abspath(args.workdir)
+    vault = os.path.join(workdir, f"vault_{args.notes}")
+    os.makedirs(workdir, exist_ok=True)
+    os.environ.update({
+        "OBSIDIAN_VAULT_PATH": vault,
+        "VAULT_INDEX_PATH": os.path.join(workdir, f"vault_{args.notes}.sqlite"),
+        "PROMPT_CACHE": "0",
+        "TOOL_GRAMMAR": "0",
+    })
+
+    start = time.perf_counter()
+    notes = generate_vault(vault, args.notes, seed=args.seed)
+    print(f"📁 Vault: {len(notes)} notes ({time.perf_counter() - start:.1f}s)")
+
+    scenarios = {
+        "search": lambda: bench_search(vault, workdir, args.queries, args.seed),
+        "trace": lambda: bench_trace(workdir, steps=200),
+        "semantic": lambda: bench_semantic(vault, workdir, args.semantic_chunks, min(args.queries, 50), args.seed),
+        "agent_v2": lambda: bench_agent_v2(notes, args.rounds, args.verbose),
+        "skill_agent": lambda: bench_skill_agent(notes, args.rounds, args.verbose),
+        "edit": lambda: bench_edit(notes, workdir, args.edits, args.verbose),
+        "speculative": lambda: bench_speculative(notes, args.rounds, args.seed),
+        "speculative_model": lambda: bench_speculative_model(notes, args.rounds),
+        "passthrough": lambda: bench_passthrough(notes, args.rounds, args.verbose),
+    }
+    results, skipped = {}, {}
+    for name, fn in scenarios.items():
+        if args.only and name not in args.only: continue
+        try:
+            results[name] = fn()
+        except (ImportError, FileNotFoundError) as e:
+            # Scenarios that need an optional dependency or a model file that is not there
+            skipped[name] = f"{type(e).__name__}: {e}"
+            print(f"⏭️  {name}: skipped ({skipped[name]})")
+            continue
+        results[name]["peak_rss_mb"] = peak_rss_mb()
+        print(f"✅ {name}: {json.dumps(results[name], ensure_ascii=False)}")
+
+    report = {"config": vars(args), "python": sys.version.split()[0], "results": results, "skipped": skipped}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f: json.dump(report, f, indent=2)
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f: baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}" if regressions else "\nNo regressions.")
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f: json.dump(report, f, indent=2)
+        print(f"💾 Baseline saved to {args.baseline}")
+    if regressions and args.fail_on_regression: sys.exit(1)
@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import random
+import argparse
+from typing import List
+
+FOLDERS = ["Projetos", "Diário", "Referências", "Pessoas", "Áreas/Saúde", "Áreas/Finanças", "Arquivo/2024", "Inbox"]
+TAGS = ["projeto", "reunião", "ideia", "leitura", "tarefa", "pessoal", "trabalho", "estudo", "revisão", "saúde"]
+WORDS = (
+    "nota projeto reunião ideia análise dados relatório cliente prazo entrega sistema modelo agente busca índice "
+    "arquivo pasta tarefa revisão leitura livro artigo resumo conceito método processo resultado teste código "
+    "servidor banco consulta memória contexto token prompt desempenho latência cache disco rede usuário equipe "
+    "planejamento objetivo meta semana mês ano orçamento custo receita despesa saúde treino sono alimentação "
+    "café manhã tarde noite viagem cidade casa família amigo conversa decisão pergunta resposta problema solução"
+).split()
+
+def _sentence(rng: random.Random, n: int) -> str:
+    words = [rng.choice(WORDS) for _ in range(n)]
+    return " ".join(words).capitalize() + "."
+
+def note_title(i: int) -> str:
+    return f"Nota {i:06d}"
+
+def note_path(root: str, i: int) -> str:
+    return os.path.join(root, FOLDERS[i % len(FOLDERS)], f"{note_title(i)}.md")
+
+def render_note(i: int, n_notes: int, rng: random.Random, avg_words: int = 300) -> str:
+    tags = rng.sample(TAGS, k=rng.randint(1, 3))
+    lines = [
+        "---",
+        f"created: 2025-{(i % 12) + 1:02d}-{(i % 28) + 1:02d}",
+        f"tags: [{', '.join(tags)}]",
+        f"aliases: [N{i}]",
+        "---",
+        f"# {note_title(i)}",
+        "",
+    ]
+    words = 0
+    section = 0
+    while words < avg_words:
+        section += 1
+        lines.append(f"## Seção {section}: {rng.choice(WORDS)}")
+        for _ in range(rng.randint(1, 3)):
+            n = rng.randint(8, 30)
+            sentence = _sentence(rng, n)
+            if rng.random() < 0.4:
+                sentence += f" Ver [[{note_title(rng.randrange(n_notes))}]]."
+            if rng.random() < 0.2:
+                sentence += f" #{rng.choice(TAGS)}"
+            lines.append(sentence)
+            words += n
+        if rng.random() < 0.3:
+            lines.append(f"- [{rng.choice([' ', 'x'])}] {_sentence(rng, 6)}")
+        lines.append("")
+    return "\n".join(lines)
+
+def generate_vault(root: str, n_notes: int, seed: int = 0, avg_words: int = 300) -> List[str]:
+    """
+    Writes a reproducible Obsidian-like vault: frontmatter with tags, headings,
+    wikilinks between notes, inline tags and tasks. Returns the note paths.
+    Notes already on disk with the same name are kept, so reruns are cheap.
+    """
+    for folder in FOLDERS: os.makedirs(os.path.join(root, folder), exist_ok=True)
+    paths = []
+    for i in range(n_notes):
+        path = note_path(root, i)
+        paths.append(path)
+        if os.path.exists(path): continue
+        rng = random.Random(seed * 1_000_003 + i)
+        with open(path, "w", encoding="utf-8") as f: f.write(render_note(i, n_notes, rng, avg_words))
+    return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Obsidian vault.")
+    parser.add_argument("root")
+    parser.add_argument("--notes", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--words", type=int, default=300, help="approximate words per note")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    paths = generate_vault(args.root, args.notes, args.seed, args.words)
+    size = sum(os.path.getsize(p) for p in paths)
+    print(f"✅ {len(paths)} notes ({size / 1e6:.1f} MB) in {args.root} [{time.perf_counter() - start:.1f}s]", file=sys.stderr)
@@ -0,0 +1,212 @@
+import os
+import re
+import json
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from token_ledger import TokenLedger, MESSAGE_OVERHEAD, is_tool_message
+
+# --- CONFIGURATION ---
+TAIL_SIZE = 32          # Recent messages kept in memory; older ones are read back from disk
+SUMMARY_CHARS = 160
+SUMMARY_HEADER = "RESUMO DO HISTÓRICO ANTERIOR (mensagens antigas compactadas):"
+MIN_TRUNCATED_TOKENS = 64
+SUMMARY_SHARE = 0.15    # Budget share held back for summaries once history overflows
+
+# --- UTILS ---
+def summarize_message(msg: Dict[str, Any]) -> str:
+    """One-line digest used when a message no longer fits in full."""
+    role = msg.get("role", "user")
+    text = re.sub(r"<think>.*?</think>", "", msg.get("content") or "", flags=re.DOTALL)
+    if role == "assistant":
+        call = re.search(r'<tool_call>.*?"name"\s*:\s*"([^"]+)"', text, re.DOTALL)
+        if call: return f"- assistant chamou {call.group(1)}"
+    if is_tool_message(msg):
+        role = "tool"
+    flat = " ".join(text.split())
+    return f"- {role}: {flat[:SUMMARY_CHARS]}{'...' if len(flat) > SUMMARY_CHARS else ''}"
+
+def truncate_to_tokens(content: str, tokens: int, allowed: int) -> str:
+    """Keeps head and tail of `content` so it costs roughly `allowed` tokens."""
+    if allowed >= tokens: return content
+    keep = max(0, int(len(content) * allowed / max(tokens, 1)))
+    head, tail = content[:int(keep * 0.8)], content[len(content) - int(keep * 0.2):] if keep else ""
+    return f"{head}\n...[truncado: ~{tokens - allowed} tokens omitidos]...\n{tail}"
+
+# --- HISTORY ---
+class HistoryStore:
+    """
+    Append-only conversation history persisted as JSONL.
+
+    Only the last `tail_size` messages stay in memory; for every message we keep
+    its file offset, token count and one-line summary, so packing never has to
+    re-read or re-tokenize old turns.
+    """
+
+    def __init__(self, ledger: TokenLedger, path: str, tail_size: int = TAIL_SIZE):
+        self.ledger = ledger
+        self.path = path
+        self.tail_size = tail_size
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._meta: List[Tuple[int, str, int, bool, str, int]] = []  # offset, role, tokens, is_tool, summary, summary_tokens
+        self._tail: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._prefix = [0]
+        self._tool_prefix = [0]
+
+    def append(self, msg: Dict[str, Any]):
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(json.dumps(msg, ensure_ascii=False).encode("utf-8") + b"\n")
+
+        n = self.ledger.count_fn(msg.get("content") or "") + MESSAGE_OVERHEAD
+        tool = is_tool_message(msg)
+        summary = summarize_message(msg)
+        self._meta.append((offset, msg["role"], n, tool, summary, self.ledger.count_fn(summary)))
+        self._prefix.append(self._prefix[-1] + n)
+        self._tool_prefix.append(self._tool_prefix[-1] + (n if tool else 0))
+
+        self._tail[len(self._meta) - 1] = msg
+        while len(self._tail) > self.tail_size: self._tail.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._meta)
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        if index < 0: index += len(self._meta)
+        if index in self._tail: return self._tail[index]
+        with open(self.path, "rb") as f:
+            f.seek(self._meta[index][0])
+            return json.loads(f.readline())
+
+    def role_of(self, index: int) -> str:
+        return self._meta[index][1]
+
+    def is_tool(self, index: int) -> bool:
+        return self._meta[index][3]
+
+    def summary_of(self, index: int) -> Tuple[str, int]:
+        return self._meta[index][4], self._meta[index][5]
+
+    def tokens_of(self, index: int) -> int:
+        if index < 0: index += len(self._meta)
+        return self._prefix[index + 1] - self._prefix[index]
+
+    def window_tokens(self, n: int) -> tuple:
+        """(total, tool_result) tokens of the last `n` messages."""
+        start = max(0, len(self._meta) - n)
+        return self._prefix[-1] - self._prefix[start], self._tool_prefix[-1] - self._tool_prefix[start]
+
+# --- PACKER ---
+class ContextPacker:
+    """
+    Fills a token budget with history instead of keeping a fixed message count.
+
+    Priority: latest user turn and latest tool result (truncated if needed),
+    then the newest messages in full, then one-line summaries of older ones;
+    whatever is left is dropped.
+    """
+
+    def __init__(self, ledger: TokenLedger, budget: int):
+        self.ledger = ledger
+        self.budget = budget
+        self._last: Optional[Tuple[HistoryStore, int, int, int]] = None  # (history, messages, fixed, total) of the last plan
+
+    def plan(self, history: HistoryStore, fixed_tokens: int) -> Dict[str, Any]:
+        """Decides what goes in the prompt using only cached token counts."""
+        n = len(history)
+        avail = max(0, self.budget - fixed_tokens)
+        used = 0
+        keep: Dict[int, int] = {}  # index -> allowed tokens
+
+        last_user = next((i for i in range(n - 1, -1, -1) if history.role_of(i) == "user" and not history.is_tool(i)), None)
+        last_tool = next((i for i in range(n - 1, -1, -1) if history.is_tool(i)), None)
+
+        # 1. Mandatory: the turn being answered and the freshest observation
+        if last_user is not None:
+            keep[last_user] = min(history.tokens_of(last_user), max(MIN_TRUNCATED_TOKENS, avail // 2))
+            used += keep[last_user]
+        if last_tool is not None:
+            keep[last_tool] = min(history.tokens_of(last_tool), max(MIN_TRUNCATED_TOKENS, avail - used))
+            used += keep[last_tool]
+
+        # 2. Newest messages in full while they fit (leaving room for summaries on overflow)
+        rest = history.window_tokens(n)[0] - sum(history.tokens_of(k) for k in keep)
+        limit = avail if used + rest <= avail else avail - int(avail * SUMMARY_SHARE)
+        i = n - 1
+        while i >= 0:
+            if i not in keep:
+                t = history.tokens_of(i)
+                if used + t > limit: break
+                keep[i] = t
+                used += t
+            i -= 1
+
+        # 3. Older messages as summaries, then drop
+        summarized, dropped = [], 0
+        summary_tokens = self.ledger.count(SUMMARY_HEADER) + MESSAGE_OVERHEAD
+        for j in range(i, -1, -1):
+            if j in keep: continue
+            _, st = history.summary_of(j)
+            if used + summary_tokens + st <= avail:
+                summarized.append(j)
+                summary_tokens += st
+            else:
+                dropped += 1
+        if summarized: used += summary_tokens
+
+        tool_tokens = sum(t for idx, t in keep.items() if history.is_tool(idx))
+        report = {
+            "budget": self.budget,
+            "system": fixed_tokens - self.ledger.segment_total("skills"),
+            "skills": self.ledger.segment_total("skills"),
+            "history": used - tool_tokens - (summary_tokens if summarized else 0),
+            "tool_results": tool_tokens,
+            "summaries": summary_tokens if summarized else 0,
+            "kept_messages": len(keep),
+            "compacted_messages": len(summarized),
+            "dropped_messages": dropped,
+            "truncated_messages": sum(1 for idx, t in keep.items() if t < history.tokens_of(idx)),
+        }
+        report["total"] = fixed_tokens + used
+        self._last = (history, n, fixed_tokens, report["total"])
+        return {"keep": keep, "summarized": set(summarized), "report": report}
+
+    def estimate(self, history: HistoryStore, fixed_tokens: int) -> int:
+        """
+        Prompt tokens the next `pack()` would use, without planning again: the
+        last plan's total plus the messages appended since (prefix sums, O(1)).
+        Past the budget the packer compacts, so the estimate stops there.
+        """
+        n = len(history)
+        last = self._last
+        if last is None or last[0] is not history or last[1] > n:
+            total = fixed_tokens + history.window_tokens(n)[0]
+        else:
+            total = last[3] - last[2] + fixed_tokens + history.window_tokens(n - last[1])[0]
+        return min(total, max(self.budget, fixed_tokens))
+
+    def pack(self, history: HistoryStore, system_prompt: str, fixed_tokens: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Builds the message list for the model plus a usage report."""
+        if fixed_tokens is None: fixed_tokens = self.ledger.count(system_prompt)
+        plan = self.plan(history, fixed_tokens)
+        keep, summarized = plan["keep"], plan["summarized"]
+
+        messages = [{"role": "system", "content": system_prompt}]
+        pending: List[str] = []
+        omitted = plan["report"]["dropped_messages"]
+        for i in range(len(history)):
+            if i in summarized:
+                pending.append(history.summary_of(i)[0])
+                continue
+            if i not in keep: continue
+            if pending:
+                header = SUMMARY_HEADER + (f"\n(+{omitted} mensagens mais antigas omitidas)" if omitted else "")
+                messages.append({"role": "user", "content": header + "\n" + "\n".join(pending)})
+                pending, omitted = [], 0
+            msg = history[i]
+            if keep[i] < history.tokens_of(i):
+                msg = {**msg, "content": truncate_to_tokens(msg["content"], history.tokens_of(i), keep[i])}
+            messages.append(msg)
+        if pending:
+            messages.append({"role": "user", "content": SUMMARY_HEADER + "\n" + "\n".join(pending)})
+        return messages, plan["report"]
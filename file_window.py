@@ -0,0 +1,178 @@
+import os
+import re
+import mmap
+import bisect
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from note_edit import file_version
+
+# --- CONFIGURATION ---
+READ_MAX_BYTES = int(os.getenv("READ_MAX_BYTES", "32768"))            # window size returned to the model
+READ_PREVIEW_BYTES = int(os.getenv("READ_PREVIEW_BYTES", "6144"))     # default view of files larger than READ_MAX_BYTES
+HARD_MAX_BYTES = 1 << 20
+MMAP_THRESHOLD = 256 << 10   # smaller files are simply read
+SCAN_CHUNK = 1 << 20
+CHECKPOINT_EVERY = 1024      # byte offset kept for every Nth line
+MAX_HEADINGS = 2000     # indexed per file
+OUTLINE_HEADINGS = 25   # shown in a preview
+MAP_CACHE_SIZE = 32
+
+HEADING_RE = re.compile(rb"^(#{1,6})[ \t]+(.+?)[ \t#]*$", re.MULTILINE)
+
+class FileMap:
+    """
+    Line and heading index of one file version, built in a single chunked pass
+    over the buffer (bytes or mmap) without decoding or copying it whole.
+    """
+
+    def __init__(self, buf, size: int):
+        self.size = size
+        self.checkpoints: List[int] = [0]
+        self.headings: List[Tuple[int, int, str]] = []  # (line, level, title)
+        self.binary = b"\x00" in buf[:8192]
+        lines = 0
+        pos = 0
+        while pos < size:
+            end = min(size, pos + SCAN_CHUNK)
+            if end < size:
+                nl = buf.rfind(b"\n", pos, end)
+                if nl >= pos: end = nl + 1
+            chunk = buf[pos:end]
+            count = chunk.count(b"\n")
+            # checkpoints that fall inside this chunk
+            next_cp = len(self.checkpoints) * CHECKPOINT_EVERY
+            if lines + count >= next_cp:
+                i, seen = -1, lines
+                while seen < lines + count:
+                    i = chunk.index(b"\n", i + 1)
+                    seen += 1
+                    if seen == next_cp:
+                        self.checkpoints.append(pos + i + 1)
+                        next_cp += CHECKPOINT_EVERY
+            if not self.binary and len(self.headings) < MAX_HEADINGS:
+                last, line = 0, lines
+                for m in HEADING_RE.finditer(chunk):
+                    line += chunk.count(b"\n", last, m.start())
+                    last = m.start()
+                    self.headings.append((line + 1, len(m.group(1)), m.group(2).decode("utf-8", errors="replace")))
+                    if len(self.headings) >= MAX_HEADINGS: break
+            lines += count
+            pos = end
+        # a last line without a trailing newline still counts
+        self.lines = lines + (1 if size and buf[size - 1:size] != b"\n" else 0)
+
+    def line_start(self, buf, line: int) -> int:
+        """Byte offset where 1-based `line` starts (size if past the end)."""
+        if line <= 1: return 0
+        cp = min((line - 1) // CHECKPOINT_EVERY, len(self.checkpoints) - 1)
+        pos = self.checkpoints[cp]
+        for _ in range(line - 1 - cp * CHECKPOINT_EVERY):
+            nl = buf.find(b"\n", pos)
+            if nl < 0: return self.size
+            pos = nl + 1
+        return pos
+
+    def line_at(self, buf, offset: int) -> int:
+        """1-based line containing byte `offset`."""
+        cp = bisect.bisect_right(self.checkpoints, offset) - 1
+        return cp * CHECKPOINT_EVERY + buf[self.checkpoints[cp]:offset].count(b"\n") + 1
+
+_maps: "OrderedDict[Tuple[str, int, int], FileMap]" = OrderedDict()
+_maps_lock = threading.Lock()
+
+def _file_map(path: str, st: os.stat_result, buf) -> FileMap:
+    key = (path, st.st_size, st.st_mtime_ns)
+    with _maps_lock:
+        fmap = _maps.get(key)
+        if fmap is not None:
+            _maps.move_to_end(key)
+            return fmap
+    fmap = FileMap(buf, st.st_size)
+    with _maps_lock:
+        _maps[key] = fmap
+        while len(_maps) > MAP_CACHE_SIZE: _maps.popitem(last=False)
+    return fmap
+
+def read_window(path: str, offset: Optional[int] = None, start_line: Optional[int] = None,
+                end_line: Optional[int] = None, max_bytes: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Reads one window of a file. Files above MMAP_THRESHOLD are memory-mapped,
+    so only the pages of the window (and one indexing pass) are touched.
+
+    With no window arguments, files up to `max_bytes` are returned whole and
+    larger ones only as a preview of their first READ_PREVIEW_BYTES.
+    """
+    max_bytes = max(1, min(int(max_bytes or READ_MAX_BYTES), HARD_MAX_BYTES))
+    st = os.stat(path)
+    size = st.st_size
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size >= MMAP_THRESHOLD else None
+        buf = mm if mm is not None else f.read()
+        try:
+            fmap = _file_map(path, st, buf)
+            windowed = offset is not None or start_line is not None or end_line is not None
+            preview = not windowed and size > max_bytes
+            if start_line is not None or end_line is not None:
+                s = fmap.line_start(buf, max(1, int(start_line or 1)))
+                e = fmap.line_start(buf, int(end_line) + 1) if end_line is not None else size
+            elif offset is not None:
+                offset = max(0, min(int(offset), size))
+                # start at the beginning of the line holding `offset`
+                s = buf.rfind(b"\n", 0, offset) + 1 if offset else 0
+                e = size
+            else:
+                s, e = 0, size if not preview else min(size, READ_PREVIEW_BYTES)
+            truncated = preview or e - s > max_bytes
+            if e - s > max_bytes: e = s + max_bytes
+            if e < size:
+                # end on a line boundary when the window holds at least one full line
+                nl = buf.rfind(b"\n", s, e)
+                if nl >= s: e = nl + 1
+            text = "" if fmap.binary else bytes(buf[s:e]).decode("utf-8", errors="replace")
+            return {
+                "path": path,
+                "size": size,
+                "version": file_version(st),
+                "lines": fmap.lines,
+                "headings": fmap.headings,
+                "binary": fmap.binary,
+                "start_byte": s,
+                "end_byte": e,
+                "start_line": fmap.line_at(buf, s),
+                "end_line": fmap.line_at(buf, max(s, e - 1)) if e > s else fmap.line_at(buf, s),
+                "truncated": truncated,
+                "preview": preview,
+                "text": text,
+            }
+        finally:
+            if mm is not None: mm.close()
+
+def human_size(n: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if n < 1024 or unit == "MB": return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+def format_window(w: Dict[str, Any]) -> str:
+    """Tool output: a short header (size, lines, outline of large files) plus the window."""
+    partial = w["truncated"] or w["start_byte"] > 0 or w["end_byte"] < w["size"]
+    header = [f"[METADATA] Source: {w['path']} | {human_size(w['size'])} | {w['lines']} linhas | versão {w['version']}"]
+    if w["binary"]:
+        header.append("[BINARY] Arquivo binário; conteúdo não exibido.")
+        return "\n".join(header)
+    if partial:
+        header.append(f"[WINDOW] linhas {w['start_line']}-{w['end_line']} (bytes {w['start_byte']}-{w['end_byte']})")
+    if w["preview"] and w["headings"]:
+        shown = w["headings"][:OUTLINE_HEADINGS]
+        more = f" | ... (+{len(w['headings']) - len(shown)})" if len(w["headings"]) > len(shown) else ""
+        header.append("[HEADINGS] " + " | ".join(f"L{line} {'#' * level} {title}" for line, level, title in shown) + more)
+    elif partial and w["headings"]:
+        # the section the window starts in
+        i = bisect.bisect_right([h[0] for h in w["headings"]], w["start_line"]) - 1
+        if i >= 0: header.append(f"[SECTION] L{w['headings'][i][0]} {'#' * w['headings'][i][1]} {w['headings'][i][2]}")
+    if w["preview"]:
+        header.append("[PREVIEW] Arquivo grande: mostrando só o início. Use start_line/end_line, offset ou max_bytes para ler outras partes.")
+    elif w["truncated"]:
+        header.append(f"[TRUNCATED] Janela limitada; continue com start_line={w['end_line'] + 1}.")
+    return "\n".join(header) + "\n[CONTENT]\n" + w["text"]
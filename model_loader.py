@@ -0,0 +1,143 @@
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+
+# --- CONFIGURATION ---
+# Load the GGUF on a background thread while the first prompt is on screen
+BACKGROUND_LOAD = os.getenv("MODEL_BACKGROUND_LOAD", "1") != "0"
+# Evaluate one token right after loading, so the first real step doesn't pay for kernel/graph setup
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") != "0"
+
+def model_params(suffix: str = "") -> Dict[str, Any]:
+    """`Llama` options taken from the environment; with a suffix (`FAST`), `MODEL_THREADS_FAST` etc. override the defaults."""
+    def env(name: str, default: str) -> str:
+        value = os.getenv(name, default)
+        return os.getenv(f"{name}_{suffix}", value) if suffix else value
+    return {
+        "n_gpu_layers": int(env("MODEL_GPU_LAYERS", "40")),
+        "main_gpu": int(env("MODEL_MAIN_GPU", "0")),
+        "n_threads": int(env("MODEL_THREADS", "8")),
+        "use_mmap": env("MODEL_MMAP", "1") != "0",
+        "use_mlock": env("MODEL_MLOCK", "0") == "1",
+    }
+
+def require_model(model_path: Optional[str]):
+    if not model_path or not os.path.exists(model_path):
+        print(f"❌ Error: Model not found at {model_path}")
+        print("Please set MODEL_PATH in your .env file.")
+        sys.exit(1)
+
+# --- PROFILE ---
+class StartupProfile:
+    """Wall-clock phases of startup (from any thread), relative to when the profile was created."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[str, float, float, str]] = []  # (name, start_ms, elapsed_ms, thread)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try: yield
+        finally: self.record(name, start)
+
+    def record(self, name: str, start: float, end: Optional[float] = None):
+        end = time.perf_counter() if end is None else end
+        with self._lock:
+            self.phases.append((name, (start - self.started) * 1000, (end - start) * 1000, threading.current_thread().name))
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {name: {"start_ms": round(start, 1), "ms": round(ms, 1), "thread": thread} for name, start, ms, thread in self.phases}
+
+    def report(self) -> str:
+        with self._lock: phases = sorted(self.phases, key=lambda p: p[1])
+        width = max((len(p[0]) for p in phases), default=5)
+        lines = [f"{'phase':<{width}}  {'start':>9}  {'took':>9}  thread"]
+        for name, start, ms, thread in phases:
+            lines.append(f"{name:<{width}}  {start:>7.1f}ms  {ms:>7.1f}ms  {thread}")
+        if phases:
+            lines.append(f"{'total':<{width}}  {'':>9}  {max(s + ms for _, s, ms, _ in phases):>7.1f}ms")
+        return "\n".join(lines)
+
+# --- LOADING ---
+def load_model(model_path: Optional[str], n_ctx: int = 8192, profile: Optional[StartupProfile] = None,
+               params: Optional[Dict[str, Any]] = None, speculative: Optional[Dict[str, Any]] = None) -> Any:
+    require_model(model_path)
+    profile = profile or StartupProfile()
+    print(f"⏳ Loading model: {os.path.basename(model_path)}...")
+    with profile.phase("import llama_cpp"):
+        from llama_cpp import Llama
+        from speculative import build_draft, speculative_config
+    draft = build_draft(speculative or speculative_config(), n_ctx)
+    with profile.phase("load model"):
+        llm = Llama(model_path=model_path, n_ctx=n_ctx, verbose=False, draft_model=draft, **(params or model_params()))
+    if MODEL_WARMUP:
+        with profile.phase("model warm-up"):
+            llm.eval([llm.token_bos()])
+            llm.reset()
+    return llm
+
+class ModelHandle:
+    """
+    A `Llama` loading on a background thread.
+
+    Attribute access waits for the load (and re-raises its error), so the
+    engines can hold it like the model itself and only block on their first
+    real use of it; `set_cache()` before that is deferred to the loader.
+    """
+
+    def __init__(self, model_path: Optional[str], n_ctx: int = 8192, profile: Optional[StartupProfile] = None):
+        require_model(model_path)
+        self.profile = profile or StartupProfile()
+        self._llm: Any = None
+        self._error: Optional[BaseException] = None
+        self._cache: Any = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._load, args=(model_path, n_ctx), name="model-load", daemon=True)
+        self._thread.start()
+
+    def _load(self, model_path: str, n_ctx: int):
+        try:
+            llm = load_model(model_path, n_ctx, self.profile)
+            with self._lock:
+                if self._cache is not None: llm.set_cache(self._cache)
+                self._llm = llm
+        except BaseException as e:
+            self._error = e
+        finally:
+            self._ready.set()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def get(self) -> Any:
+        if not self._ready.is_set():
+            print("⏳ Waiting for the model to finish loading...")
+            start = time.perf_counter()
+            self._ready.wait()
+            self.profile.record("wait for model", start)
+        if self._error is not None: raise RuntimeError(f"Model failed to load: {self._error}") from self._error
+        return self._llm
+
+    def set_cache(self, cache: Any):
+        with self._lock:
+            if self._llm is None and self._error is None:
+                self._cache = cache
+                return
+        self.get().set_cache(cache)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get(), name)
+
+def open_model(model_path: Optional[str], n_ctx: int = 8192, profile: Optional[StartupProfile] = None,
+               background: bool = BACKGROUND_LOAD) -> Any:
+    """The model for an interactive engine: a `ModelHandle` loading behind the first prompt, or loaded right away."""
+    if background: return ModelHandle(model_path, n_ctx, profile)
+    return load_model(model_path, n_ctx, profile)
@@ -0,0 +1,178 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Iterator, Optional
+
+from model_loader import load_model, model_params
+from speculative import speculative_config
+
+# --- CONFIGURATION ---
+# Resident models (GGUF size) beyond this are unloaded, least recently used first; the default model always stays
+CAPACITY_BYTES = int(os.getenv("MODEL_POOL_MB", "24576")) << 20
+DEFAULT = "default"
+
+def model_config(name: str, n_ctx: int) -> Optional[Dict[str, Any]]:
+    """
+    Where an agent's `model:` comes from: `MODEL_PATH_<NAME>` (e.g. `model: "fast"`
+    -> `MODEL_PATH_FAST`), with `MODEL_CTX_<NAME>`, `MODEL_THREADS_<NAME>` etc.
+    overriding the default model's settings. A `.gguf` path works as a name too.
+    """
+    if name.endswith(".gguf"):
+        return {"path": name, "n_ctx": n_ctx, "params": model_params(), "speculative": speculative_config()}
+    suffix = name.upper().replace("-", "_")
+    path = os.getenv(f"MODEL_PATH_{suffix}")
+    if not path: return None
+    return {"path": path, "n_ctx": int(os.getenv(f"MODEL_CTX_{suffix}", n_ctx)), "params": model_params(suffix),
+            "speculative": speculative_config(suffix)}
+
+class ModelPool:
+    """
+    The models the engine's agents run on, by the name in their `model:` field.
+
+    `default` is the engine's own model. Other names are loaded on first use
+    and kept while they fit in `capacity_bytes` (estimated from the GGUF
+    size); past that, the least recently used idle ones are closed. Names
+    without a configured GGUF fall back to the default model. Pooled models
+    serve one generation at a time (`use()` holds their lock); per-model
+    steps, decoded tokens and latency are kept for the traces and /metrics.
+    """
+
+    def __init__(self, default_llm: Any, n_ctx: int = 8192, capacity_bytes: int = CAPACITY_BYTES,
+                 default_path: Optional[str] = None, default_cache: Any = None,
+                 cache_factory: Optional[Callable[[str], Any]] = None,
+                 loader: Callable[..., Any] = load_model):
+        self.n_ctx = n_ctx
+        self.capacity_bytes = capacity_bytes
+        self.cache_factory = cache_factory
+        self.loader = loader
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._entries[DEFAULT] = self._entry(default_llm, default_path, default_cache)
+        self._entries[DEFAULT]["lock"] = None  # shared as before: the CLI runs one step at a time, server.py schedules it
+        self._fallbacks: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def _entry(llm: Any, path: Optional[str], cache: Any) -> Dict[str, Any]:
+        size = os.path.getsize(path) if path and os.path.exists(path) else 0
+        return {"llm": llm, "path": path, "bytes": size, "cache": cache, "lock": threading.Lock(), "users": 0}
+
+    def resolve(self, name: Optional[str]) -> str:
+        """The pool name an agent's `model:` runs on (unconfigured names fall back to the default)."""
+        name = name or DEFAULT
+        if name == DEFAULT or name in self._entries: return name
+        if name in self._fallbacks: return self._fallbacks[name]
+        config = model_config(name, self.n_ctx)
+        if config is None or not os.path.exists(config["path"]):
+            where = config["path"] if config else f"MODEL_PATH_{name.upper().replace('-', '_')}"
+            print(f"ℹ️  Model '{name}' not available ({where}); using the default model.")
+            self._fallbacks[name] = DEFAULT
+            return DEFAULT
+        return name
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(e["bytes"] for e in self._entries.values())
+
+    def _load(self, name: str) -> Dict[str, Any]:
+        config = model_config(name, self.n_ctx)
+        incoming = os.path.getsize(config["path"])
+        with self._lock:
+            # Make room first, so two models are never loading into memory that only fits one
+            for old in [n for n in self._entries if n != DEFAULT]:
+                if self.resident_bytes + incoming <= self.capacity_bytes: break
+                if self._entries[old]["users"] == 0 and self._entries[old]["llm"] is not None: self._unload(old)
+        if self.resident_bytes + incoming > self.capacity_bytes:
+            print(f"⚠️  Model pool over its cap ({(self.resident_bytes + incoming) >> 20}/{self.capacity_bytes >> 20} MB) to load '{name}'.")
+
+        start = time.perf_counter()
+        llm = self.loader(config["path"], config["n_ctx"], params=config["params"], speculative=config["speculative"])
+        cache = self.cache_factory(config["path"]) if self.cache_factory else None
+        if cache is not None: cache.attach(llm)
+        m = self._metrics(name)
+        m["loads"] += 1
+        m["load_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return self._entry(llm, config["path"], cache)
+
+    def _unload(self, name: str):
+        entry = self._entries.pop(name)
+        close = getattr(entry["llm"], "close", None)
+        if close: close()
+        self._metrics(name)["unloads"] += 1
+        print(f"♻️  Unloaded model '{name}' ({entry['bytes'] >> 20} MB) to stay under the pool cap.")
+
+    def _metrics(self, name: str) -> Dict[str, Any]:
+        return self.metrics.setdefault(name, {"loads": 0, "unloads": 0, "load_ms": 0.0, "steps": 0, "decode_tokens": 0,
+                                              "generate_ms": 0.0, "ttft_ms": 0.0})
+
+    @contextmanager
+    def use(self, name: Optional[str]) -> Iterator[Any]:
+        """The model for one generation step, loaded if needed and kept from unloading while in use."""
+        name = self.resolve(name)
+        # Lookup, LRU touch and user count in one step, so an eviction never sees the entry idle in between
+        with self._lock:
+            entry = self._entries.get(name)
+            loading = entry is None
+            if loading:
+                # Published with its lock already held, so later users of the name wait until the load is done
+                entry = {"llm": None, "path": None, "bytes": 0, "cache": None, "lock": threading.Lock(), "users": 0}
+                entry["lock"].acquire()
+                self._entries[name] = entry
+            self._entries.move_to_end(name)
+            entry["users"] += 1
+        try:
+            if loading:
+                try:
+                    try: loaded = self._load(name)
+                    except BaseException:
+                        with self._lock: self._entries.pop(name, None)
+                        raise
+                    with self._lock: entry.update({k: v for k, v in loaded.items() if k not in ("lock", "users")})
+                    yield entry["llm"]
+                finally:
+                    entry["lock"].release()
+            elif entry["lock"] is None:
+                yield entry["llm"]
+            else:
+                with entry["lock"]:
+                    if entry["llm"] is None: raise RuntimeError(f"Model '{name}' failed to load.")
+                    yield entry["llm"]
+        finally:
+            with self._lock: entry["users"] -= 1
+
+    def prompt_cache(self, name: Optional[str]) -> Any:
+        entry = self._entries.get(self.resolve(name))
+        return entry["cache"] if entry else None
+
+    def draft(self, name: Optional[str]) -> Any:
+        """The model's speculative decoding tracker (speculative.py), if it decodes with drafts."""
+        entry = self._entries.get(self.resolve(name))
+        if entry is None or entry["llm"] is None or not getattr(entry["llm"], "ready", True): return None
+        draft = getattr(entry["llm"], "draft_model", None)
+        return draft if hasattr(draft, "step") else None
+
+    def record(self, name: Optional[str], stats: Dict[str, Any]):
+        """Adds one generation step (as returned by `_generate`) to the model's metrics."""
+        with self._lock:
+            m = self._metrics(self.resolve(name))
+            m["steps"] += 1
+            m["decode_tokens"] += stats.get("decode_tokens", 0)
+            m["generate_ms"] += stats.get("total_ms", 0.0)
+            m["ttft_ms"] += stats.get("ttft_ms", 0.0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = {}
+            for name, m in self.metrics.items():
+                steps = m["steps"] or 1
+                models[name] = {**m, "generate_ms": round(m["generate_ms"], 1), "ttft_ms": round(m["ttft_ms"], 1),
+                                "mean_step_ms": round(m["generate_ms"] / steps, 1), "mean_ttft_ms": round(m["ttft_ms"] / steps, 1),
+                                "tokens_per_s": round(m["decode_tokens"] / (m["generate_ms"] / 1000), 1) if m["generate_ms"] else 0.0,
+                                "resident": name in self._entries}
+            drafts = {name: self.draft(name) for name in self._entries}
+            for name, draft in drafts.items():
+                if draft is not None: models.setdefault(name, {})["speculative"] = draft.stats()
+            return {"resident": list(self._entries), "resident_mb": self.resident_bytes >> 20,
+                    "capacity_mb": self.capacity_bytes >> 20, "fallbacks": dict(self._fallbacks), "models": models}
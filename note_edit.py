@@ -0,0 +1,281 @@
+import os
+import re
+import time
+import hashlib
+import tempfile
+from typing import Dict, Any, Optional, Iterator, Callable
+
+CHUNK_SIZE = 1 << 20
+
+HEADING_RE = re.compile(rb"^(#{1,6})[ \t]+(.+?)[ \t#]*\r?$")
+FENCE_RE = re.compile(rb"^\s*(```|~~~)")
+BLOCK_ID_RE = r"(?:^|\s)\^{}\s*$"
+LIST_ITEM_RE = re.compile(rb"^\s*(?:[-*+]|\d+[.)])\s+(?:\[.\]\s+)?")
+
+SECTION_OPERATIONS = {"append_under_heading", "prepend_under_heading", "replace_under_heading"}
+BLOCK_OPERATIONS = {"replace_block", "insert_after_block"}
+OPERATIONS = {"append", "replace"} | SECTION_OPERATIONS | BLOCK_OPERATIONS
+
+class EditError(Exception):
+    pass
+
+class EditConflict(EditError):
+    """The file changed since the version the caller based its edit on."""
+
+# --- VERSIONS ---
+def file_version(st: os.stat_result) -> str:
+    """Cheap version token (mtime + size), shown by read_file and checked by edits."""
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+def content_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""): h.update(chunk)
+    return h.hexdigest()
+
+def check_precondition(path: str, expected_version: Optional[str] = None, expected_hash: Optional[str] = None) -> os.stat_result:
+    st = os.stat(path)
+    if expected_version and expected_version != file_version(st):
+        raise EditConflict(f"{path} mudou desde a leitura (versão {file_version(st)}, esperada {expected_version}). Leia de novo antes de editar.")
+    if expected_hash and not content_hash(path).startswith(expected_hash.lower()):
+        raise EditConflict(f"{path} mudou desde a leitura (hash diferente). Leia de novo antes de editar.")
+    return st
+
+# --- ATOMIC REWRITE ---
+def rewrite(path: str, transform: Callable[[Iterator[bytes], Callable[[bytes], None]], Dict[str, Any]],
+            expected_version: Optional[str] = None, expected_hash: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Streams `path` through `transform(chunks, write)` into a temp file in the
+    same directory, then renames it over the original. The precondition is
+    checked before reading and again right before the rename, so a concurrent
+    writer (e.g. Obsidian) makes the edit fail instead of being overwritten.
+    """
+    st = check_precondition(path, expected_version, expected_hash)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with open(path, "rb") as src, os.fdopen(fd, "wb") as dst:
+            stats = transform(iter(lambda: src.read(CHUNK_SIZE), b""), dst.write)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.chmod(tmp, st.st_mode & 0o7777)
+        if file_version(os.stat(path)) != file_version(st):
+            raise EditConflict(f"{path} foi alterado durante a edição; nada foi gravado.")
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+    return stats
+
+def atomic_write(path: str, content: str, expected_version: Optional[str] = None) -> None:
+    """Whole-file write through a temp file and rename."""
+    if expected_version and os.path.exists(path): check_precondition(path, expected_version)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path): os.chmod(tmp, os.stat(path).st_mode & 0o7777)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+
+# --- OPERATIONS ---
+def append(path: str, text: str, expected_version: Optional[str] = None) -> Dict[str, Any]:
+    """O(1) append: only the last byte is read, to keep the text on its own line."""
+    check_precondition(path, expected_version)
+    data = text.encode("utf-8")
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n": data = b"\n" + data
+        f.seek(0, os.SEEK_END)
+        f.write(data)
+    return {"bytes_written": len(data)}
+
+def _replace_transform(target: bytes, new: bytes, limit: Optional[int]):
+    def transform(chunks, write):
+        occurrences = replaced = 0
+        pending = b""
+        def scan(buf: bytes, final: bool) -> int:
+            nonlocal occurrences, replaced
+            # a match starting before `safe` is complete within buf
+            safe = len(buf) if final else len(buf) - len(target) + 1
+            pos = 0
+            while True:
+                i = buf.find(target, pos)
+                if i < 0 or i >= safe: break
+                occurrences += 1
+                if limit is None or replaced < limit:
+                    write(buf[pos:i] + new)
+                    replaced += 1
+                else:
+                    write(buf[pos:i + len(target)])
+                pos = i + len(target)
+            end = max(pos, safe)
+            write(buf[pos:end])
+            return end
+        for chunk in chunks:
+            buf = pending + chunk
+            pending = buf[scan(buf, final=False):]
+        scan(pending, final=True)
+        return {"occurrences": occurrences, "replaced": replaced}
+    return transform
+
+def replace(path: str, target_text: str, text: str, max_replacements: Optional[int] = None,
+            expected_version: Optional[str] = None, expected_hash: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Streaming replace. Without `max_replacements` the target must occur exactly
+    once; an ambiguous target is an error instead of a silent replace-all.
+    `max_replacements=0` replaces every occurrence.
+    """
+    if not target_text: raise EditError("'target_text' is required for replace operation.")
+    limit = 1 if max_replacements is None else (None if max_replacements == 0 else max_replacements)
+    stats = {}
+    def guarded(chunks, write):
+        stats.update(_replace_transform(target_text.encode("utf-8"), text.encode("utf-8"), limit)(chunks, write))
+        if stats["occurrences"] == 0:
+            raise EditError("'target_text' not found in file.")
+        if max_replacements is None and stats["occurrences"] > 1:
+            raise EditError(f"'target_text' aparece {stats['occurrences']} vezes. Use um trecho mais específico ou informe max_replacements (0 = todas).")
+        return stats
+    rewrite(path, guarded, expected_version, expected_hash)
+    return stats
+
+def _lines(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    pending = b""
+    for chunk in chunks:
+        pending += chunk
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        for line in lines: yield line + b"\n"
+    if pending: yield pending
+
+def _heading_matches(hm: "re.Match", wanted_level: Optional[int], wanted_title: str) -> bool:
+    title = hm.group(2).decode("utf-8", errors="replace").strip().casefold()
+    return title == wanted_title and (not wanted_level or len(hm.group(1)) == wanted_level)
+
+def _as_block(text: str) -> bytes:
+    data = text.encode("utf-8")
+    return data if data.endswith(b"\n") else data + b"\n"
+
+def edit_section(path: str, operation: str, heading: str, text: str, expected_version: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Edits the body of one Markdown heading: the lines after it up to the next
+    heading of any level, so subsections are never rewritten by accident.
+    `heading` may include the hashes ("## Tarefas") to pin the level; the
+    title match ignores case. Headings inside code fences are ignored.
+    """
+    m = re.match(r"^\s*(#{1,6})?\s*(.+?)\s*$", heading or "")
+    if not m: raise EditError("'heading' is required for this operation.")
+    wanted_level = len(m.group(1)) if m.group(1) else None
+    wanted_title = m.group(2).casefold()
+    block = _as_block(text)
+
+    def transform(chunks, write):
+        in_fence = False
+        level = None      # level of the matched heading while inside its body
+        body = []         # the section body, held until the section ends
+        matches = 0
+
+        def close_section():
+            nonlocal level
+            # blank lines that separate the section from the next heading stay in place
+            end = len(body)
+            while end and not body[end - 1].strip(): end -= 1
+            if operation == "append_under_heading":
+                for line in body[:end]: write(line)
+                if end and not body[end - 1].endswith(b"\n"): write(b"\n")
+            write(block)
+            for line in body[end:]: write(line)
+            body.clear()
+            level = None
+
+        for line in _lines(chunks):
+            fence = FENCE_RE.match(line) is not None
+            hm = HEADING_RE.match(line.rstrip(b"\n")) if not (in_fence or fence) else None
+            if fence: in_fence = not in_fence
+            if level is not None:
+                if not hm:
+                    body.append(line)
+                    continue
+                close_section()
+            if hm and _heading_matches(hm, wanted_level, wanted_title):
+                matches += 1
+                if matches > 1: raise EditError(f"Mais de um título '{heading}' no arquivo; inclua o nível (ex: '## {m.group(2)}').")
+                write(line if line.endswith(b"\n") else line + b"\n")
+                if operation == "prepend_under_heading": write(block)
+                else: level = len(hm.group(1))
+                continue
+            write(line)
+        if level is not None: close_section()
+        if not matches: raise EditError(f"Título '{heading}' não encontrado.")
+        return {"occurrences": matches, "replaced": 1}
+
+    return rewrite(path, transform, expected_version)
+
+def edit_block(path: str, operation: str, block_id: str, text: str, expected_version: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Edits the Obsidian block (paragraph or list item) tagged `^block_id`.
+    `replace_block` keeps the id on the new text; `insert_after_block` adds a
+    new line right after the block.
+    """
+    block_id = (block_id or "").lstrip("^").strip()
+    if not block_id: raise EditError("'block_id' is required for this operation.")
+    tag_re = re.compile(BLOCK_ID_RE.format(re.escape(block_id)).encode("utf-8"))
+    new = text.rstrip("\n").encode("utf-8")
+
+    def transform(chunks, write):
+        matches = 0
+        paragraph = []    # plain lines of the current paragraph; a tag on its last line names all of them
+
+        def flush():
+            for line in paragraph: write(line)
+            paragraph.clear()
+
+        for line in _lines(chunks):
+            stripped = line.rstrip(b"\r\n")
+            item = LIST_ITEM_RE.match(stripped)
+            if not tag_re.search(stripped):
+                if item or not stripped.strip() or HEADING_RE.match(stripped):
+                    # list items and headings are blocks of their own; blank lines end paragraphs
+                    flush()
+                    write(line)
+                else:
+                    paragraph.append(line)
+                continue
+
+            matches += 1
+            eol = line[len(stripped):] or b"\n"
+            if operation == "insert_after_block":
+                flush()
+                write(stripped + eol)
+                write(new + b"\n")
+                continue
+            # replace_block: a list item keeps its marker unless the new text brings one
+            if item: flush()
+            else: paragraph.clear()
+            prefix = item.group(0) if item and not LIST_ITEM_RE.match(new) else b""
+            write(prefix + new + b" ^" + block_id.encode("utf-8") + eol)
+        flush()
+        if not matches: raise EditError(f"Bloco '^{block_id}' não encontrado.")
+        return {"occurrences": matches, "replaced": matches}
+
+    return rewrite(path, transform, expected_version)
+
+def apply_edit(path: str, operation: str, text: str, target_text: Optional[str] = None, heading: Optional[str] = None,
+               block_id: Optional[str] = None, max_replacements: Optional[int] = None,
+               expected_version: Optional[str] = None) -> Dict[str, Any]:
+    """Routes an `edit_file` tool call. Returns stats plus the new file version."""
+    if not os.path.exists(path): raise EditError(f"File {path} not found.")
+    start = time.perf_counter()
+    if operation == "append": stats = append(path, text, expected_version)
+    elif operation == "replace": stats = replace(path, target_text, text, max_replacements, expected_version)
+    elif operation in SECTION_OPERATIONS: stats = edit_section(path, operation, heading, text, expected_version)
+    elif operation in BLOCK_OPERATIONS: stats = edit_block(path, operation, block_id, text, expected_version)
+    else: raise EditError(f"Invalid operation. Use one of: {', '.join(sorted(OPERATIONS))}.")
+    return {**stats, "version": file_version(os.stat(path)), "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)}
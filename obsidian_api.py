@@ -0,0 +1,121 @@
+import os
+import json
+from urllib.parse import quote
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+# --- CONFIGURATION ---
+DEFAULT_BASE_URL = "https://127.0.0.1:27124"
+DEFAULT_TIMEOUT = (3.05, 30)  # (connect, read) seconds
+
+READ_OPERATIONS = {"read", "list", "active", "periodic", "commands"}
+WRITE_OPERATIONS = {"put", "append", "open", "run_command"}
+
+class ObsidianAPIError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+class ObsidianClient:
+    """
+    Client for the Obsidian Local REST API plugin.
+
+    One keep-alive `requests.Session` is shared by every call, so the TLS
+    handshake and TCP connection are paid once instead of per `curl` process.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, token: Optional[str] = None,
+                 timeout: Tuple[float, float] = DEFAULT_TIMEOUT, pool_size: int = 8, verify: Optional[bool] = None):
+        self.base_url = (base_url or os.getenv("OBSIDIAN_API_URL", DEFAULT_BASE_URL)).rstrip("/")
+        self.timeout = timeout
+        token = token if token is not None else os.getenv("OBSIDIAN_API_TOKEN", "")
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if token: self.session.headers["Authorization"] = f"Bearer {token}"
+
+        # The plugin serves a self-signed certificate (same as `curl -k`)
+        if verify is None: verify = os.getenv("OBSIDIAN_VERIFY_TLS", "0") == "1"
+        self.session.verify = verify
+        if not verify: urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+    # --- HTTP ---
+    def _request(self, method: str, endpoint: str, data: Optional[str] = None, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        resp = self.session.request(
+            method, f"{self.base_url}{endpoint}",
+            data=data.encode("utf-8") if data is not None else None,
+            headers=headers, timeout=self.timeout
+        )
+        if resp.status_code >= 400:
+            try: message = resp.json().get("message", resp.text)
+            except ValueError: message = resp.text
+            raise ObsidianAPIError(resp.status_code, message or resp.reason)
+        return resp
+
+    @staticmethod
+    def _path(path: str) -> str:
+        return quote(path.lstrip("/"), safe="/")
+
+    # --- OPERATIONS ---
+    def read(self, path: str) -> str:
+        return self._request("GET", f"/vault/{self._path(path)}", headers={"Accept": "text/markdown"}).text
+
+    def list(self, path: str = "") -> List[str]:
+        folder = self._path(path).rstrip("/")
+        return self._request("GET", f"/vault/{folder}/" if folder else "/vault/").json().get("files", [])
+
+    def active(self) -> Dict[str, Any]:
+        return self._request("GET", "/active/", headers={"Accept": "application/vnd.olra.json"}).json()
+
+    def periodic(self, period: str = "daily") -> str:
+        return self._request("GET", f"/periodic/{quote(period)}/", headers={"Accept": "text/markdown"}).text
+
+    def put(self, path: str, content: str) -> None:
+        self._request("PUT", f"/vault/{self._path(path)}", data=content, headers={"Content-Type": "text/markdown"})
+
+    def append(self, path: str, content: str) -> None:
+        self._request("POST", f"/vault/{self._path(path)}", data=content, headers={"Content-Type": "text/markdown"})
+
+    def open(self, path: str) -> None:
+        self._request("POST", f"/open/{self._path(path)}")
+
+    def commands(self) -> List[Dict[str, str]]:
+        return self._request("GET", "/commands/").json().get("commands", [])
+
+    def run_command(self, command_id: str) -> None:
+        self._request("POST", f"/commands/{quote(command_id, safe='')}/")
+
+    def close(self):
+        self.session.close()
+
+# --- TOOL ADAPTER ---
+def call_operation(client: ObsidianClient, operation: str, path: str = "", content: str = "",
+                   period: str = "daily", command_id: str = "") -> Union[str, List, Dict]:
+    """Routes an `obsidian_api` tool call to the client."""
+    if operation == "read": return client.read(path)
+    if operation == "list": return client.list(path)
+    if operation == "active": return client.active()
+    if operation == "periodic": return client.periodic(period or "daily")
+    if operation == "commands": return client.commands()
+    if operation == "put":
+        client.put(path, content)
+        return f"Nota {path} gravada."
+    if operation == "append":
+        client.append(path, content)
+        return f"Texto adicionado ao final de {path}."
+    if operation == "open":
+        client.open(path)
+        return f"Nota {path} aberta no Obsidian."
+    if operation == "run_command":
+        client.run_command(command_id)
+        return f"Comando {command_id} executado."
+    raise ValueError(f"Invalid operation '{operation}'. Use one of: {', '.join(sorted(READ_OPERATIONS | WRITE_OPERATIONS))}.")
+
+def format_response(data: Union[str, List, Dict]) -> str:
+    if isinstance(data, str): return data or "(Nota vazia)"
+    return json.dumps(data, indent=2, ensure_ascii=False)
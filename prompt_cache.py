@@ -0,0 +1,162 @@
+import os
+import pickle
+import hashlib
+from array import array
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+# --- UTILS ---
+def longest_token_prefix(a: Sequence[int], b: Sequence[int]) -> int:
+    n = 0
+    for x, y in zip(a, b):
+        if x != y: break
+        n += 1
+    return n
+
+def prefix_hash(tokens: Sequence[int]) -> str:
+    """Stable hash of a token sequence, used as the snapshot key."""
+    return hashlib.sha1(array("i", tokens).tobytes()).hexdigest()
+
+def order_segments(segments: List[Tuple[str, str, int]]) -> str:
+    """
+    Joins prompt segments sorted from most to least stable.
+    Each segment is (name, text, stability); higher stability goes first so the
+    shared prefix between consecutive steps is as long as possible.
+    """
+    ordered = sorted(segments, key=lambda s: -s[2])
+    return "\n\n".join(text for _, text, _ in ordered if text)
+
+# --- CACHE ---
+class PrefixStateCache:
+    """
+    KV-state snapshots keyed by prefix hash, with a RAM tier and a disk-backed LRU.
+
+    Plugs into `Llama.set_cache()`: llama.cpp asks for the longest cached prefix
+    of every prompt and restores it only when it beats what is already evaluated
+    in the live context. Entries evicted from RAM spill to `disk_dir`. Duck-types
+    `BaseLlamaCache`, so importing it doesn't pull in llama_cpp.
+    """
+
+    def __init__(self, capacity_bytes: int = 2 << 30, disk_dir: Optional[str] = None, disk_capacity_bytes: int = 8 << 30):
+        self.capacity_bytes = capacity_bytes
+        self.ram: "OrderedDict[str, Tuple[Tuple[int, ...], Any]]" = OrderedDict()
+        self.disk: "OrderedDict[str, Tuple[Tuple[int, ...], int]]" = OrderedDict()
+        self.disk_dir = disk_dir
+        self.disk_capacity_bytes = disk_capacity_bytes
+        self.llm: Optional[Any] = None
+
+        self.totals = {"lookups": 0, "hits": 0, "prompt_tokens": 0, "reused_tokens": 0}
+        self.last_lookup: Dict[str, Any] = {}
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    def attach(self, llm: Any):
+        """Registers the cache on a model so lookups can see its live context."""
+        self.llm = llm
+        llm.set_cache(self)
+
+    # --- SIZE ---
+    @property
+    def cache_size(self) -> int:
+        return sum(state.llama_state_size for _, state in self.ram.values())
+
+    @property
+    def disk_size(self) -> int:
+        return sum(size for _, size in self.disk.values())
+
+    # --- DISK TIER ---
+    def _disk_path(self, key: str, ext: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.{ext}")
+
+    def _load_disk_index(self):
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith(".tok"): continue
+            key = name[:-4]
+            state_path = self._disk_path(key, "state")
+            if not os.path.exists(state_path): continue
+            tokens = array("i")
+            with open(self._disk_path(key, "tok"), "rb") as f: tokens.frombytes(f.read())
+            entries.append((os.path.getatime(state_path), key, tuple(tokens), os.path.getsize(state_path)))
+        for _, key, tokens, size in sorted(entries):
+            self.disk[key] = (tokens, size)
+
+    def _spill(self, key: str, tokens: Tuple[int, ...], state: Any):
+        if not self.disk_dir: return
+        with open(self._disk_path(key, "state"), "wb") as f: pickle.dump(state, f)
+        with open(self._disk_path(key, "tok"), "wb") as f: f.write(array("i", tokens).tobytes())
+        self.disk[key] = (tokens, os.path.getsize(self._disk_path(key, "state")))
+        while self.disk and self.disk_size > self.disk_capacity_bytes:
+            old_key, _ = self.disk.popitem(last=False)
+            self._drop_disk(old_key)
+
+    def _drop_disk(self, key: str):
+        for ext in ("state", "tok"):
+            try: os.remove(self._disk_path(key, ext))
+            except OSError: pass
+
+    # --- LOOKUP ---
+    def _find_longest_prefix_key(self, key: Tuple[int, ...]) -> Optional[Tuple[str, int]]:
+        best, best_len = None, 0
+        for tier in (self.ram, self.disk):
+            for h, entry in tier.items():
+                n = longest_token_prefix(entry[0], key)
+                if n > best_len: best, best_len = h, n
+        return (best, best_len) if best else None
+
+    def __getitem__(self, key: Sequence[int]) -> Any:
+        key = tuple(key)
+        live = longest_token_prefix(self.llm._input_ids.tolist(), key) if self.llm is not None else 0
+        found = self._find_longest_prefix_key(key)
+        cached = found[1] if found else 0
+
+        self.totals["lookups"] += 1
+        self.totals["prompt_tokens"] += len(key)
+        source = "live" if live and live >= cached else "miss"
+
+        state = None
+        if found and cached > live:
+            h = found[0]
+            if h in self.ram:
+                self.ram.move_to_end(h)
+                state, source = self.ram[h][1], "ram"
+            else:
+                with open(self._disk_path(h, "state"), "rb") as f: state = pickle.load(f)
+                self.disk.move_to_end(h)
+                os.utime(self._disk_path(h, "state"))
+                source = "disk"
+
+        reused = max(live, cached)
+        self.totals["reused_tokens"] += reused
+        if reused: self.totals["hits"] += 1
+        self.last_lookup = {"prompt_tokens": len(key), "reused_tokens": reused, "source": source,
+                            "reuse_ratio": round(reused / len(key), 3) if key else 0.0}
+
+        if state is None: raise KeyError("No better prefix cached")
+        return state
+
+    def __contains__(self, key: Sequence[int]) -> bool:
+        return self._find_longest_prefix_key(tuple(key)) is not None
+
+    def __setitem__(self, key: Sequence[int], value: Any):
+        key = tuple(key)
+        h = prefix_hash(key)
+        if h in self.ram: del self.ram[h]
+        self.ram[h] = (key, value)
+        while self.ram and self.cache_size > self.capacity_bytes:
+            old_h, (old_key, old_state) = self.ram.popitem(last=False)
+            self._spill(old_h, old_key, old_state)
+
+    # --- REPORTING ---
+    def report(self) -> Dict[str, Any]:
+        """Per-step lookup stats plus session-wide hit and reuse ratios."""
+        t = self.totals
+        return {
+            **self.last_lookup,
+            "hit_ratio": round(t["hits"] / t["lookups"], 3) if t["lookups"] else 0.0,
+            "session_reuse_ratio": round(t["reused_tokens"] / t["prompt_tokens"], 3) if t["prompt_tokens"] else 0.0,
+            "ram_entries": len(self.ram),
+            "disk_entries": len(self.disk),
+        }
@@ -0,0 +1,159 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+# --- CONFIGURATION ---
+INLINE_CHARS = int(os.getenv("RESULT_INLINE_CHARS", "3000"))        # larger results are stored and previewed
+STORE_BYTES = int(os.getenv("RESULT_STORE_MB", "256")) << 20         # per session, oldest evicted first
+PREVIEW_HEAD = 1200
+PREVIEW_TAIL = 600
+FETCH_CHARS = 4000
+# `{{@r3}}` or `{{@r3:10-40}}` (lines) in an answer stands for that stored result, expanded verbatim on emission
+REF_RE = re.compile(r"\{\{(@r\d+)(?::(\d+)-(\d+))?\}\}")
+
+def _cut(text: str, limit: int, from_end: bool = False) -> str:
+    """At most `limit` chars of `text`, cut at a line boundary when one is close."""
+    if len(text) <= limit: return text
+    if from_end:
+        piece = text[-limit:]
+        nl = piece.find("\n")
+        return piece[nl + 1:] if 0 <= nl < limit // 4 else piece
+    piece = text[:limit]
+    nl = piece.rfind("\n")
+    return piece[:nl] if nl > limit * 3 // 4 else piece
+
+class ResultStore:
+    """
+    Large tool results kept out of the prompt.
+
+    `put()` writes the full text to `directory` and returns a handle (`@r1`,
+    `@r2`, ...); the model gets `preview()` instead: size, line count, head
+    and tail. `fetch()` reads line ranges of a stored result or greps it.
+    Only metadata stays in memory; files beyond `capacity_bytes` are
+    deleted oldest first and their handles report as expired. `expand()`
+    replaces `{{@rN}}` references in an answer with the stored text, so an
+    agent can pass results through without decoding them again.
+    """
+
+    def __init__(self, directory: str, capacity_bytes: int = STORE_BYTES):
+        self.directory = directory
+        self.capacity_bytes = capacity_bytes
+        self.bytes = 0
+        self._meta: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.totals = {"stored": 0, "stored_bytes": 0, "preview_bytes": 0, "fetches": 0, "evictions": 0, "expansions": 0, "expanded_chars": 0}
+
+    def _path(self, handle: str) -> str:
+        return os.path.join(self.directory, f"{handle[1:]}.txt")
+
+    def put(self, tool: str, text: str) -> str:
+        data = text.encode("utf-8")
+        with self._lock:
+            self._seq += 1
+            handle = f"@r{self._seq}"
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(handle), "wb") as f: f.write(data)
+        with self._lock:
+            self._meta[handle] = {"tool": tool, "bytes": len(data), "chars": len(text), "lines": text.count("\n") + 1, "created": time.time()}
+            self.bytes += len(data)
+            self.totals["stored"] += 1
+            self.totals["stored_bytes"] += len(data)
+            while self.bytes > self.capacity_bytes and len(self._meta) > 1:
+                old, meta = self._meta.popitem(last=False)
+                self.bytes -= meta["bytes"]
+                self.totals["evictions"] += 1
+                try: os.remove(self._path(old))
+                except OSError: pass
+        return handle
+
+    def preview(self, handle: str, text: str) -> str:
+        """What the model sees in place of a stored result."""
+        meta = self._meta.get(handle, {"tool": "?", "bytes": len(text.encode("utf-8")), "lines": text.count("\n") + 1})
+        if len(text) <= PREVIEW_HEAD + PREVIEW_TAIL:
+            body = text
+        else:
+            head, tail = _cut(text, PREVIEW_HEAD), _cut(text, PREVIEW_TAIL, from_end=True)
+            omitted = text.count("\n", len(head), len(text) - len(tail))
+            body = f"{head}\n... [{omitted} linhas omitidas] ...\n{tail}"
+        out = (f"[RESULTADO ARMAZENADO {handle}: {meta['tool']}, {meta['bytes']} bytes, {meta['lines']} linhas]\n{body}\n"
+               f"[Use fetch_result com handle=\"{handle}\" e start_line/end_line ou pattern para ver o resto.]")
+        with self._lock: self.totals["preview_bytes"] += len(out.encode("utf-8"))
+        return out
+
+    def fetch(self, handle: str, start_line: Optional[int] = None, end_line: Optional[int] = None,
+              pattern: Optional[str] = None, context: int = 0, max_chars: int = FETCH_CHARS) -> str:
+        handle = "@" + handle.lstrip("@")
+        meta = self._meta.get(handle)
+        if meta is None:
+            return f"Error: resultado {handle} não existe ou expirou (limite do armazenamento)."
+        with self._lock: self.totals["fetches"] += 1
+        try: regex = re.compile(pattern, re.IGNORECASE) if pattern else None
+        except re.error: regex = re.compile(re.escape(pattern), re.IGNORECASE)
+        start = max(1, int(start_line or 1))
+        end = int(end_line) if end_line else (meta["lines"] if regex else start + 199)
+
+        # Numbered lines within [start, end]; with a pattern, only matches (plus context)
+        out: List[str] = []
+        size, truncated, matches = 0, False, 0
+        recent: List[str] = []
+        after = 0
+        with open(self._path(handle), "r", encoding="utf-8", errors="replace") as f:
+            for n, line in enumerate(f, 1):
+                if n < start: continue
+                if n > end: break
+                row = f"{n}: {line.rstrip(chr(10))}"
+                if regex is None or regex.search(line):
+                    if regex is not None:
+                        matches += 1
+                        out.extend(recent)
+                        after = context
+                    recent = []
+                    out.append(row)
+                elif after > 0:
+                    out.append(row)
+                    after -= 1
+                else:
+                    recent = (recent + [row])[-context:] if context else []
+                    continue
+                size += len(out[-1]) + 1
+                if size > max_chars:
+                    truncated = True
+                    break
+        header = f"[{handle}: {meta['tool']}, {meta['lines']} linhas"
+        header += f"; {matches} linha(s) com '{pattern}'" if regex else f"; linhas {start}-{min(end, meta['lines'])}"
+        header += "; saída cortada, peça um trecho menor]" if truncated else "]"
+        return header + "\n" + ("\n".join(out) if out else "(nada encontrado)")
+
+    def read(self, handle: str, start_line: Optional[int] = None, end_line: Optional[int] = None) -> Optional[str]:
+        """The stored text (or lines `start_line`-`end_line`, 1-based inclusive), None if unknown or evicted."""
+        if handle not in self._meta: return None
+        try:
+            with open(self._path(handle), "r", encoding="utf-8", errors="replace") as f: text = f.read()
+        except OSError:
+            return None
+        if start_line is None: return text
+        return "".join(text.splitlines(keepends=True)[max(start_line, 1) - 1:end_line]).rstrip("\n")
+
+    def expand(self, text: str, count: bool = True) -> str:
+        """
+        `text` with every `{{@rN}}` / `{{@rN:a-b}}` replaced by the stored result.
+        `count=False` leaves the totals alone (display copies of an answer that is counted once).
+        """
+        def replace(m: "re.Match") -> str:
+            start, end = (int(m.group(2)), int(m.group(3))) if m.group(2) else (None, None)
+            body = self.read(m.group(1), start, end)
+            if body is None: return f"[{m.group(1)} indisponível]"
+            if not count: return body
+            with self._lock:
+                self.totals["expansions"] += 1
+                self.totals["expanded_chars"] += len(body)
+            return body
+        return REF_RE.sub(replace, text) if "{{@" in text else text
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.totals, "results": len(self._meta), "bytes": self.bytes}
@@ -0,0 +1,225 @@
+import os
+import time
+import itertools
+import threading
+import statistics
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
+
+from agent_session import current_session
+
+# --- CONFIGURATION ---
+SLICE_TOKENS = int(os.getenv("SCHED_SLICE_TOKENS", "128"))        # tokens per turn while others wait (0 = run to completion)
+SESSION_KV_BYTES = int(os.getenv("SESSION_KV_MB", "4096")) << 20  # saved KV states kept for switched-out sessions
+WAIT_SAMPLES = 1000
+
+def state_size(state: Any) -> int:
+    size = getattr(state, "llama_state_size", None)
+    if size is None: size = len(getattr(state, "llama_state", b""))
+    return int(size)
+
+class FairScheduler:
+    """
+    Multiplexes the sessions of one `Llama`.
+
+    The model goes to the waiting session that has used the least model time
+    so far (ties in arrival order); a session that was idle rejoins at the
+    level of the others instead of cashing in the time it didn't use. When the
+    model changes hands, the outgoing session's KV state is saved and the
+    incoming one's restored, so each session continues from its own
+    conversation instead of re-prefilling it. Saved states are kept up to
+    `kv_budget` bytes, least recently used first out; a state saved in the
+    middle of a generation is pinned until that session resumes.
+    """
+
+    def __init__(self, llm: Any, slice_tokens: int = SLICE_TOKENS, kv_budget: int = SESSION_KV_BYTES):
+        self.llm = llm
+        self.slice_tokens = slice_tokens
+        self.kv_budget = kv_budget
+        self._cond = threading.Condition()
+        self._arrivals = itertools.count()
+        self._waiting: List[Tuple[int, str]] = []
+        self._used: Dict[str, float] = {}
+        self._states: "OrderedDict[str, Any]" = OrderedDict()
+        self._pinned: set = set()
+        self.resident: Optional[str] = None
+        self.active: Optional[str] = None
+        self.started = time.monotonic()
+        self.waits: deque = deque(maxlen=WAIT_SAMPLES)
+        self.totals = {"requests": 0, "tokens": 0, "busy_s": 0.0, "switches": 0, "saves": 0, "restores": 0,
+                       "evictions": 0, "preemptions": 0, "switch_ms": 0.0}
+
+    @property
+    def waiting(self) -> int:
+        with self._cond: return len(self._waiting)
+
+    @property
+    def kv_bytes(self) -> int:
+        return sum(state_size(s) for s in self._states.values())
+
+    def _next(self) -> Tuple[int, str]:
+        return min(self._waiting, key=lambda t: (self._used.get(t[1], 0.0), t[0]))
+
+    def contended(self, owner: str) -> bool:
+        with self._cond: return any(o != owner for _, o in self._waiting)
+
+    # --- TURNS ---
+    def acquire(self, owner: str):
+        queued_at = time.perf_counter()
+        with self._cond:
+            floor = min((self._used[o] for _, o in self._waiting), default=self._used.get(self.active or self.resident, 0.0))
+            self._used[owner] = max(self._used.get(owner, 0.0), floor)
+            ticket = (next(self._arrivals), owner)
+            self._waiting.append(ticket)
+            while self.active is not None or self._next() != ticket: self._cond.wait()
+            self._waiting.remove(ticket)
+            self.active = owner
+            self._acquired_at = time.perf_counter()
+            self.waits.append((self._acquired_at - queued_at) * 1000)
+        try:
+            self._switch_to(owner)
+        except BaseException:
+            self.release(owner)
+            raise
+
+    def release(self, owner: str, pin: bool = False):
+        with self._cond:
+            busy = time.perf_counter() - self._acquired_at
+            self._used[owner] = self._used.get(owner, 0.0) + busy
+            if pin: self._pinned.add(owner)
+            self.active = None
+            self.totals["requests"] += not pin
+            self.totals["busy_s"] += busy
+            self._cond.notify_all()
+
+    @contextmanager
+    def hold(self, owner: str):
+        self.acquire(owner)
+        try: yield
+        finally: self.release(owner)
+
+    def add_tokens(self, n: int):
+        with self._cond: self.totals["tokens"] += n
+
+    def _switch_to(self, owner: str):
+        """Runs with the model held: parks the resident session's KV and brings back `owner`'s."""
+        if self.resident == owner: return
+        start = time.perf_counter()
+        with self._cond: self.totals["switches"] += 1
+        if self.resident is not None and hasattr(self.llm, "save_state"):
+            state = self.llm.save_state()
+            with self._cond:
+                self._states[self.resident] = state
+                self._states.move_to_end(self.resident)
+                self.totals["saves"] += 1
+                self._evict()
+        with self._cond:
+            state = self._states.pop(owner, None)
+            self._pinned.discard(owner)
+        if state is not None:
+            self.llm.load_state(state)
+            with self._cond: self.totals["restores"] += 1
+        self.resident = owner
+        with self._cond: self.totals["switch_ms"] += (time.perf_counter() - start) * 1000
+
+    def _evict(self):
+        total = self.kv_bytes
+        for owner in list(self._states):
+            if total <= self.kv_budget: break
+            if owner in self._pinned: continue
+            total -= state_size(self._states.pop(owner))
+            self.totals["evictions"] += 1
+
+    def forget(self, owner: str):
+        """Drops a finished session's saved state and accounting."""
+        with self._cond:
+            self._states.pop(owner, None)
+            self._pinned.discard(owner)
+            self._used.pop(owner, None)
+            if self.resident == owner and self.active is None: self.resident = None
+
+    # --- GENERATION ---
+    def complete(self, owner: str, *args, **kwargs) -> Dict[str, Any]:
+        with self.hold(owner):
+            output = self.llm.create_chat_completion(*args, **kwargs)
+        self.add_tokens(output.get("usage", {}).get("completion_tokens", 0))
+        return output
+
+    def stream(self, owner: str, *args, **kwargs):
+        """
+        Streams a completion, handing the model over every `slice_tokens`
+        tokens while other sessions wait. The paused generator resumes on
+        its own KV state (restored on switch-back) and sampler.
+        """
+        self.acquire(owner)
+        try:
+            stream = self.llm.create_chat_completion(*args, stream=True, **kwargs)
+            try:
+                produced = 0
+                for chunk in stream:
+                    if chunk["choices"][0].get("delta", {}).get("content"):
+                        self.add_tokens(1)
+                        produced += 1
+                    yield chunk
+                    if self.slice_tokens and produced >= self.slice_tokens and self.contended(owner):
+                        sampler = getattr(self.llm, "_sampler", None)
+                        with self._cond: self.totals["preemptions"] += 1
+                        self.release(owner, pin=True)
+                        self.acquire(owner)
+                        if sampler is not None: self.llm._sampler = sampler
+                        produced = 0
+            finally:
+                if hasattr(stream, "close"): stream.close()
+        finally:
+            self.release(owner)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            waits = sorted(self.waits)
+            uptime = time.monotonic() - self.started
+            totals = dict(self.totals)
+            depth, active = len(self._waiting), self.active
+            used = {owner: round(s, 2) for owner, s in self._used.items()}
+            kv = {"states": len(self._states), "pinned": len(self._pinned), "bytes": self.kv_bytes, "budget": self.kv_budget}
+        return {
+            "queue_depth": depth,
+            "active_session": active,
+            "resident_session": self.resident,
+            "requests": totals["requests"],
+            "wait_ms": {
+                "mean": round(statistics.fmean(waits), 1) if waits else 0.0,
+                "p50": round(waits[len(waits) // 2], 1) if waits else 0.0,
+                "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 1) if waits else 0.0,
+            },
+            "utilization": round(totals["busy_s"] / uptime, 3) if uptime > 0 else 0.0,
+            "requests_per_min": round(totals["requests"] / uptime * 60, 2) if uptime > 0 else 0.0,
+            "tokens_per_s": round(totals["tokens"] / totals["busy_s"], 1) if totals["busy_s"] > 0 else 0.0,
+            "uptime_s": round(uptime, 1),
+            "switches": totals["switches"],
+            "preemptions": totals["preemptions"],
+            "switch_ms": round(totals["switch_ms"], 1),
+            "kv": {**kv, "saves": totals["saves"], "restores": totals["restores"], "evictions": totals["evictions"]},
+            "model_s": used,
+        }
+
+class ScheduledLlama:
+    """
+    The shared `Llama` as seen by an engine: generation is scheduled on behalf
+    of the session bound to the calling thread, everything else passes through.
+    """
+
+    def __init__(self, scheduler: FairScheduler):
+        self._scheduler = scheduler
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._scheduler.llm, name)
+
+    @staticmethod
+    def _owner() -> str:
+        session = current_session()
+        return session.id if session else "default"
+
+    def create_chat_completion(self, *args, stream: bool = False, **kwargs):
+        if stream: return self._scheduler.stream(self._owner(), *args, **kwargs)
+        return self._scheduler.complete(self._owner(), *args, **kwargs)
@@ -0,0 +1,278 @@
+import os
+import json
+import time
+import uuid
+import queue
+import asyncio
+import argparse
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from agent_v2 import AgentEngine, CATALOG, MODEL_PATH, N_CTX
+from model_loader import load_model
+from agent_session import AgentSession, use_session
+from prompt_cache import PrefixStateCache
+from scheduler import FairScheduler, ScheduledLlama
+
+# --- CONFIGURATION ---
+MAX_SESSIONS = int(os.getenv("SERVER_MAX_SESSIONS", "16"))
+SESSION_TTL = float(os.getenv("SERVER_SESSION_TTL", "3600"))  # idle seconds before a session is closed
+EVENT_LOG_SIZE = 5000   # events kept per session for SSE replay
+KEEPALIVE = 15.0
+
+# --- SESSIONS ---
+class Session:
+    """
+    One conversation: the shared engine running the usual interactive loop on
+    its own thread, bound to this session's `AgentSession`. User messages
+    arrive through `send()` instead of stdin and everything the engine reports
+    is appended to a numbered event log that SSE clients follow (and can
+    resume from with Last-Event-ID).
+    """
+
+    def __init__(self, engine: AgentEngine, state: AgentSession, agent: str):
+        self.id = state.id
+        self.engine = engine
+        self.conversation = state
+        self.agent = agent
+        self.created = self.last_active = time.time()
+        self.state = "starting"
+        self.inbox: "queue.Queue[Optional[Tuple[str, str]]]" = queue.Queue()
+        self.events: deque = deque(maxlen=EVENT_LOG_SIZE)
+        self._seq = 0
+        self._cond = threading.Condition()
+        state.input_fn = self._next_message
+        state.on_event = self._record
+        self.thread = threading.Thread(target=self._run, name=f"session-{self.id}", daemon=True)
+        self.thread.start()
+
+    def _record(self, event: str, data: Dict[str, Any]):
+        with self._cond:
+            self._seq += 1
+            self.events.append((self._seq, event, data))
+            self._cond.notify_all()
+
+    def _next_message(self, prompt: str) -> str:
+        self.state = "idle"
+        self._record("idle", {})
+        item = self.inbox.get()
+        if item is None: raise EOFError
+        message_id, content = item
+        self.state = "busy"
+        self.last_active = time.time()
+        self._record("user", {"id": message_id, "content": content})
+        return content
+
+    def _run(self):
+        try:
+            with use_session(self.conversation):
+                result = self.engine.run_agent(self.agent, initial_task=None, parent_trace_id=self.id)
+        except Exception as e:
+            result = f"Error: {e}"
+        self.state = "closed"
+        self._record("closed", {"result": result})
+        self.conversation.close()
+
+    @property
+    def last_seq(self) -> int:
+        with self._cond: return self._seq
+
+    def send(self, content: str) -> str:
+        if self.state == "closed": raise RuntimeError("Session closed.")
+        message_id = uuid.uuid4().hex[:8]
+        self.last_active = time.time()
+        self.inbox.put((message_id, content))
+        return message_id
+
+    def close(self):
+        if self.state != "closed": self.inbox.put(None)
+
+    def wait_events(self, after: int, timeout: float) -> List[Tuple[int, str, Dict[str, Any]]]:
+        with self._cond:
+            if self._seq <= after and self.state != "closed": self._cond.wait(timeout)
+            return [e for e in self.events if e[0] > after]
+
+    def info(self) -> Dict[str, Any]:
+        return {"id": self.id, "agent": self.agent, "state": self.state, "events": self.last_seq,
+                "created": datetime.fromtimestamp(self.created).isoformat(timespec="seconds"),
+                "idle_s": round(time.time() - self.last_active, 1)}
+
+class SessionManager:
+    """
+    Sessions sharing one engine: the default model (and its KV prefix cache), tool workers and indexes.
+    Agents on another model (`model:` in their frontmatter) share the engine's ModelPool, one step at a time.
+    """
+
+    def __init__(self, llm: Any, n_ctx: int = N_CTX, max_sessions: int = MAX_SESSIONS, ttl: float = SESSION_TTL,
+                 prompt_cache: Optional[PrefixStateCache] = None, trace_root: Optional[str] = None):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.scheduler = FairScheduler(llm)
+        self.prompt_cache = prompt_cache
+        self.trace_root = trace_root or f"traces/server_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
+        self.engine = AgentEngine(llm=ScheduledLlama(self.scheduler), n_ctx=n_ctx, prompt_cache=prompt_cache,
+                                  trace_dir=os.path.join(self.trace_root, "default"))
+        self.sessions: Dict[str, Session] = {}
+        self._lock = threading.Lock()
+
+    def create(self, agent: str = "brain") -> Session:
+        if CATALOG.agent(agent) is None: raise KeyError(agent)
+        self.expire()
+        with self._lock:
+            if len(self.sessions) >= self.max_sessions: raise RuntimeError(f"Limite de {self.max_sessions} sessões atingido.")
+            session_id = uuid.uuid4().hex[:12]
+            state = self.engine.new_session(trace_dir=os.path.join(self.trace_root, session_id), session_id=session_id)
+            session = self.sessions[session_id] = Session(self.engine, state, agent)
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock: return self.sessions.get(session_id)
+
+    def list(self) -> List[Session]:
+        with self._lock: return list(self.sessions.values())
+
+    def close(self, session_id: str) -> bool:
+        with self._lock: session = self.sessions.pop(session_id, None)
+        if session:
+            session.close()
+            self.scheduler.forget(session_id)
+        return session is not None
+
+    def expire(self):
+        now = time.time()
+        with self._lock:
+            stale = [sid for sid, s in self.sessions.items()
+                     if s.state == "closed" or (s.state == "idle" and now - s.last_active > self.ttl)]
+        for sid in stale: self.close(sid)
+
+    def shutdown(self):
+        for session in self.list(): self.close(session.id)
+        self.engine.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock: states = [s.state for s in self.sessions.values()]
+        data = {"model": self.scheduler.metrics(),
+                "sessions": {"total": len(states), **{state: states.count(state) for state in ("starting", "idle", "busy")}}}
+        if self.prompt_cache: data["prompt_cache"] = self.prompt_cache.totals
+        data["models"] = self.engine.models.stats()
+        return data
+
+# --- HTTP ---
+class SessionIn(BaseModel):
+    agent: str = "brain"
+
+class MessageIn(BaseModel):
+    content: str
+    stream: bool = True
+
+def format_sse(seq: int, event: str, data: Dict[str, Any]) -> str:
+    return f"id: {seq}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+def event_stream(request: Request, session: Session, after: int, until_message: Optional[str] = None) -> StreamingResponse:
+    """
+    SSE of the session's events after `after`. With `until_message`, ends once
+    the turn that answers that message is over; otherwise follows the session.
+    """
+    async def generate():
+        last, answered = after, False
+        while True:
+            if await request.is_disconnected(): return
+            events = await asyncio.to_thread(session.wait_events, last, KEEPALIVE)
+            if not events:
+                if session.state == "closed": return
+                yield ": keepalive\n\n"
+                continue
+            for seq, event, data in events:
+                last = seq
+                yield format_sse(seq, event, data)
+                if event == "user" and data.get("id") == until_message: answered = True
+                if event == "closed" or (answered and event == "idle"): return
+
+    return StreamingResponse(generate(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def create_app(manager: SessionManager) -> FastAPI:
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        yield
+        manager.shutdown()
+
+    app = FastAPI(title="Obsidian Agent Server", lifespan=lifespan)
+
+    def session_or_404(session_id: str) -> Session:
+        session = manager.get(session_id)
+        if session is None: raise HTTPException(status_code=404, detail="Sessão não encontrada.")
+        return session
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok"}
+
+    @app.get("/metrics")
+    def metrics():
+        return manager.metrics()
+
+    @app.post("/sessions", status_code=201)
+    def create_session(body: SessionIn = SessionIn()):
+        try: session = manager.create(body.agent)
+        except KeyError: raise HTTPException(status_code=404, detail=f"Agente '{body.agent}' não encontrado.")
+        except RuntimeError as e: raise HTTPException(status_code=429, detail=str(e))
+        return session.info()
+
+    @app.get("/sessions")
+    def list_sessions():
+        return [s.info() for s in manager.list()]
+
+    @app.get("/sessions/{session_id}")
+    def get_session(session_id: str):
+        return session_or_404(session_id).info()
+
+    @app.delete("/sessions/{session_id}")
+    def delete_session(session_id: str):
+        if not manager.close(session_id): raise HTTPException(status_code=404, detail="Sessão não encontrada.")
+        return {"closed": session_id}
+
+    @app.post("/sessions/{session_id}/messages")
+    def send_message(session_id: str, body: MessageIn, request: Request):
+        session = session_or_404(session_id)
+        after = session.last_seq
+        try: message_id = session.send(body.content)
+        except RuntimeError as e: raise HTTPException(status_code=409, detail=str(e))
+        if not body.stream: return {"id": message_id, "after": after, "queue_depth": manager.scheduler.waiting}
+        return event_stream(request, session, after, until_message=message_id)
+
+    @app.get("/sessions/{session_id}/events")
+    def follow_events(session_id: str, request: Request, after: int = 0):
+        # EventSource reconnects send the last id they saw
+        last_id = request.headers.get("last-event-id")
+        return event_stream(request, session_or_404(session_id), int(last_id) if last_id and last_id.isdigit() else after)
+
+    return app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve AgentEngine sessions over HTTP/SSE with one shared model.")
+    parser.add_argument("--host", default=os.getenv("SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVER_PORT", "8000")))
+    parser.add_argument("--n-ctx", type=int, default=N_CTX)
+    parser.add_argument("--max-sessions", type=int, default=MAX_SESSIONS)
+    args = parser.parse_args()
+
+    llm = load_model(MODEL_PATH, args.n_ctx)
+    prompt_cache = None
+    if os.getenv("PROMPT_CACHE", "1") != "0":
+        prompt_cache = PrefixStateCache(
+            capacity_bytes=int(os.getenv("PROMPT_CACHE_RAM_MB", "2048")) << 20,
+            disk_dir=os.path.join(os.getenv("PROMPT_CACHE_DIR", ".cache/kv"), os.path.basename(MODEL_PATH)),
+            disk_capacity_bytes=int(os.getenv("PROMPT_CACHE_DISK_MB", "8192")) << 20,
+        )
+        prompt_cache.attach(llm)
+    manager = SessionManager(llm, n_ctx=args.n_ctx, max_sessions=args.max_sessions, prompt_cache=prompt_cache)
+    uvicorn.run(create_app(manager), host=args.host, port=args.port)
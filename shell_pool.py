@@ -0,0 +1,241 @@
+import os
+import re
+import time
+import uuid
+import queue
+import shlex
+import signal
+import selectors
+import threading
+import subprocess
+from typing import Dict, Any, Optional, List
+
+# --- CONFIGURATION ---
+DEFAULT_MAX_BYTES = int(os.getenv("SHELL_MAX_BYTES", "32768"))
+DEFAULT_MAX_LINES = int(os.getenv("SHELL_MAX_LINES", "1000"))
+DEFAULT_TIMEOUT = float(os.getenv("SHELL_TIMEOUT", "60"))
+KILL_GRACE = 2.0  # seconds to wait for the end markers after killing a command
+READ_CHUNK = 65536
+TAIL_WINDOW = 256
+
+class ShellWorker:
+    """
+    One long-lived bash process. Each command runs as a background job in its
+    own process group (`set -m`), inside a subshell so `cd`/`export` do not
+    leak into later calls, and is followed by random end markers on both pipes.
+    """
+
+    def __init__(self, shell: str = "/bin/bash"):
+        self.proc = subprocess.Popen(
+            [shell, "--noprofile", "--norc"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            start_new_session=True,
+        )
+        self._write("set -m\n")
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def _write(self, text: str):
+        self.proc.stdin.write(text.encode("utf-8"))
+        self.proc.stdin.flush()
+
+    def run(self, command: str, timeout: float, max_bytes: int, max_lines: int) -> Dict[str, Any]:
+        marker = f"__SHELL_{uuid.uuid4().hex}__"
+        rc_tag, end_tag, pid_tag = f"\n{marker}:rc:".encode(), f"\n{marker}:end\n".encode(), f"{marker}:pid:".encode()
+        start = time.perf_counter()
+        self._write(
+            f"( eval {shlex.quote(command)} ) </dev/null & __p=$!; "
+            f"printf '%s:pid:%d\\n' {marker} $__p >&2; wait $__p; __rc=$?; "
+            f"printf '\\n%s:rc:%d\\n' {marker} $__rc; printf '\\n%s:end\\n' {marker} >&2\n"
+        )
+
+        rc_re = re.compile(re.escape(rc_tag) + rb"(-?\d+)\n")
+        pid_re = re.compile(re.escape(pid_tag) + rb"(\d+)\n")
+        stdout, stderr = bytearray(), bytearray()
+        tails = {"stdout": b"", "stderr": b""}
+        done = {"stdout": False, "stderr": False}
+        truncated = timed_out = False
+        pid: Optional[int] = None
+        exit_code: Optional[int] = None
+        deadline = start + timeout
+        killed_at: Optional[float] = None
+
+        sel = selectors.DefaultSelector()
+        sel.register(self.proc.stdout, selectors.EVENT_READ, "stdout")
+        sel.register(self.proc.stderr, selectors.EVENT_READ, "stderr")
+        try:
+            while not all(done.values()):
+                now = time.perf_counter()
+                if killed_at is None and now >= deadline:
+                    timed_out = True
+                    killed_at = self._kill(pid)
+                if killed_at is not None and now - killed_at > KILL_GRACE:
+                    # Markers never came (worker killed or wedged): give up on this worker
+                    self.close()
+                    break
+                for key, _ in sel.select(timeout=0.1):
+                    name = key.data
+                    chunk = os.read(key.fd, READ_CHUNK)
+                    if not chunk:
+                        # the worker itself died (e.g. `kill $$`)
+                        self.close()
+                        done = {"stdout": True, "stderr": True}
+                        break
+                    window = tails[name] + chunk
+                    tails[name] = window[-TAIL_WINDOW:]
+
+                    if name == "stdout":
+                        content = chunk
+                        m = rc_re.search(window)
+                        if m:
+                            exit_code, done["stdout"] = int(m.group(1)), True
+                            marker_len = len(window) - m.start()
+                            content = chunk[:max(0, len(chunk) - marker_len)]
+                            if marker_len > len(chunk) and not truncated:
+                                # the marker started in the previous read, which we kept as output
+                                del stdout[len(stdout) - (marker_len - len(chunk)):]
+                        if truncated or not content: continue
+                        piece = self._fit(content, max_bytes - len(stdout), max_lines - stdout.count(b"\n"))
+                        stdout += piece
+                        if len(piece) < len(content):
+                            truncated = True
+                            if killed_at is None: killed_at = self._kill(pid)
+                    else:
+                        if pid is None:
+                            m = pid_re.search(window)
+                            if m:
+                                pid = int(m.group(1))
+                                if killed_at is not None: self._kill(pid)
+                        if end_tag in window: done["stderr"] = True
+                        room = max_bytes - len(stderr)
+                        stderr += chunk[:max(0, room)]
+                        if len(chunk) > room and not done["stderr"]:
+                            truncated = True
+                            if killed_at is None: killed_at = self._kill(pid)
+        finally:
+            sel.close()
+
+        err = pid_re.sub(b"", bytes(stderr))
+        err = self._strip_marker(err, marker)
+        if pid is not None:
+            # bash reports jobs it had to kill; that is our doing, not the command's output
+            err = re.sub(rf"^.*line \d+: +{pid} (Killed|Terminated).*\n?", "", err, flags=re.MULTILINE)
+        return {
+            "stdout": bytes(stdout).decode("utf-8", errors="replace"),
+            "stderr": err.strip(),
+            "exit_code": exit_code,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+            "bytes": len(stdout),
+            "lines": stdout.count(b"\n"),
+            "truncated": truncated,
+            "timed_out": timed_out,
+        }
+
+    @staticmethod
+    def _fit(content: bytes, room_bytes: int, room_lines: int) -> bytes:
+        """Longest prefix of `content` within the remaining byte and line budget."""
+        piece = content[:max(0, room_bytes)]
+        if piece.count(b"\n") > room_lines:
+            cut = -1
+            for _ in range(max(0, room_lines)): cut = piece.index(b"\n", cut + 1)
+            piece = piece[:cut + 1]
+        return piece
+
+    @staticmethod
+    def _strip_marker(data: bytes, marker: str) -> str:
+        idx = data.find(f"\n{marker}:".encode())
+        if idx >= 0: data = data[:idx]
+        return data.decode("utf-8", errors="replace")
+
+    def _kill(self, pid: Optional[int]) -> float:
+        if pid is not None:
+            try: os.killpg(pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError): pass
+        return time.perf_counter()
+
+    def close(self):
+        if self.alive:
+            try: os.killpg(self.proc.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError): self.proc.kill()
+        self.proc.wait()
+        for f in (self.proc.stdin, self.proc.stdout, self.proc.stderr):
+            try: f.close()
+            except OSError: pass
+
+class ShellPool:
+    """
+    Warm bash workers shared by `execute_shell` calls.
+
+    Output is read as it is produced and capped at `max_bytes`/`max_lines`; once
+    a cap or the timeout is hit the command's process group is killed, so a
+    runaway `grep -r` or `cat` returns its first page instead of stalling the loop.
+    """
+
+    def __init__(self, size: int = 4, max_bytes: int = DEFAULT_MAX_BYTES, max_lines: int = DEFAULT_MAX_LINES,
+                 timeout: float = DEFAULT_TIMEOUT, shell: str = "/bin/bash"):
+        self.size = size
+        self.max_bytes = max_bytes
+        self.max_lines = max_lines
+        self.timeout = timeout
+        self.shell = shell
+        self._idle: "queue.LifoQueue[ShellWorker]" = queue.LifoQueue()
+        self._workers: List[ShellWorker] = []
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "spawned": 0, "truncated": 0, "timeouts": 0, "failed": 0, "total_ms": 0.0}
+
+    def _acquire(self) -> ShellWorker:
+        try: return self._idle.get_nowait()
+        except queue.Empty: pass
+        with self._lock:
+            if len(self._workers) < self.size:
+                worker = ShellWorker(self.shell)
+                self._workers.append(worker)
+                self.stats["spawned"] += 1
+                return worker
+        return self._idle.get()
+
+    def _release(self, worker: ShellWorker):
+        if worker.alive:
+            self._idle.put(worker)
+            return
+        with self._lock:
+            if worker in self._workers: self._workers.remove(worker)
+
+    def run(self, command: str, timeout: Optional[float] = None, max_bytes: Optional[int] = None, max_lines: Optional[int] = None) -> Dict[str, Any]:
+        worker = self._acquire()
+        try:
+            result = worker.run(command, timeout or self.timeout, max_bytes or self.max_bytes, max_lines or self.max_lines)
+        except (OSError, ValueError) as e:
+            worker.close()
+            result = {"stdout": "", "stderr": f"Shell worker failed: {e}", "exit_code": None, "elapsed_ms": 0.0,
+                      "bytes": 0, "lines": 0, "truncated": False, "timed_out": False}
+        finally:
+            self._release(worker)
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["total_ms"] += result["elapsed_ms"]
+            self.stats["truncated"] += result["truncated"]
+            self.stats["timeouts"] += result["timed_out"]
+            self.stats["failed"] += result["exit_code"] is None and not result["timed_out"] and not result["truncated"]
+        return result
+
+    def close(self):
+        with self._lock:
+            for worker in self._workers: worker.close()
+            self._workers.clear()
+
+def format_result(result: Dict[str, Any], max_bytes: int, max_lines: int, timeout: float) -> str:
+    """Tool output in the format `execute_shell` always returned, plus cap/timeout notes."""
+    output = result["stdout"]
+    if result["stderr"]: output += f"\n[STDERR] {result['stderr']}"
+    if result["timed_out"]:
+        output += f"\n[TIMEOUT] Comando interrompido após {timeout:.0f}s."
+    elif result["truncated"]:
+        output += f"\n[TRUNCATED] Saída limitada a {max_bytes} bytes / {max_lines} linhas; o comando foi interrompido. Refine com grep, head ou sed -n."
+    elif result["exit_code"] is None:
+        output += "\n[EXIT CODE] desconhecido (shell reiniciado)"
+    elif result["exit_code"] != 0:
+        output += f"\n[EXIT CODE] {result['exit_code']}"
+    return output.strip() or "(No output)"
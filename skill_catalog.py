@@ -0,0 +1,183 @@
+import os
+import re
+import glob
+import math
+import time
+import threading
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+
+import frontmatter
+
+from vault_index import tokenize
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Field weights: repeated tokens act as term-frequency boosts
+FIELD_WEIGHTS = {"path": 2, "description": 2, "keywords": 3, "headers": 1}
+PARTIAL_MATCH_WEIGHT = 0.5  # "busca" vs "buscar"
+MIN_PARTIAL_LEN = 4
+
+HEADER_RE = re.compile(r"^#{1,6}\s+(.+)$", re.MULTILINE)
+
+def _as_list(value: Any) -> List[str]:
+    if not value: return []
+    if isinstance(value, str): return [v.strip() for v in value.split(",") if v.strip()]
+    return [str(v) for v in value]
+
+def _fallback_description(content: str) -> str:
+    """First prose line of a skill without frontmatter (e.g. under '## Descrição')."""
+    for line in content.splitlines():
+        line = line.strip()
+        if line and not line.startswith(("#", "-", "`", ">")): return line[:200]
+    return "No description"
+
+class SkillCatalog:
+    """
+    Parsed skills and agents, built once and refreshed per file by mtime.
+
+    Holds each file's frontmatter (`description`, `keywords`, `tools`), headers
+    and content, plus a BM25 index over path, description, keywords and headers.
+    """
+
+    def __init__(self, skills_dir: str = "skills", agents_dir: str = "agents", refresh_interval: float = 1.0):
+        self.skills_dir = skills_dir
+        self.agents_dir = agents_dir
+        self.refresh_interval = refresh_interval
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.generation = 0  # bumped whenever an entry changes; lets callers cache derived results
+        self._last_refresh = 0.0
+        self._lock = threading.RLock()
+        self._doc_freq: Counter = Counter()
+        self._avg_len = 0.0
+
+    # --- MAINTENANCE ---
+    def refresh(self, force: bool = False) -> int:
+        """Re-parses only files whose mtime changed. Returns the number of changed entries."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_refresh < self.refresh_interval: return 0
+            self._last_refresh = now
+
+            paths = glob.glob(f"{self.skills_dir}/**/*.md", recursive=True) + glob.glob(f"{self.agents_dir}/*.md")
+            changed = 0
+            for path in paths:
+                try: mtime = os.path.getmtime(path)
+                except OSError: continue
+                old = self.entries.get(path)
+                if old and old["mtime"] == mtime: continue
+                entry = self._parse(path, mtime)
+                if entry:
+                    self.entries[path] = entry
+                    changed += 1
+            for path in set(self.entries) - set(paths):
+                del self.entries[path]
+                changed += 1
+            if changed:
+                self._reindex()
+                self.generation += 1
+            return changed
+
+    def _parse(self, path: str, mtime: float) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, "r", encoding="utf-8") as f: raw = f.read()
+            post = frontmatter.loads(raw)
+        except Exception: return None
+        meta = post.metadata
+        kind = "agent" if path.startswith(self.agents_dir + os.sep) or path.startswith(self.agents_dir + "/") else "skill"
+        entry = {
+            "path": path,
+            "kind": kind,
+            "mtime": mtime,
+            "name": meta.get("name", os.path.basename(path).replace(".md", "")),
+            "description": meta.get("description") or _fallback_description(post.content),
+            "keywords": _as_list(meta.get("keywords")),
+            "tools": meta.get("tools", []) or [],
+            "model": meta.get("model", "default"),
+            "headers": HEADER_RE.findall(post.content),
+            "content": raw,
+            "body": post.content,
+        }
+        fields = {
+            "path": tokenize(path.replace("_", " ")),
+            "description": tokenize(str(entry["description"])),
+            "keywords": tokenize(" ".join(entry["keywords"])),
+            "headers": tokenize(" ".join(entry["headers"])),
+        }
+        entry["tf"] = Counter()
+        for field, tokens in fields.items():
+            for t in tokens: entry["tf"][t] += FIELD_WEIGHTS[field]
+        entry["length"] = sum(entry["tf"].values())
+        return entry
+
+    def _reindex(self):
+        skills = [e for e in self.entries.values() if e["kind"] == "skill"]
+        self._doc_freq = Counter(t for e in skills for t in e["tf"])
+        self._avg_len = sum(e["length"] for e in skills) / len(skills) if skills else 0.0
+
+    # --- SKILLS ---
+    def search(self, query: str, limit: int = 5) -> List[Tuple[Dict[str, Any], float]]:
+        """BM25 over skill files; partial token matches count at half weight."""
+        self.refresh()
+        with self._lock:
+            skills = [e for e in self.entries.values() if e["kind"] == "skill"]
+            n_docs = len(skills)
+            if not n_docs: return []
+
+            vocab = list(self._doc_freq)
+            scores: Dict[str, float] = {}
+            for q in dict.fromkeys(tokenize(query)):
+                matches = {q: 1.0} if q in self._doc_freq else {}
+                if len(q) >= MIN_PARTIAL_LEN:
+                    for t in vocab:
+                        if t != q and len(t) >= MIN_PARTIAL_LEN and (t.startswith(q) or q.startswith(t)):
+                            matches[t] = PARTIAL_MATCH_WEIGHT
+                for term, weight in matches.items():
+                    df = self._doc_freq[term]
+                    idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                    for e in skills:
+                        tf = e["tf"].get(term)
+                        if not tf: continue
+                        norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * e["length"] / self._avg_len)
+                        scores[e["path"]] = scores.get(e["path"], 0.0) + weight * idf * tf * (BM25_K1 + 1) / norm
+
+            top = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:limit]
+            return [(self.entries[p], round(s, 3)) for p, s in top]
+
+    def skill(self, path: str) -> Optional[Dict[str, Any]]:
+        """The skill at `path`; None for anything that normalizes to outside `skills_dir` (`skills/../agents/x.md`)."""
+        self.refresh()
+        path = os.path.normpath(path)
+        root = os.path.abspath(self.skills_dir)
+        if os.path.commonpath([os.path.abspath(path), root]) != root: return None
+        entry = self.entries.get(path)
+        return entry if entry and entry["kind"] == "skill" else None
+
+    def skill_packages(self) -> List[Dict[str, Any]]:
+        """Skills grouped by top-level directory, with the package description and the files directly in it."""
+        self.refresh()
+        with self._lock:
+            packages: Dict[str, Dict[str, Any]] = {}
+            for e in self.entries.values():
+                if e["kind"] != "skill": continue
+                parts = e["path"].split("/")
+                if len(parts) < 3: continue
+                pkg = packages.setdefault(parts[1], {"name": parts[1], "dir": "/".join(parts[:2]) + "/", "description": None, "files": []})
+                if len(parts) > 3: continue  # nested files stay searchable and loadable, but unlisted
+                if parts[-1] in ("_index.md", "SKILL.md"):
+                    pkg["description"] = pkg["description"] or e["description"]
+                else:
+                    pkg["files"].append(e["path"])
+            for pkg in packages.values(): pkg["files"].sort()
+            return [packages[k] for k in sorted(packages)]
+
+    # --- AGENTS ---
+    def agents(self) -> List[Dict[str, Any]]:
+        self.refresh()
+        with self._lock:
+            return sorted((e for e in self.entries.values() if e["kind"] == "agent"), key=lambda e: e["path"])
+
+    def agent(self, agent_name: str) -> Optional[Dict[str, Any]]:
+        self.refresh()
+        return self.entries.get(f"{self.agents_dir}/{agent_name.lower()}.md")
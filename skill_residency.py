@@ -0,0 +1,164 @@
+import os
+import re
+import hashlib
+from collections import OrderedDict
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from vault_index import tokenize
+
+# --- CONFIGURATION ---
+SKILL_BUDGET = int(os.getenv("SKILL_TOKEN_BUDGET", "2048"))           # skill tokens in one agent's prompt
+SECTION_THRESHOLD = int(os.getenv("SKILL_SECTION_TOKENS", "512"))     # larger skills are injected by section
+
+HEADING_RE = re.compile(r"^#{1,6}\s+(.+?)\s*#*\s*$")
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+
+def split_sections(content: str) -> List[Tuple[str, str]]:
+    """(heading, text) blocks split at Markdown headings outside code fences; the preamble has heading ''."""
+    sections: List[Tuple[str, List[str]]] = [("", [])]
+    fenced = False
+    for line in content.splitlines(keepends=True):
+        if FENCE_RE.match(line): fenced = not fenced
+        m = None if fenced else HEADING_RE.match(line)
+        if m: sections.append((m.group(1), []))
+        sections[-1][1].append(line)
+    return [(heading, "".join(lines)) for heading, lines in sections if heading or "".join(lines).strip()]
+
+def is_intro(heading: str, text: str) -> bool:
+    """The preamble and the top-level (`# Title`) section always go in with a sectioned skill."""
+    return not heading or text.startswith("# ")
+
+class SkillResidency:
+    """
+    Which skills sit in each agent's system prompt, within a token budget.
+
+    Skills are scoped to the agent that loaded them. When an agent's skills
+    exceed `budget` tokens, the least recently used ones are evicted and left
+    as a one-line stub, so the model knows `load_skill` brings them back. A
+    skill is used when it is loaded again and when a new task names it (a
+    word of its file name or of one of its headings).
+    Skills above `section_threshold` tokens are injected by heading: the
+    preamble and title section, the sections asked for (or the ones that best match the agent's
+    current task) and an outline of the rest. Content is read through
+    `fetch` on every render, so edited skill files are picked up.
+    """
+
+    def __init__(self, count_tokens: Callable[[str], int], fetch: Callable[[str], Optional[str]],
+                 budget: int = SKILL_BUDGET, section_threshold: int = SECTION_THRESHOLD):
+        self.count_tokens = count_tokens
+        self.fetch = fetch
+        self.budget = budget
+        self.section_threshold = section_threshold
+        self.scopes: Dict[str, "OrderedDict[str, Dict[str, Any]]"] = {}
+        self.evicted: Dict[str, List[str]] = {}
+        self.focus: Dict[str, str] = {}
+        self.totals = {"loads": 0, "reloads": 0, "evictions": 0}
+
+    def set_focus(self, agent: str, text: str):
+        """The agent's current task, used to pick sections of large skills; the resident skills it names count as used."""
+        self.focus[agent] = text
+        scope = self.scopes.get(agent)
+        if not scope: return
+        words = set(tokenize(text))
+        for path in [p for p, e in scope.items() if words & e["names"]]: scope.move_to_end(path)
+
+    def resident(self, agent: str) -> List[str]:
+        return list(self.scopes.get(agent, {}))
+
+    # --- LOADING ---
+    def load(self, agent: str, path: str, section: Optional[str] = None) -> Dict[str, Any]:
+        content = self.fetch(path)
+        if content is None: raise FileNotFoundError(path)
+        scope = self.scopes.setdefault(agent, OrderedDict())
+        evicted = self.evicted.setdefault(agent, [])
+        entry = scope.pop(path, None)
+        if entry is None:
+            self.totals["reloads" if path in evicted else "loads"] += 1
+            entry = {"path": path, "selected": set()}
+        if path in evicted: evicted.remove(path)
+        scope[path] = entry
+        self._prepare(entry, content)
+        if entry["sections"] is not None:
+            wanted = self._pick(agent, entry["sections"], section)
+            entry["selected"] = (entry["selected"] | wanted) if section else (entry["selected"] or wanted)
+
+        dropped = []
+        while len(scope) > 1 and self.tokens(agent) > self.budget:
+            old = next(iter(scope))
+            del scope[old]
+            evicted.append(old)
+            dropped.append(old)
+            self.totals["evictions"] += 1
+        return {"path": path, "tokens": self.count_tokens(self._render_one(entry)),
+                "sections": None if entry["sections"] is None else [entry["sections"][i][0] for i in sorted(entry["selected"])],
+                "other_sections": None if entry["sections"] is None else [h for i, (h, text) in enumerate(entry["sections"]) if not is_intro(h, text) and i not in entry["selected"]],
+                "evicted": dropped}
+
+    def _prepare(self, entry: Dict[str, Any], content: str):
+        digest = hashlib.blake2b(content.encode("utf-8"), digest_size=8).digest()
+        if entry.get("digest") == digest: return
+        entry["digest"], entry["content"] = digest, content
+        # Words a task may name it by; short ones ("de", "com", "uma") would tie every task to every skill
+        name = os.path.splitext(os.path.basename(entry["path"]))[0].replace("_", " ")
+        headings = [m.group(1) for m in map(HEADING_RE.match, content.splitlines()) if m]
+        entry["names"] = {t for t in tokenize(" ".join([name] + headings)) if len(t) > 3}
+        if self.count_tokens(content) <= self.section_threshold:
+            entry["sections"], entry["selected"] = None, set()
+            return
+        # Re-split; keep the selected headings that still exist
+        old = {entry["sections"][i][0] for i in entry["selected"]} if entry.get("sections") else set()
+        entry["sections"] = split_sections(content)
+        entry["selected"] = {i for i, (h, _) in enumerate(entry["sections"]) if h in old}
+
+    def _pick(self, agent: str, sections: List[Tuple[str, str]], section: Optional[str]) -> set:
+        if section:
+            wanted = {i for i, (h, text) in enumerate(sections) if not is_intro(h, text) and section.lower() in h.lower()}
+            if wanted: return wanted
+        # Best matches for the current task, until the per-skill allowance is spent
+        focus = set(tokenize(section or self.focus.get(agent, "")))
+        scored = sorted(((len(focus & set(tokenize(h + " " + text))), i) for i, (h, text) in enumerate(sections) if not is_intro(h, text)),
+                        key=lambda s: (-s[0], s[1]))
+        picked, spent = set(), sum(self.count_tokens(text) for h, text in sections if is_intro(h, text))
+        for score, i in scored:
+            cost = self.count_tokens(sections[i][1])
+            if picked and (score == 0 or spent + cost > self.section_threshold): break
+            picked.add(i)
+            spent += cost
+        return picked
+
+    # --- PROMPT ---
+    def _render_one(self, entry: Dict[str, Any]) -> str:
+        if entry["sections"] is None: return entry["content"]
+        parts = [text for i, (h, text) in enumerate(entry["sections"]) if is_intro(h, text) or i in entry["selected"]]
+        others = [h for i, (h, text) in enumerate(entry["sections"]) if not is_intro(h, text) and i not in entry["selected"]]
+        if others: parts.append(f"(Outras seções: {'; '.join(others)}. Use load_skill com section='...' para carregá-las.)\n")
+        return "".join(parts)
+
+    def render(self, agent: str, label: str = "SKILL FILE") -> str:
+        scope = self.scopes.get(agent, {})
+        blocks = []
+        for path, entry in scope.items():
+            content = self.fetch(path)
+            if content is not None: self._prepare(entry, content)
+            blocks.append(f"--- {label}: {path} ---\n{self._render_one(entry)}")
+        evicted = self.evicted.get(agent)
+        if evicted:
+            blocks.append(f"(Skills descarregadas para economizar contexto: {', '.join(evicted)}. Use load_skill para recarregar.)")
+        return "\n\n".join(blocks)
+
+    def tokens(self, agent: str) -> int:
+        return sum(self.count_tokens(self._render_one(e)) for e in self.scopes.get(agent, {}).values())
+
+    def stats(self, agent: str) -> Dict[str, Any]:
+        scope = self.scopes.get(agent, {})
+        return {"resident": list(scope), "sectioned": [p for p, e in scope.items() if e["sections"] is not None],
+                "evicted": list(self.evicted.get(agent, [])), "tokens": self.tokens(agent), "budget": self.budget, **self.totals}
+
+def describe_load(report: Dict[str, Any]) -> str:
+    """What a `load()` report adds to the tool result: sections in and out, skills evicted."""
+    notes = []
+    if report["sections"] is not None:
+        notes.append(f"Seções no contexto: {'; '.join(report['sections']) or '(só a introdução)'}.")
+        if report["other_sections"]: notes.append(f"Outras seções: {'; '.join(report['other_sections'])} (use section='...').")
+    if report["evicted"]: notes.append(f"Descarregadas para caber no orçamento: {', '.join(report['evicted'])}.")
+    return " ".join(notes)
@@ -0,0 +1,143 @@
+import os
+import itertools
+import threading
+from typing import TYPE_CHECKING, Dict, Any, Optional, Tuple
+
+from agent_session import current_agent, current_session
+
+if TYPE_CHECKING:
+    import numpy as np  # imported where the drafts run: with decoding "off" the engine never needs it
+
+# --- CONFIGURATION ---
+# "lookup" drafts from n-grams already in the context (prompt lookup), "draft" from a small GGUF, "off" disables
+SPEC_MODE = os.getenv("SPEC_DECODING", "off")
+SPEC_TOKENS = int(os.getenv("SPEC_TOKENS", "10"))      # tokens proposed per verification pass
+SPEC_NGRAM = int(os.getenv("SPEC_NGRAM", "3"))         # longest n-gram matched by prompt lookup
+
+def speculative_config(suffix: str = "") -> Dict[str, Any]:
+    """Speculative decoding settings from the environment; a suffix (`FAST`) overrides them per pooled model."""
+    def env(name: str, default: str) -> str:
+        value = os.getenv(name, default)
+        return os.getenv(f"{name}_{suffix}", value) if suffix else value
+    return {"mode": env("SPEC_DECODING", SPEC_MODE), "num_pred_tokens": int(env("SPEC_TOKENS", str(SPEC_TOKENS))),
+            "max_ngram_size": int(env("SPEC_NGRAM", str(SPEC_NGRAM))), "draft_path": env("SPEC_DRAFT_MODEL", "")}
+
+# --- DRAFTS ---
+class PromptLookupDraft:
+    """
+    Proposes the tokens that followed the first earlier occurrence of the
+    context's last n-gram (longest n first): the same lookup as llama-cpp-python's
+    `LlamaPromptLookupDecoding`, kept here so benchmarks/ can measure it
+    without llama_cpp installed.
+    """
+
+    def __init__(self, max_ngram_size: int = SPEC_NGRAM, num_pred_tokens: int = SPEC_TOKENS):
+        self.max_ngram_size = max_ngram_size
+        self.num_pred_tokens = num_pred_tokens
+
+    def __call__(self, input_ids: "np.ndarray", /, **kwargs) -> "np.ndarray":
+        import numpy as np
+        n = input_ids.shape[0]
+        for size in range(min(self.max_ngram_size, n - 1), 0, -1):
+            windows = np.lib.stride_tricks.sliding_window_view(input_ids[:n - 1], size)
+            hits = np.nonzero(np.all(windows == input_ids[n - size:], axis=1))[0]
+            if hits.size:
+                start = int(hits[0]) + size
+                return input_ids[start:min(start + self.num_pred_tokens, n)].astype(np.intc)
+        return np.array([], dtype=np.intc)
+
+class GGUFDraft:
+    """Greedy proposals from a small GGUF sharing the main model's vocabulary; its KV prefix is reused between calls."""
+
+    def __init__(self, model_path: str, n_ctx: int, num_pred_tokens: int = SPEC_TOKENS):
+        from model_loader import load_model, model_params
+        self.llm = load_model(model_path, n_ctx, params=model_params("DRAFT"), speculative={"mode": "off"})
+        self.num_pred_tokens = num_pred_tokens
+
+    def __call__(self, input_ids: "np.ndarray", /, **kwargs) -> "np.ndarray":
+        import numpy as np
+        tokens = self.llm.generate(input_ids.tolist(), top_k=1, top_p=1.0, temp=0.0, reset=True)
+        try: return np.array(list(itertools.islice(tokens, self.num_pred_tokens)), dtype=np.intc)
+        finally: tokens.close()
+
+# --- ACCOUNTING ---
+class DraftTracker:
+    """
+    Wraps the `draft_model` given to `Llama` and measures how much of it the
+    model accepted, per agent. llama.cpp verifies each proposal in one batch
+    and calls the draft again with the accepted tokens plus the one it
+    sampled, so the next call's input tells how far the previous proposal held.
+    """
+
+    def __init__(self, draft: Any, mode: str):
+        self.draft = draft
+        self.mode = mode
+        self._pending: Dict[Tuple[Optional[str], Optional[str]], Tuple[int, int, "np.ndarray"]] = {}
+        self._lock = threading.Lock()
+        self.agents: Dict[str, Dict[str, float]] = {}
+        self._seen: Dict[str, Dict[str, float]] = {}
+
+    def _counts(self, agent: str) -> Dict[str, float]:
+        return self.agents.setdefault(agent, {"passes": 0, "proposed": 0, "accepted": 0, "decode_tokens": 0, "decode_ms": 0.0})
+
+    def __call__(self, input_ids: "np.ndarray", /, **kwargs) -> "np.ndarray":
+        import numpy as np
+        session, agent = current_session(), current_agent() or "default"
+        key = (session.id if session else None, agent)
+        n = input_ids.shape[0]
+        with self._lock:
+            counts = self._counts(agent)
+            pending = self._pending.pop(key, None)
+            # Settle the previous proposal if this call continues the same generation
+            if pending is not None:
+                prev_len, prev_last, proposal = pending
+                if n > prev_len and int(input_ids[prev_len - 1]) == prev_last and proposal.size:
+                    got = input_ids[prev_len:prev_len + proposal.size]
+                    match = np.nonzero(got != proposal[:got.size])[0]
+                    counts["proposed"] += proposal.size
+                    counts["accepted"] += int(match[0]) if match.size else int(got.size)
+            counts["passes"] += 1
+        proposal = self.draft(input_ids, **kwargs)
+        with self._lock: self._pending[key] = (n, int(input_ids[-1]), proposal)
+        return proposal
+
+    def step(self, agent: str, gen_stats: Dict[str, Any]) -> Dict[str, Any]:
+        """Folds one generation step of `agent` into its totals and reports the step's share."""
+        with self._lock:
+            counts = self._counts(agent)
+            counts["decode_tokens"] += gen_stats.get("decode_tokens", 0)
+            counts["decode_ms"] += max(gen_stats.get("total_ms", 0.0) - gen_stats.get("ttft_ms", 0.0), 0.0)
+            seen = self._seen.get(agent, {k: 0 for k in counts})
+            delta = {k: counts[k] - seen.get(k, 0) for k in counts}
+            self._seen[agent] = dict(counts)
+        return summarize(delta)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock: return {"mode": self.mode, "agents": {agent: summarize(c) for agent, c in self.agents.items()}}
+
+def summarize(counts: Dict[str, float]) -> Dict[str, Any]:
+    """
+    Acceptance rate and tokens per verification pass (counted). The tokens/s
+    gain is modelled, not measured: it assumes a verification pass costs what
+    a single-token step would (close on GPU). The `speculative_model`
+    benchmark measures the real gain against decoding without drafts.
+    """
+    passes, tokens = counts["passes"], counts["decode_tokens"]
+    decode_s = counts["decode_ms"] / 1000
+    tokens_per_s = tokens / decode_s if decode_s > 0 else 0.0
+    return {"passes": int(passes), "proposed": int(counts["proposed"]), "accepted": int(counts["accepted"]),
+            "acceptance": round(counts["accepted"] / counts["proposed"], 3) if counts["proposed"] else 0.0,
+            "tokens_per_pass": round(tokens / passes, 2) if passes else 0.0,
+            "modelled_tokens_per_s_gained": round(tokens_per_s - passes / decode_s, 1) if decode_s > 0 and passes else 0.0}
+
+def build_draft(config: Dict[str, Any], n_ctx: int) -> Optional[DraftTracker]:
+    """The `draft_model` for a `Llama`, or None when speculative decoding is off."""
+    mode = config["mode"]
+    if mode == "lookup":
+        return DraftTracker(PromptLookupDraft(config["max_ngram_size"], config["num_pred_tokens"]), mode)
+    if mode == "draft":
+        if not config["draft_path"] or not os.path.exists(config["draft_path"]):
+            print(f"⚠️  SPEC_DECODING=draft needs SPEC_DRAFT_MODEL (got '{config['draft_path']}'); decoding without drafts.")
+            return None
+        return DraftTracker(GGUFDraft(config["draft_path"], n_ctx, config["num_pred_tokens"]), mode)
+    return None
@@ -0,0 +1,166 @@
+import sys
+import time
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+TOOL_OPEN = "<tool_call>"
+TOOL_CLOSE = "</tool_call>"
+
+class TerminalEcho:
+    """
+    Prints streamed text as it arrives, hiding everything from `<tool_call>` on.
+    A trailing fragment that could be the start of the tag is held back until
+    the next delta disambiguates it. With `expand`, references are expanded
+    (see ExpandRefs) after that check, so a stored result quoting a tool call
+    is printed rather than muting the echo.
+    """
+
+    def __init__(self, prefix: str = "", out=None, expand: Optional[Callable[[str], str]] = None):
+        self.prefix = prefix
+        self.out = out or sys.stdout
+        self._pending = ""
+        self._started = False
+        self._muted = False
+        self._write = ExpandRefs(self._emit, expand) if expand else self._emit
+
+    def __call__(self, delta: str):
+        if self._muted: return
+        text = self._pending + delta
+        cut = text.find(TOOL_OPEN)
+        if cut != -1:
+            self._write(text[:cut])
+            self._pending, self._muted = "", True
+            return
+        # Hold back the longest suffix that is a prefix of the tag
+        hold = next((k for k in range(min(len(TOOL_OPEN) - 1, len(text)), 0, -1) if TOOL_OPEN.startswith(text[-k:])), 0)
+        self._write(text[:len(text) - hold])
+        self._pending = text[len(text) - hold:]
+
+    def _emit(self, text: str):
+        if not text: return
+        if not self._started:
+            self.out.write(self.prefix)
+            self._started = True
+        self.out.write(text)
+        self.out.flush()
+
+    def close(self):
+        if not self._muted: self._write(self._pending)
+        if isinstance(self._write, ExpandRefs): self._write.flush()
+        self._pending = ""
+        if self._started: self.out.write("\n")
+
+    @property
+    def printed(self) -> bool:
+        return self._started
+
+class ExpandRefs:
+    """
+    Wraps a streaming callback so `{{...}}` references (see result_store.py)
+    reach it already expanded. Text from an opening `{{` is held back until
+    the reference closes, or passed on as is once it is too long to be one.
+    """
+
+    MAX_REF = 32
+
+    def __init__(self, on_text: Callable[[str], None], expand: Callable[[str], str]):
+        self.on_text = on_text
+        self.expand = expand
+        self._pending = ""
+
+    def __call__(self, delta: str):
+        text, out = self._pending + delta, []
+        while True:
+            at = text.find("{{")
+            if at == -1:
+                hold = 1 if text.endswith("{") else 0
+                out.append(text[:len(text) - hold])
+                self._pending = text[len(text) - hold:]
+                break
+            out.append(text[:at])
+            close = text.find("}}", at)
+            if close != -1 and close - at <= self.MAX_REF:
+                out.append(self.expand(text[at:close + 2]))
+                text = text[close + 2:]
+            elif close == -1 and len(text) - at <= self.MAX_REF:
+                self._pending = text[at:]
+                break
+            else:
+                out.append(text[at:at + 2])
+                text = text[at + 2:]
+        if "".join(out): self.on_text("".join(out))
+
+    def flush(self):
+        if self._pending: self.on_text(self._pending)
+        self._pending = ""
+
+def stream_chat(llm, messages: List[Dict[str, Any]], on_text: Optional[Callable[[str], None]] = None,
+                stop_on_tool_call: bool = True, cache: Any = None, **kwargs) -> Tuple[str, Dict[str, Any]]:
+    """
+    Streams a chat completion and cancels decoding once the model has closed
+    its tool call(s) and starts producing anything other than another
+    `<tool_call>`. Returns the text and per-step timing stats (TTFT, tokens/s).
+
+    A cancelled completion never reaches llama.cpp's own end-of-completion
+    snapshot, so the evaluated state is stored in `cache` (the model's
+    PrefixStateCache) before the stream is closed.
+    """
+    start = time.perf_counter()
+    first_token_at = None
+    n_chunks = 0
+    text = ""
+    scan_from = 0       # Where to look for the next <tool_call>
+    done_upto = 0       # End of the last complete tool call
+    n_calls = 0
+    early_stop = False
+
+    stream = llm.create_chat_completion(messages=messages, stream=True, **kwargs)
+    try:
+        for chunk in stream:
+            delta = chunk["choices"][0].get("delta", {}).get("content")
+            if not delta: continue
+            if first_token_at is None: first_token_at = time.perf_counter()
+            n_chunks += 1
+            text += delta
+            if on_text: on_text(delta)
+            if not stop_on_tool_call: continue
+
+            # Consume every tool call completed so far; only the new tail is rescanned
+            while True:
+                open_at = text.find(TOOL_OPEN, max(done_upto, scan_from - len(TOOL_OPEN)))
+                if open_at == -1:
+                    scan_from = len(text)
+                    break
+                close_at = text.find(TOOL_CLOSE, open_at)
+                if close_at == -1:
+                    scan_from = open_at
+                    break
+                done_upto = scan_from = close_at + len(TOOL_CLOSE)
+                n_calls += 1
+
+            if n_calls:
+                tail = text[done_upto:].lstrip()
+                if tail and not (tail.startswith(TOOL_OPEN) or TOOL_OPEN.startswith(tail)):
+                    early_stop = True
+                    break
+    finally:
+        try:
+            # Snapshot while the stream still holds the model (server.py schedules it per session)
+            if early_stop and cache is not None:
+                evaluated = list(llm._input_ids)
+                if evaluated: cache[evaluated] = llm.save_state()
+        finally:
+            # Closing the generator stops llama.cpp from decoding further tokens
+            if hasattr(stream, "close"): stream.close()
+
+    end = time.perf_counter()
+    if early_stop: text = text[:done_upto]
+    decode_time = end - (first_token_at or end)
+    stats = {
+        "ttft_ms": round(((first_token_at or end) - start) * 1000, 1),
+        "decode_tokens": n_chunks,
+        "tokens_per_s": round(n_chunks / decode_time, 1) if decode_time > 0 else 0.0,
+        "total_ms": round((end - start) * 1000, 1),
+        "tool_calls": n_calls,
+        "early_stop": early_stop,
+    }
+    return text, stats
@@ -10,7 +10,7 @@ from agent_v2 import AgentEngine, MODEL_PATH, N_CTX
 def run_test():
     print("🧪 Starting Integration Test: Multi-Agent System")
     
-    if not os.path.exists(MODEL_PATH):
+    if not MODEL_PATH or not os.path.exists(MODEL_PATH):
         print("❌ Model not found. Skipping test.")
         return
 
@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+import threading
+
+# Add current dir to path
+sys.path.append(os.getcwd())
+sys.path.append(os.path.join(os.getcwd(), "benchmarks"))
+
+from fake_llm import FakeLlama
+from model_pool import ModelPool
+
+class HandoffLock:
+    """The pool's lock; after the first release that published `name`, runs `hook` before the releasing thread goes on."""
+
+    def __init__(self, pool: ModelPool, name: str, hook):
+        self.inner, self.pool, self.name, self.hook = pool._lock, pool, name, hook
+        self.fired = False
+
+    def __enter__(self):
+        self.inner.acquire()
+
+    def __exit__(self, *exc):
+        self.inner.release()
+        if not self.fired and self.name in self.pool._entries:
+            self.fired = True
+            self.hook()
+
+def test_second_user_waits_for_a_slow_load(tmp_path, monkeypatch):
+    path = tmp_path / "fast.gguf"
+    path.write_bytes(b"\0" * 1024)
+    monkeypatch.setenv("MODEL_PATH_FAST", str(path))
+    loads = []
+
+    def loader(path, n_ctx, params, speculative):
+        loads.append(path)
+        time.sleep(0.2)
+        return FakeLlama(["ok"])
+
+    pool = ModelPool(FakeLlama(["default"]), loader=loader)
+    got, errors = {}, []
+
+    def run(who: str):
+        try:
+            with pool.use("fast") as llm: got[who] = llm
+        except Exception as e:
+            errors.append(e)
+
+    # B arrives right after A published the placeholder, before A started loading
+    b = threading.Thread(target=run, args=("b",))
+    def start_b():
+        b.start()
+        b.join(0.1)
+    pool._lock = HandoffLock(pool, "fast", start_b)
+    run("a")
+    b.join(5)
+    assert not errors and len(loads) == 1
+    assert got["a"] is got["b"] and isinstance(got["a"], FakeLlama)
+    assert pool._entries["fast"]["users"] == 0
+
+def test_failed_load_is_reported_and_forgotten(tmp_path, monkeypatch):
+    path = tmp_path / "fast.gguf"
+    path.write_bytes(b"\0" * 1024)
+    monkeypatch.setenv("MODEL_PATH_FAST", str(path))
+
+    def loader(path, n_ctx, params, speculative):
+        raise OSError("corrupt GGUF")
+
+    pool = ModelPool(FakeLlama(["default"]), loader=loader)
+    try:
+        with pool.use("fast"): pass
+        assert False, "load should fail"
+    except OSError:
+        pass
+    assert "fast" not in pool._entries
@@ -0,0 +1,137 @@
+import os
+import sys
+
+import pytest
+
+# Add current dir to path
+sys.path.append(os.getcwd())
+
+import note_edit
+from note_edit import EditConflict, EditError, apply_edit, file_version
+
+NOTE = """# Projeto
+
+Intro do projeto.
+
+## Tarefas
+- [ ] revisar texto ^t1
+- [ ] enviar email
+
+### Detalhes
+Subseção intacta.
+
+## Notas
+Um parágrafo
+em duas linhas. ^p1
+
+```
+## Tarefas
+```
+"""
+
+def make_note(tmp_path, text: str = NOTE) -> str:
+    path = tmp_path / "Projeto.md"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+def read(path: str) -> str:
+    with open(path, encoding="utf-8") as f: return f.read()
+
+def assert_untouched(path: str, before: str):
+    assert read(path) == before
+    assert [n for n in os.listdir(os.path.dirname(path)) if n.endswith(".tmp")] == []
+
+def test_append_keeps_text_on_its_own_line(tmp_path):
+    path = make_note(tmp_path, "linha sem quebra")
+    apply_edit(path, "append", "nova linha\n")
+    assert read(path) == "linha sem quebra\nnova linha\n"
+
+def test_replace_unique_target(tmp_path):
+    path = make_note(tmp_path)
+    stats = apply_edit(path, "replace", "Intro revisada.", target_text="Intro do projeto.")
+    assert stats["replaced"] == 1 and stats["version"] == file_version(os.stat(path))
+    assert read(path) == NOTE.replace("Intro do projeto.", "Intro revisada.")
+
+def test_replace_refuses_multiple_matches(tmp_path):
+    path = make_note(tmp_path)
+    with pytest.raises(EditError, match="2 vezes"):
+        apply_edit(path, "replace", "## Pendências", target_text="## Tarefas")
+    assert_untouched(path, NOTE)
+
+def test_replace_with_max_replacements(tmp_path):
+    path = make_note(tmp_path, "a-a-a")
+    assert apply_edit(path, "replace", "b", target_text="a", max_replacements=2)["replaced"] == 2
+    assert read(path) == "b-b-a"
+    assert apply_edit(path, "replace", "c", target_text="b", max_replacements=0)["replaced"] == 2
+    assert read(path) == "c-c-a"
+
+def test_replace_across_chunk_boundaries(tmp_path, monkeypatch):
+    monkeypatch.setattr(note_edit, "CHUNK_SIZE", 4)
+    path = make_note(tmp_path)
+    apply_edit(path, "replace", "Texto novo.", target_text="Subseção intacta.")
+    assert read(path) == NOTE.replace("Subseção intacta.", "Texto novo.")
+
+def test_replace_missing_target_leaves_file(tmp_path):
+    path = make_note(tmp_path)
+    with pytest.raises(EditError, match="not found"):
+        apply_edit(path, "replace", "x", target_text="inexistente")
+    assert_untouched(path, NOTE)
+
+def test_append_under_heading_stops_at_subsection(tmp_path):
+    path = make_note(tmp_path)
+    apply_edit(path, "append_under_heading", "- [ ] ligar", heading="## Tarefas")
+    assert read(path) == NOTE.replace("enviar email\n", "enviar email\n- [ ] ligar\n")
+
+def test_prepend_under_heading(tmp_path):
+    path = make_note(tmp_path)
+    apply_edit(path, "prepend_under_heading", "Resumo.", heading="notas")
+    assert read(path) == NOTE.replace("## Notas\n", "## Notas\nResumo.\n")
+
+def test_replace_under_heading_keeps_separating_blank_line(tmp_path):
+    path = make_note(tmp_path)
+    apply_edit(path, "replace_under_heading", "- [x] feito", heading="## Tarefas")
+    assert read(path) == NOTE.replace("- [ ] revisar texto ^t1\n- [ ] enviar email\n", "- [x] feito\n")
+
+def test_heading_not_found_leaves_file(tmp_path):
+    path = make_note(tmp_path)
+    with pytest.raises(EditError, match="não encontrado"):
+        apply_edit(path, "append_under_heading", "x", heading="## Ausente")
+    assert_untouched(path, NOTE)
+
+def test_replace_block_keeps_marker_and_id(tmp_path):
+    path = make_note(tmp_path)
+    apply_edit(path, "replace_block", "revisar texto final", block_id="^t1")
+    assert read(path) == NOTE.replace("- [ ] revisar texto ^t1", "- [ ] revisar texto final ^t1")
+
+def test_replace_block_rewrites_whole_paragraph(tmp_path):
+    path = make_note(tmp_path)
+    apply_edit(path, "replace_block", "Parágrafo novo.", block_id="p1")
+    assert read(path) == NOTE.replace("Um parágrafo\nem duas linhas. ^p1", "Parágrafo novo. ^p1")
+
+def test_insert_after_block(tmp_path):
+    path = make_note(tmp_path)
+    apply_edit(path, "insert_after_block", "- [ ] item novo", block_id="t1")
+    assert read(path) == NOTE.replace("^t1\n", "^t1\n- [ ] item novo\n")
+
+def test_block_not_found_leaves_file(tmp_path):
+    path = make_note(tmp_path)
+    with pytest.raises(EditError, match="não encontrado"):
+        apply_edit(path, "replace_block", "x", block_id="zz")
+    assert_untouched(path, NOTE)
+
+def test_stale_version_is_a_conflict(tmp_path):
+    path = make_note(tmp_path)
+    version = file_version(os.stat(path))
+    apply_edit(path, "append", "outra sessão", expected_version=version)
+    edited = read(path)
+    for operation, args in (("append", {}), ("replace", {"target_text": "Intro do projeto."}),
+                            ("append_under_heading", {"heading": "Notas"}), ("replace_block", {"block_id": "t1"})):
+        with pytest.raises(EditConflict):
+            apply_edit(path, operation, "x", expected_version=version, **args)
+        assert_untouched(path, edited)
+
+def test_invalid_operation(tmp_path):
+    path = make_note(tmp_path)
+    with pytest.raises(EditError, match="Invalid operation"):
+        apply_edit(path, "delete", "x")
+    assert_untouched(path, NOTE)
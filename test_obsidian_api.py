@@ -0,0 +1,160 @@
+import os
+import sys
+import time
+import socket
+import threading
+
+import uvicorn
+from fastapi import FastAPI, Request, Response, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+# Add current dir to path
+sys.path.append(os.getcwd())
+
+from obsidian_api import ObsidianClient, ObsidianAPIError, call_operation
+
+TOKEN = "test-token"
+
+# --- FAKE LOCAL REST API PLUGIN ---
+def build_fake_obsidian() -> FastAPI:
+    """In-memory stand-in for the Obsidian Local REST API plugin."""
+    app = FastAPI()
+    app.state.notes = {"Pasta/Minha Nota.md": "# Minha Nota\nconteúdo", "Daily/2026-10-17.md": "- [ ] revisar"}
+    app.state.opened = []
+    app.state.executed = []
+    app.state.client_ports = set()
+
+    @app.middleware("http")
+    async def auth(request: Request, call_next):
+        app.state.client_ports.add(request.client.port)
+        if request.headers.get("Authorization") != f"Bearer {TOKEN}":
+            return JSONResponse({"errorCode": 40101, "message": "Authorization required."}, status_code=401)
+        return await call_next(request)
+
+    @app.get("/vault/")
+    def list_root():
+        return {"files": sorted({p.split("/")[0] + ("/" if "/" in p else "") for p in app.state.notes})}
+
+    @app.get("/vault/{path:path}")
+    def read(path: str):
+        if path.endswith("/"):
+            prefix = path
+            return {"files": sorted(p[len(prefix):] for p in app.state.notes if p.startswith(prefix))}
+        if path not in app.state.notes:
+            return JSONResponse({"errorCode": 40400, "message": "File not found"}, status_code=404)
+        return PlainTextResponse(app.state.notes[path], media_type="text/markdown")
+
+    @app.put("/vault/{path:path}")
+    async def put(path: str, request: Request):
+        app.state.notes[path] = (await request.body()).decode("utf-8")
+        return Response(status_code=204)
+
+    @app.post("/vault/{path:path}")
+    async def append(path: str, request: Request):
+        if path not in app.state.notes:
+            return JSONResponse({"errorCode": 40400, "message": "File not found"}, status_code=404)
+        app.state.notes[path] += (await request.body()).decode("utf-8")
+        return Response(status_code=204)
+
+    @app.get("/active/")
+    def active(request: Request):
+        assert request.headers.get("Accept") == "application/vnd.olra.json"
+        path = "Pasta/Minha Nota.md"
+        return {"path": path, "content": app.state.notes[path], "tags": [], "frontmatter": {}}
+
+    @app.get("/periodic/{period}/")
+    def periodic(period: str):
+        if period != "daily": raise HTTPException(status_code=404)
+        return PlainTextResponse(app.state.notes["Daily/2026-10-17.md"], media_type="text/markdown")
+
+    @app.post("/open/{path:path}")
+    def open_note(path: str):
+        app.state.opened.append(path)
+        return Response(status_code=200)
+
+    @app.get("/commands/")
+    def commands():
+        return {"commands": [{"id": "editor:toggle-bold", "name": "Toggle bold"}]}
+
+    @app.post("/commands/{command_id}/")
+    def run_command(command_id: str):
+        app.state.executed.append(command_id)
+        return Response(status_code=204)
+
+    return app
+
+def start_server(app: FastAPI):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started: time.sleep(0.01)
+    return server, f"http://127.0.0.1:{port}"
+
+APP = build_fake_obsidian()
+SERVER, BASE_URL = None, None
+
+def client(token: str = TOKEN) -> ObsidianClient:
+    global SERVER, BASE_URL
+    if SERVER is None: SERVER, BASE_URL = start_server(APP)
+    return ObsidianClient(base_url=BASE_URL, token=token)
+
+# --- TESTS ---
+def test_read_and_list():
+    c = client()
+    assert c.read("Pasta/Minha Nota.md").startswith("# Minha Nota")
+    assert "Pasta/" in c.list()
+    assert c.list("Pasta") == ["Minha Nota.md"]
+
+def test_put_and_append():
+    c = client()
+    c.put("Nova.md", "linha 1")
+    c.append("Nova.md", "\nlinha 2")
+    assert c.read("Nova.md") == "linha 1\nlinha 2"
+
+def test_active_periodic_open_and_commands():
+    c = client()
+    assert c.active()["path"] == "Pasta/Minha Nota.md"
+    assert c.periodic("daily") == "- [ ] revisar"
+    c.open("Pasta/Minha Nota.md")
+    assert APP.state.opened[-1] == "Pasta/Minha Nota.md"
+    assert c.commands()[0]["id"] == "editor:toggle-bold"
+    c.run_command("editor:toggle-bold")
+    assert APP.state.executed[-1] == "editor:toggle-bold"
+
+def test_errors_are_raised_with_status():
+    c = client()
+    try:
+        c.read("Nao Existe.md")
+        assert False, "expected ObsidianAPIError"
+    except ObsidianAPIError as e:
+        assert e.status == 404 and "File not found" in str(e)
+    try:
+        client(token="wrong").list()
+        assert False, "expected ObsidianAPIError"
+    except ObsidianAPIError as e:
+        assert e.status == 401
+
+def test_tool_adapter():
+    c = client()
+    assert call_operation(c, "read", path="Pasta/Minha Nota.md").startswith("# Minha Nota")
+    assert "gravada" in call_operation(c, "put", path="Tool.md", content="x")
+    try:
+        call_operation(c, "delete", path="Tool.md")
+        assert False, "expected ValueError"
+    except ValueError: pass
+
+def test_connection_is_reused():
+    c = client()
+    APP.state.client_ports.clear()
+    for _ in range(20): c.read("Pasta/Minha Nota.md")
+    # Keep-alive: every request of a sequential client travels on one connection
+    assert len(APP.state.client_ports) == 1
+
+if __name__ == "__main__":
+    print("🧪 Starting Obsidian API client tests")
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"✅ {name}")
@@ -0,0 +1,35 @@
+import os
+import sys
+
+# Add current dir to path
+sys.path.append(os.getcwd())
+
+from skill_residency import SkillResidency
+
+SKILLS = {
+    "skills/git_workflow.md": "# Git\nCommits pequenos.\n",
+    "skills/escrita.md": "# Escrita\n## Revisão de texto\nFrases curtas.\n",
+    "skills/planilhas.md": "# Planilhas\nFórmulas.\n",
+}
+
+def make_residency(budget: int) -> SkillResidency:
+    return SkillResidency(lambda text: len(text.split()), SKILLS.get, budget=budget, section_threshold=1000)
+
+def test_evicts_least_recently_used():
+    residency = make_residency(budget=14)
+    residency.load("brain", "skills/git_workflow.md")
+    residency.load("brain", "skills/escrita.md")
+    residency.load("brain", "skills/git_workflow.md")  # used again: escrita is now the oldest
+    report = residency.load("brain", "skills/planilhas.md")
+    assert report["evicted"] == ["skills/escrita.md"]
+    assert residency.resident("brain") == ["skills/git_workflow.md", "skills/planilhas.md"]
+
+def test_task_naming_a_skill_counts_as_use():
+    residency = make_residency(budget=14)
+    residency.load("brain", "skills/git_workflow.md")
+    residency.load("brain", "skills/escrita.md")
+    residency.set_focus("brain", "Faça a revisão deste texto")  # a heading of escrita.md
+    assert residency.resident("brain") == ["skills/git_workflow.md", "skills/escrita.md"]
+    residency.set_focus("brain", "Organize o workflow de commits")  # the file name of git_workflow.md
+    assert residency.resident("brain") == ["skills/escrita.md", "skills/git_workflow.md"]
+    assert residency.load("brain", "skills/planilhas.md")["evicted"] == ["skills/escrita.md"]
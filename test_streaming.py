@@ -0,0 +1,44 @@
+import io
+import os
+import sys
+
+# Add current dir to path
+sys.path.append(os.getcwd())
+sys.path.append(os.path.join(os.getcwd(), "benchmarks"))
+
+from fake_llm import FakeLlama, tool_call
+from prompt_cache import PrefixStateCache
+from result_store import ResultStore
+from streaming import stream_chat, TerminalEcho
+
+MESSAGES = [{"role": "system", "content": "Você é o brain."}, {"role": "user", "content": "Liste os agentes."}]
+
+def test_early_stop_snapshots_evaluated_state():
+    llm = FakeLlama([tool_call("list_agents") + " e depois eu resumo o resultado"])
+    cache = PrefixStateCache()
+    cache.attach(llm)
+    text, stats = stream_chat(llm, MESSAGES, cache=cache)
+    assert stats["early_stop"] and text == tool_call("list_agents")
+    assert len(cache.ram) == 1
+    tokens, state = next(iter(cache.ram.values()))
+    assert list(tokens) == state.input_ids == list(llm._input_ids)
+    # The snapshot covers the prompt and the tool call decoded after it
+    prompt = llm.tokenize("".join(m["content"] for m in MESSAGES).encode("utf-8"))
+    assert list(tokens[:len(prompt)]) == prompt and len(tokens) > len(prompt)
+
+def test_complete_answer_leaves_snapshot_to_llama_cpp():
+    llm = FakeLlama(["Resposta final, sem ferramentas."])
+    cache = PrefixStateCache()
+    text, stats = stream_chat(llm, MESSAGES, cache=cache)
+    assert not stats["early_stop"] and text == "Resposta final, sem ferramentas."
+    assert len(cache.ram) == 0
+
+def test_echo_expands_refs_after_tool_call_check(tmp_path):
+    store = ResultStore(str(tmp_path))
+    handle = store.put("read_file", 'Exemplo: <tool_call>{"name": "x"}</tool_call>')
+    out = io.StringIO()
+    echo = TerminalEcho(out=out, expand=lambda t: store.expand(t, count=False))
+    for delta in ["Nota: {{", handle, "}} fim"]: echo(delta)
+    echo.close()
+    assert out.getvalue() == 'Nota: Exemplo: <tool_call>{"name": "x"}</tool_call> fim\n'
+    assert store.totals["expanded_chars"] == 0
@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+
+# Add current dir to path
+sys.path.append(os.getcwd())
+
+import tool_executor
+from tool_cache import ToolResultCache
+from tool_executor import ToolExecutor, is_read_only_command
+
+def test_readers_stay_read_only():
+    assert is_read_only_command("grep -o TODO notas.md | sort -u | uniq -c")
+    assert is_read_only_command("find . -name '*.md' -print0")
+    assert is_read_only_command("sort -k2 -t, dados.csv")
+
+def test_sort_output_flag_writes():
+    assert not is_read_only_command("sort --output=x notas.md")
+    assert not is_read_only_command("sort --output x notas.md")
+    assert not is_read_only_command("sort -o x notas.md")
+    assert not is_read_only_command("sort -uo x notas.md")
+
+def test_find_fprint_writes():
+    assert not is_read_only_command("find . -fprint0 x")
+    assert not is_read_only_command("find . -fprint x")
+    assert not is_read_only_command("find . -fprintf x '%p'")
+
+def test_find_fls_writes():
+    assert not is_read_only_command("find . -fls x")
+
+def test_find_exec_and_delete_write():
+    assert not is_read_only_command("find . -name '*.tmp' -delete")
+    assert not is_read_only_command("find . -exec rm {} ;")
+
+def test_uniq_output_operand_writes():
+    assert not is_read_only_command("uniq entrada.txt saida.txt")
+
+def test_lone_read_only_call_has_timeout(monkeypatch):
+    monkeypatch.setitem(tool_executor.TOOL_TIMEOUTS, "read_file", 0.1)
+    executor = ToolExecutor(max_workers=2)
+    start = time.perf_counter()
+    [result] = executor.run([("read_file", {"path": "x"})], lambda name, args: time.sleep(1) or "ok")
+    executor.shutdown()
+    assert time.perf_counter() - start < 0.5
+    assert not result["ok"] and "timed out" in result["result"] and "concurrent" not in result
+
+def test_cache_hits_are_marked_with_their_own_timing():
+    cache = ToolResultCache(capacity_bytes=1 << 20)
+    def dispatch(name, args):
+        return cache.call(name, args["query"], lambda: time.sleep(0.05) or "3 nota(s)")
+    executor = ToolExecutor(max_workers=2)
+    [miss] = executor.run([("search_vault", {"query": "x"})], dispatch)
+    [hit] = executor.run([("search_vault", {"query": "x"})], dispatch)
+    executor.shutdown()
+    assert "cached" not in miss and miss["elapsed_ms"] >= 50
+    assert hit["cached"] and hit["elapsed_ms"] < 50 and hit["result"] == miss["result"]
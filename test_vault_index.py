@@ -0,0 +1,41 @@
+import os
+import sys
+import time
+
+# Add current dir to path
+sys.path.append(os.getcwd())
+
+from vault_index import VaultIndex
+
+def make_index(tmp_path) -> VaultIndex:
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    (vault / "Festa.md").write_text("uma party boa\nArte e art\nsmart art-deco\n", encoding="utf-8")
+    (vault / "Café.md").write_text("Café com leite\n", encoding="utf-8")
+    return VaultIndex(str(vault), index_path=str(tmp_path / "index.sqlite"), refresh_interval=0)
+
+def test_snippets_match_whole_tokens(tmp_path):
+    index = make_index(tmp_path)
+    [hit] = index.search("art")
+    assert hit["snippets"] == [(2, "Arte e art"), (3, "smart art-deco")]
+    assert index.search("cafe com")[0]["snippets"] == [(1, "Café com leite")]
+    index.close()
+
+def test_search_does_not_wait_for_a_rescan(tmp_path):
+    index = make_index(tmp_path)
+    index.refresh()
+    with index._refresh_lock:  # a background rescan in progress
+        start = time.perf_counter()
+        assert index.search("leite")
+        assert time.perf_counter() - start < 1.0
+    index.close()
+
+def test_rescan_picks_up_changes(tmp_path):
+    index = make_index(tmp_path)
+    index.refresh()
+    (tmp_path / "vault" / "Nova.md").write_text("tarefa urgente\n", encoding="utf-8")
+    os.remove(tmp_path / "vault" / "Festa.md")
+    assert index.refresh(force=True) == {"added": 1, "updated": 0, "removed": 1}
+    assert [os.path.basename(r["path"]) for r in index.search("urgente")] == ["Nova.md"]
+    assert index.search("party") == []
+    index.close()
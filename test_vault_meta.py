@@ -0,0 +1,33 @@
+import os
+import sys
+import time
+
+# Add current dir to path
+sys.path.append(os.getcwd())
+
+from vault_meta import VaultMetaIndex
+
+def make_index(tmp_path) -> VaultMetaIndex:
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    (vault / "Projeto Alpha.md").write_text("---\ntags: [projeto]\n---\n# Alpha\nVer [[Beta]].\n", encoding="utf-8")
+    (vault / "Beta.md").write_text("# Beta\n#projeto/sub\n", encoding="utf-8")
+    return VaultMetaIndex(str(vault), index_path=str(tmp_path / "meta.sqlite"), refresh_interval=0, workers=1)
+
+def test_query_does_not_wait_for_a_rescan(tmp_path):
+    index = make_index(tmp_path)
+    index.refresh()
+    with index._refresh_lock:  # a background rescan in progress
+        start = time.perf_counter()
+        result = index.find(tag="projeto")
+        assert time.perf_counter() - start < 1.0
+    assert sorted(os.path.basename(n["path"]) for n in result["notes"]) == ["Beta.md", "Projeto Alpha.md"]
+    index.close()
+
+def test_rescan_picks_up_changes(tmp_path):
+    index = make_index(tmp_path)
+    index.refresh()
+    (tmp_path / "vault" / "Gama.md").write_text("Ligada a [[Beta]]\n", encoding="utf-8")
+    assert index.refresh(force=True) == {"added": 1, "updated": 0, "removed": 0}
+    assert sorted(os.path.basename(n["path"]) for n in index.find(links_to="Beta")["notes"]) == ["Gama.md", "Projeto Alpha.md"]
+    index.close()
@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+import threading
+
+# Add current dir to path
+sys.path.append(os.getcwd())
+
+from vault_semantic import SemanticIndex
+
+class GatedEmbedder:
+    """Bag-of-letters vectors; embedding a note batch waits for `gate`, queries never do."""
+    name = "gated"
+
+    def __init__(self):
+        self.gate = threading.Event()
+
+    def embed(self, texts):
+        if len(texts) > 1 or "\n" in texts[0]: self.gate.wait(5)
+        return [[text.lower().count(c) + 0.01 for c in "abcdefghijklmnopqrstuvwxyz"] for text in texts]
+
+def make_index(tmp_path, embedder) -> SemanticIndex:
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    (vault / "Zebra.md").write_text("zzz zebra zoo\n", encoding="utf-8")
+    (vault / "Abacaxi.md").write_text("abacaxi banana\n", encoding="utf-8")
+    return SemanticIndex(str(vault), index_dir=str(tmp_path / "index"), embedder=embedder, batch_size=1, refresh_interval=0)
+
+def test_search_does_not_wait_for_the_build(tmp_path):
+    embedder = GatedEmbedder()
+    index = make_index(tmp_path, embedder)
+    start = time.perf_counter()
+    assert index.search("zebra") == []
+    assert time.perf_counter() - start < 1.0 and index.indexing
+    embedder.gate.set()
+    index._builder.join(5)
+    assert not index.indexing
+    assert os.path.basename(index.search("zebra zoo", limit=1)[0]["path"]) == "Zebra.md"
+    index.close()
+
+def test_rescan_drops_deleted_notes(tmp_path):
+    embedder = GatedEmbedder()
+    embedder.gate.set()
+    index = make_index(tmp_path, embedder)
+    assert index.refresh(force=True)["added"] == 2
+    os.remove(tmp_path / "vault" / "Zebra.md")
+    assert index.refresh(force=True)["removed"] == 1
+    assert [os.path.basename(r["path"]) for r in index.search("zebra zoo")] == ["Abacaxi.md"]
+    index.close()
@@ -0,0 +1,47 @@
+from typing import Callable, Dict, Any
+
+# Approximate per-message cost of chat-template markers (<|im_start|>role\n ... <|im_end|>\n)
+MESSAGE_OVERHEAD = 4
+MEMO_SIZE = 256
+
+def is_tool_message(msg: Dict[str, Any]) -> bool:
+    content = msg.get("content") or ""
+    return msg.get("role") == "user" and content.startswith(("TOOL RESULT", "Tool Error"))
+
+class TokenLedger:
+    """
+    Token accounting that tokenizes each piece of text once.
+
+    Prompt segments (system prompt, skills) are memoized by content; history
+    messages are counted when appended to a `context_packer.HistoryStore`, which
+    keeps prefix sums so the tokens of any trailing window are available in O(1).
+    """
+
+    def __init__(self, count_fn: Callable[[str], int]):
+        self.count_fn = count_fn
+        self._memo: Dict[int, int] = {}
+        self._segments: Dict[str, Dict[str, int]] = {"system": {}, "skills": {}}
+        self._totals: Dict[str, int] = {"system": 0, "skills": 0}
+
+    def count(self, text: str) -> int:
+        """Token count of `text`, tokenizing only if it was not seen recently."""
+        key = hash(text)
+        if key not in self._memo:
+            if len(self._memo) >= MEMO_SIZE: self._memo.clear()
+            self._memo[key] = self.count_fn(text) if text else 0
+        return self._memo[key]
+
+    # --- PROMPT SEGMENTS ---
+    def set_segment(self, category: str, key: str, text: str) -> int:
+        segments = self._segments.setdefault(category, {})
+        n = self.count(text)
+        self._totals[category] = self._totals.get(category, 0) - segments.get(key, 0) + n
+        segments[key] = n
+        return n
+
+    def drop_segment(self, category: str, key: str):
+        n = self._segments.get(category, {}).pop(key, 0)
+        self._totals[category] = self._totals.get(category, 0) - n
+
+    def segment_total(self, category: str) -> int:
+        return self._totals.get(category, 0)
@@ -0,0 +1,97 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Any, Hashable, Iterable, Optional, Tuple
+
+# --- CONFIGURATION ---
+CAPACITY_BYTES = int(os.getenv("TOOL_CACHE_MB", "64")) << 20   # 0 disables the cache
+VAULT_TTL = float(os.getenv("TOOL_CACHE_TTL", "30"))             # seconds a vault query result is trusted
+VAULT = "$vault"  # dependency of results computed over the whole vault (search, metadata queries)
+
+def file_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+class CachedResult(str):
+    """A result served from the cache; `ToolExecutor` reports it as `cached` with the hit's own timing."""
+    cached = True
+
+class ToolResultCache:
+    """
+    Memoized results of idempotent tool calls, shared by every agent of an engine.
+
+    An entry is keyed by tool and arguments and stays valid while its
+    validator holds: the (mtime, size) of the files it read, plus an optional
+    version (e.g. the skill catalog's generation) and time to live. Writes go
+    through `invalidate()`, which drops the entries depending on the written
+    path and every vault-wide query. Least recently used entries are evicted
+    once the cached text exceeds `capacity_bytes`; errors are never cached.
+    Hits come back as `CachedResult`.
+    """
+
+    def __init__(self, capacity_bytes: int = CAPACITY_BYTES):
+        self.capacity_bytes = capacity_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[Tuple[str, Hashable], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.totals = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0, "invalidations": 0}
+        self.per_tool: Dict[str, Dict[str, int]] = {}
+
+    def call(self, tool: str, args: Hashable, compute: Callable[[], str], paths: Iterable[str] = (),
+             version: Any = None, depends: Iterable[str] = (), ttl: Optional[float] = None) -> str:
+        if self.capacity_bytes <= 0: return compute()
+        key, paths = (tool, args), tuple(paths)
+        validator = (version, tuple(file_signature(p) for p in paths))
+        with self._lock:
+            counts = self.per_tool.setdefault(tool, {"hits": 0, "misses": 0})
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry["validator"] == validator and (entry["expires"] is None or entry["expires"] > time.monotonic()):
+                    self._entries.move_to_end(key)
+                    self.totals["hits"] += 1
+                    counts["hits"] += 1
+                    return CachedResult(entry["value"])
+                self._drop(key)
+                self.totals["stale"] += 1
+            self.totals["misses"] += 1
+            counts["misses"] += 1
+
+        value = compute()
+        if value.startswith(("Error", "Tool Error")): return value
+        size = len(value.encode("utf-8"))
+        if size > self.capacity_bytes: return value
+        with self._lock:
+            if key in self._entries: self._drop(key)
+            self._entries[key] = {"value": value, "size": size, "validator": validator,
+                                  "depends": frozenset(paths) | frozenset(depends),
+                                  "expires": time.monotonic() + ttl if ttl else None}
+            self.bytes += size
+            while self.bytes > self.capacity_bytes:
+                self._drop(next(iter(self._entries)))
+                self.totals["evictions"] += 1
+        return value
+
+    def _drop(self, key: Tuple[str, Hashable]):
+        self.bytes -= self._entries.pop(key)["size"]
+
+    def invalidate(self, path: Optional[str] = None):
+        """
+        Forgets what a write to `path` may have changed: its own entries and
+        every vault-wide query. Without a path (a write somewhere unknown, e.g.
+        a shell command), file entries are left to their (mtime, size) check.
+        """
+        with self._lock:
+            stale = [k for k, e in self._entries.items() if VAULT in e["depends"] or (path is not None and path in e["depends"])]
+            for key in stale: self._drop(key)
+            self.totals["invalidations"] += len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.totals["hits"] + self.totals["misses"]
+            return {**self.totals, "hit_ratio": round(self.totals["hits"] / lookups, 3) if lookups else 0.0,
+                    "entries": len(self._entries), "bytes": self.bytes,
+                    "per_tool": {tool: dict(c) for tool, c in self.per_tool.items()}}
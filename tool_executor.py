@@ -0,0 +1,105 @@
+import re
+import time
+import shlex
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Any, List, Tuple
+
+from obsidian_api import READ_OPERATIONS
+
+# Tools without side effects; safe to run side by side
+READ_ONLY_TOOLS = {"read_file", "search_skills", "list_skills_page", "list_agents", "get_agent_info", "search_vault", "semantic_search", "find_notes", "note_info", "list_tags", "fetch_result"}
+
+# Shell programs considered read-only when used without writing flags or redirection
+READ_ONLY_COMMANDS = {
+    "ls", "cat", "grep", "egrep", "fgrep", "rg", "find", "head", "tail", "wc", "stat", "file",
+    "du", "df", "pwd", "echo", "printenv", "tree", "date", "which", "sort", "uniq", "cut", "tr", "basename", "dirname",
+}
+# Flags that make a whitelisted program write or run something, matched per program on whole
+# arguments: `--output=x` counts as `--output`, `-uo` as `-u -o`
+WRITING_FLAGS = {
+    "find": {"-delete", "-exec", "-execdir", "-ok", "-okdir", "-fls", "-fprint", "-fprint0", "-fprintf"},
+    "sort": {"-o", "--output", "--compress-program"},
+    "tree": {"-o"},
+    "date": {"-s", "--set"},
+}
+
+DEFAULT_TIMEOUT = 30.0
+TOOL_TIMEOUTS = {"execute_shell": 65.0, "read_file": 30.0, "search_vault": 30.0, "semantic_search": 120.0, "find_notes": 30.0, "note_info": 30.0, "list_tags": 30.0, "fetch_result": 30.0}
+
+def _writes(program: str, args: List[str]) -> bool:
+    flags = WRITING_FLAGS.get(program, set())
+    for arg in args:
+        if arg in flags or (arg.startswith("--") and arg.split("=", 1)[0] in flags): return True
+        if re.fullmatch(r"-[A-Za-z]{2,}", arg) and any(f"-{c}" in flags for c in arg[1:]): return True
+    # `uniq INPUT OUTPUT` writes its second operand
+    return program == "uniq" and sum(1 for a in args if not a.startswith("-")) > 1
+
+def is_read_only_command(command: str) -> bool:
+    """Conservative check: every pipeline stage must be a whitelisted reader without writing flags."""
+    if re.search(r"[>`]|\$\(|<\(", command): return False
+    for stage in re.split(r"\|\||&&|[|;&\n]", command):
+        try: words = shlex.split(stage)
+        except ValueError: return False
+        if not words: continue
+        if words[0] not in READ_ONLY_COMMANDS: return False
+        if _writes(words[0], words[1:]): return False
+    return True
+
+def is_read_only_call(name: str, args: Dict[str, Any]) -> bool:
+    if name in READ_ONLY_TOOLS: return True
+    if name == "execute_shell": return is_read_only_command(str(args.get("command", "")))
+    if name == "obsidian_api": return args.get("operation") in READ_OPERATIONS
+    return False
+
+class ToolExecutor:
+    """
+    Runs the tool calls of one model turn.
+
+    Consecutive read-only calls run concurrently on a bounded thread pool, each
+    with its own timeout (a lone read-only call too); any other call is a
+    barrier and runs alone, in order.
+    Workers run in a copy of the caller's context, so they see its session.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+
+    def run(self, calls: List[Tuple[str, Dict[str, Any]]], dispatch: Callable[[str, Dict[str, Any]], str]) -> List[Dict[str, Any]]:
+        results: List[Dict[str, Any]] = [None] * len(calls)
+        batch: List[int] = []
+
+        def flush():
+            if not batch: return
+            futures = {i: (time.perf_counter(), self.pool.submit(contextvars.copy_context().run, self._timed, dispatch, *calls[i])) for i in batch}
+            for i, (submitted, fut) in futures.items():
+                timeout = TOOL_TIMEOUTS.get(calls[i][0], DEFAULT_TIMEOUT)
+                try:
+                    results[i] = fut.result(timeout=max(0.0, timeout - (time.perf_counter() - submitted)))
+                except FutureTimeout:
+                    results[i] = {"result": f"Error: tool '{calls[i][0]}' timed out after {timeout:.0f}s", "elapsed_ms": timeout * 1000, "ok": False}
+                if len(batch) > 1: results[i]["concurrent"] = True
+            batch.clear()
+
+        for i, (name, args) in enumerate(calls):
+            if is_read_only_call(name, args):
+                batch.append(i)
+                continue
+            flush()
+            results[i] = self._timed(dispatch, name, args)
+        flush()
+        return results
+
+    @staticmethod
+    def _timed(dispatch: Callable[[str, Dict[str, Any]], str], name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            result, ok = dispatch(name, args), True
+        except Exception as e:
+            result, ok = f"Tool Error: {str(e)}", False
+        outcome = {"result": result, "elapsed_ms": round((time.perf_counter() - start) * 1000, 1), "ok": ok}
+        if getattr(result, "cached", False): outcome["cached"] = True
+        return outcome
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,160 @@
+import os
+import re
+import json
+import copy
+import threading
+from typing import Dict, Any, List
+
+TOOL_OPEN = "<tool_call>"
+
+# --- GBNF BUILDING BLOCKS ---
+JSON_RULES = r'''
+ws ::= ([ \t\n] ws)?
+string ::= "\"" ( [^"\\\x7F\x00-\x1F] | "\\" ( ["\\/bfnrt] | "u" [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F] ) )* "\""
+integer ::= "-"? [0-9]+
+number ::= "-"? [0-9]+ ("." [0-9]+)? ([eE] [-+]? [0-9]+)?
+boolean ::= "true" | "false"
+value ::= object | array | string | number | boolean | "null"
+object ::= "{" ws ( string ws ":" ws value ( ws "," ws string ws ":" ws value )* )? ws "}"
+array ::= "[" ws ( value ( ws "," ws value )* )? ws "]"
+'''
+
+TYPE_RULES = {"string": "string", "integer": "integer", "number": "number", "boolean": "boolean"}
+
+def _rule_name(*parts: str) -> str:
+    return "-".join(re.sub(r"[^a-zA-Z0-9]", "-", p) for p in parts)
+
+def _literal(text: str) -> str:
+    return json.dumps(text)
+
+def _quoted_literal(text: str) -> str:
+    """GBNF literal that matches the JSON-encoded string `text` (quotes included)."""
+    return json.dumps(json.dumps(text))
+
+def _free_text_rule(tag: str) -> str:
+    """
+    Any text that never contains `tag`: each alternative is a partial prefix of
+    the tag followed by a character that breaks it.
+    """
+    alts = ['[^' + re.escape(tag[0]) + ']']
+    for i in range(1, len(tag)):
+        breaker = "".join(sorted({re.escape(tag[i]), re.escape(tag[0])}))
+        alts.append(f"{_literal(tag[:i])} [^{breaker}]")
+    return "text ::= ( " + " | ".join(alts) + " )*"
+
+def _value_rule(spec: Dict[str, Any]) -> str:
+    if "enum" in spec:
+        return "( " + " | ".join(_quoted_literal(str(v)) for v in spec["enum"]) + " )"
+    return TYPE_RULES.get(spec.get("type"), "value")
+
+def _arguments_rules(tool: Dict[str, Any]) -> List[str]:
+    """Arguments object with required keys in order, then optional keys in order."""
+    name = tool["name"]
+    props = tool["input_schema"].get("properties", {})
+    required = [p for p in tool["input_schema"].get("required", []) if p in props]
+    optional = [p for p in props if p not in required]
+
+    rules = []
+    for p, spec in props.items():
+        rules.append(f"{_rule_name(name, 'kv', p)} ::= {_quoted_literal(p)} ws \":\" ws {_value_rule(spec)}")
+
+    def kv(p): return _rule_name(name, "kv", p)
+    def rest(start): return " ".join(f'( ws "," ws {kv(p)} )?' for p in optional[start:])
+
+    if required:
+        body = ' ws "," ws '.join(kv(p) for p in required) + (" " + rest(0) if optional else "")
+    elif optional:
+        # first present optional key has no leading comma
+        for i, p in enumerate(optional):
+            alt = f"{kv(p)} {rest(i + 1)}".strip()
+            nxt = f" | {_rule_name(name, 'first', str(i + 1))}" if i + 1 < len(optional) else ""
+            rules.append(f"{_rule_name(name, 'first', str(i))} ::= {alt}{nxt}")
+        body = f"( {_rule_name(name, 'first', '0')} )?"
+    else:
+        body = ""
+    rules.append(f"{_rule_name(name, 'args')} ::= \"{{\" ws {body} ws \"}}\"".replace("ws  ws", "ws"))
+    return rules
+
+def build_tool_grammar(tools_schema: List[Dict[str, Any]]) -> str:
+    """
+    GBNF for a whole response: free text, then optionally one or more tool calls
+    whose JSON must match one of `tools_schema`. Unknown tools and malformed JSON
+    cannot be sampled.
+    """
+    if not tools_schema:
+        return "root ::= text\n" + _free_text_rule(TOOL_OPEN) + "\n"
+
+    rules = [
+        'root ::= text ( tool-call ( ws tool-call )* )?',
+        f'tool-call ::= {_literal(TOOL_OPEN)} ws call ws "</tool_call>"',
+        _free_text_rule(TOOL_OPEN),
+        "call ::= " + " | ".join(_rule_name(t["name"], "call") for t in tools_schema),
+    ]
+    for tool in tools_schema:
+        rules.append(
+            f'{_rule_name(tool["name"], "call")} ::= "{{" ws "\\"name\\"" ws ":" ws {_quoted_literal(tool["name"])} '
+            f'ws "," ws "\\"arguments\\"" ws ":" ws {_rule_name(tool["name"], "args")} ws "}}"'
+        )
+        rules.extend(_arguments_rules(tool))
+    return "\n".join(rules) + "\n" + JSON_RULES
+
+# --- STATS ---
+class ToolCallStats:
+    """
+    Counts tool calls and the retry steps caused by invalid ones.
+
+    Invalid-call rates observed without the grammar are kept on disk as a
+    baseline, so grammar-constrained runs can report the retries they avoided.
+    Calls from concurrent tools are counted under a lock; the file is
+    rewritten every `flush_every` calls and on `close()`.
+    """
+
+    def __init__(self, path: str = os.path.join(".cache", "tool_call_stats.json"), flush_every: int = 20):
+        self.path = path
+        self.flush_every = flush_every
+        self.data = {"unconstrained": {"calls": 0, "invalid": 0}, "constrained": {"calls": 0, "invalid": 0}}
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f: self.data.update(json.load(f))
+        except (OSError, ValueError): pass
+
+    def record(self, constrained: bool, valid: bool):
+        with self._lock:
+            bucket = self.data["constrained" if constrained else "unconstrained"]
+            bucket["calls"] += 1
+            if not valid: bucket["invalid"] += 1
+            self._unsaved += 1
+            if self._unsaved >= self.flush_every: self._save()
+
+    def flush(self):
+        with self._lock:
+            if self._unsaved: self._save()
+
+    close = flush
+
+    def _save(self):
+        # Called with the lock held; written aside and renamed so a crash never leaves half a file
+        try:
+            if os.path.dirname(self.path): os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f: json.dump(self.data, f)
+            os.replace(tmp, self.path)
+            self._unsaved = 0
+        except OSError: pass
+
+    @property
+    def retries_saved(self) -> float:
+        with self._lock: return self._retries_saved()
+
+    def _retries_saved(self) -> float:
+        base = self.data["unconstrained"]
+        if not base["calls"]: return 0.0
+        rate = base["invalid"] / base["calls"]
+        con = self.data["constrained"]
+        return max(0.0, con["calls"] * rate - con["invalid"])
+
+    def summary(self) -> Dict[str, Any]:
+        """A snapshot (deep copy) of the counts, safe to hand to the async tracer."""
+        with self._lock:
+            return {**copy.deepcopy(self.data), "retries_saved": round(self._retries_saved(), 1)}
@@ -0,0 +1,203 @@
+import io
+import os
+import sys
+import gzip
+import json
+import glob
+import queue
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterator
+
+try:
+    import zstandard
+except ImportError:  # optional: only needed for TRACE_COMPRESSION=zstd
+    zstandard = None
+
+SEGMENT_EVENT = "$segment"
+REF_KEY = "$ref"
+EXTENSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+def _hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=12).hexdigest()
+
+def _is_message_list(value: Any) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(m, dict) and "content" in m and "role" in m for m in value)
+
+def _open_write(path: str, compression: str):
+    if compression == "gzip": return gzip.open(path, "at", encoding="utf-8")
+    if compression == "zstd":
+        return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(open(path, "wb")), encoding="utf-8")
+    return open(path, "a", encoding="utf-8")
+
+def _open_read(path: str):
+    if path.endswith(".gz"): return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".zst"):
+        if zstandard is None: raise RuntimeError(f"zstandard is required to read {path}")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, "rb")), encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+class TraceWriter:
+    """
+    Background trace writer for the agent loop.
+
+    `log` only enqueues; a writer thread encodes and writes events in batches.
+    Message contents (system prompt, skills, history) are written once as
+    `$segment` records and referenced by hash afterwards, so a step's `input`
+    costs the size of its new messages instead of the whole prompt.
+
+    Events go to `events.NNN.jsonl[.gz|.zst]`, rotated after `rotate_bytes`.
+    Only the `max_segments` most recently used hashes are remembered; an
+    older segment seen again is simply written again.
+    """
+
+    def __init__(self, trace_dir: str, compression: Optional[str] = None, rotate_bytes: Optional[int] = None,
+                 queue_size: int = 4096, batch_size: int = 256, flush_interval: float = 0.5, max_segments: int = 65536):
+        self.trace_dir = trace_dir
+        compression = (compression or os.getenv("TRACE_COMPRESSION", "none")).lower()
+        if compression not in EXTENSIONS: raise ValueError(f"Invalid trace compression '{compression}'. Use one of: {', '.join(EXTENSIONS)}.")
+        if compression == "zstd" and zstandard is None:
+            print("⚠️  zstandard not installed; compressing traces with gzip.")
+            compression = "gzip"
+        self.compression = compression
+        self.rotate_bytes = rotate_bytes if rotate_bytes is not None else int(os.getenv("TRACE_ROTATE_MB", "64")) << 20
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_segments = max_segments
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._segments: "OrderedDict[str, None]" = OrderedDict()
+        self._file = None
+        self._file_index = 0
+        self._file_bytes = 0
+        self.stats = {"events": 0, "segments": 0, "bytes_written": 0, "bytes_deduplicated": 0, "files": 0}
+
+        os.makedirs(trace_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # --- PRODUCER SIDE ---
+    def log(self, step_id: str, event_type: str, payload: Any):
+        """Enqueues an event; blocks only if the writer is `queue_size` events behind."""
+        if self._thread is None: return
+        self._queue.put((datetime.now().isoformat(), str(step_id), event_type, payload))
+
+    def flush(self):
+        """Waits until every event logged so far is on disk."""
+        if self._thread is not None: self._queue.join()
+
+    def close(self):
+        if self._thread is None: return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        atexit.unregister(self.close)
+
+    # --- WRITER THREAD ---
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while batch[-1] is not None and len(batch) < self.batch_size:
+                    batch.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                pass
+            stop = batch[-1] is None
+            lines = []
+            for item in batch:
+                if item is None: continue
+                try: lines.extend(self._encode(*item))
+                except Exception as e: lines.append(json.dumps({"event": "trace_error", "data": str(e)}))
+            try:
+                if lines: self._write(lines)
+            finally:
+                for _ in batch: self._queue.task_done()
+            if stop: break
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _encode(self, ts: str, step_id: str, event_type: str, payload: Any) -> List[str]:
+        lines = []
+        def encode_messages(messages):
+            encoded = []
+            for m in messages:
+                text = m["content"] if isinstance(m["content"], str) else json.dumps(m["content"], ensure_ascii=False)
+                h = _hash(text)
+                if h not in self._segments:
+                    self._segments[h] = None
+                    if len(self._segments) > self.max_segments: self._segments.popitem(last=False)
+                    self.stats["segments"] += 1
+                    lines.append(json.dumps({"event": SEGMENT_EVENT, "hash": h, "text": text}, ensure_ascii=False))
+                else:
+                    self._segments.move_to_end(h)
+                    self.stats["bytes_deduplicated"] += len(text)
+                encoded.append({**{k: v for k, v in m.items() if k != "content"}, REF_KEY: h})
+            return encoded
+
+        if _is_message_list(payload):
+            payload = encode_messages(payload)
+        elif isinstance(payload, dict):
+            payload = {k: encode_messages(v) if _is_message_list(v) else v for k, v in payload.items()}
+        self.stats["events"] += 1
+        lines.append(json.dumps({"ts": ts, "step": step_id, "event": event_type, "data": payload}, ensure_ascii=False, default=str))
+        return lines
+
+    def _write(self, lines: List[str]):
+        if self._file is None or self._file_bytes >= self.rotate_bytes:
+            if self._file: self._file.close()
+            path = os.path.join(self.trace_dir, f"events.{self._file_index:03d}.jsonl{EXTENSIONS[self.compression]}")
+            self._file = _open_write(path, self.compression)
+            self._file_index += 1
+            self._file_bytes = 0
+            self.stats["files"] += 1
+        data = "\n".join(lines) + "\n"
+        self._file.write(data)
+        self._file.flush()
+        self._file_bytes += len(data)
+        self.stats["bytes_written"] += len(data)
+
+# --- READER ---
+def read_events(trace_dir: str, decode: bool = True) -> Iterator[Dict[str, Any]]:
+    """Yields events in order; with `decode`, message references are expanded back to full content."""
+    segments: Dict[str, str] = {}
+    def decode_messages(value):
+        if isinstance(value, list) and value and all(isinstance(m, dict) and REF_KEY in m for m in value):
+            return [{**{k: v for k, v in m.items() if k != REF_KEY}, "content": segments.get(m[REF_KEY], f"<missing segment {m[REF_KEY]}>")} for m in value]
+        return value
+
+    for path in sorted(glob.glob(os.path.join(trace_dir, "events.*.jsonl*"))):
+        with _open_read(path) as f:
+            for line in f:
+                if not line.strip(): continue
+                entry = json.loads(line)
+                if entry.get("event") == SEGMENT_EVENT:
+                    segments[entry["hash"]] = entry["text"]
+                    continue
+                if decode:
+                    data = entry.get("data")
+                    if isinstance(data, dict): data = {k: decode_messages(v) for k, v in data.items()}
+                    entry["data"] = decode_messages(data)
+                yield entry
+
+def step_inputs(trace_dir: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Full message list sent to the model at each step, rebuilt from the delta form."""
+    inputs = {}
+    for entry in read_events(trace_dir):
+        data = entry["data"]
+        if entry["event"] == "input" and isinstance(data, list): inputs[entry["step"]] = data
+        elif entry["event"] == "context" and isinstance(data, dict) and "messages" in data: inputs[entry["step"]] = data["messages"]
+    return inputs
+
+if __name__ == "__main__":
+    # Usage: python tracing.py <trace_dir> [step_id]
+    if len(sys.argv) < 2: sys.exit("Usage: python tracing.py <trace_dir> [step_id]")
+    if len(sys.argv) > 2:
+        print(json.dumps(step_inputs(sys.argv[1]).get(sys.argv[2]), indent=2, ensure_ascii=False))
+    else:
+        for entry in read_events(sys.argv[1], decode=False):
+            print(f"{entry['ts']}  {entry['step']:<32} {entry['event']}")
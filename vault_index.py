@@ -0,0 +1,244 @@
+import os
+import re
+import math
+import bisect
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+
+# --- CONFIGURATION ---
+DEFAULT_INDEX_PATH = os.path.join(".cache", "vault_index.sqlite")
+INDEXED_EXTENSIONS = (".md",)
+SKIP_DIRS = {".obsidian", ".trash", ".git"}
+REFRESH_BATCH = 200  # changed files written per transaction during a rescan
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# --- UTILS ---
+class _StripCombining(dict):
+    """`str.translate` table that drops combining marks, filled in as characters are first seen."""
+    def __missing__(self, code: int) -> Optional[int]:
+        self[code] = None if unicodedata.combining(chr(code)) else code
+        return self[code]
+
+_STRIP_COMBINING = _StripCombining()
+
+def fold(text: str) -> str:
+    """Lowercase and strip accents so 'Ação' matches 'acao'."""
+    if text.isascii(): return text.lower()
+    return unicodedata.normalize("NFKD", text.lower()).translate(_STRIP_COMBINING)
+
+def tokenize(text: str) -> List[str]:
+    """Split text into folded word tokens, ignoring 1-char tokens."""
+    return [t for t in TOKEN_RE.findall(fold(text)) if len(t) > 1]
+
+# --- INDEX ---
+class VaultIndex:
+    """
+    Persistent inverted index over the notes of an Obsidian vault.
+
+    Postings live in SQLite so the index survives restarts; `refresh()` only
+    re-tokenizes files whose (mtime, size) changed since the last run. The
+    first search syncs the index; after that a background thread rescans the
+    vault every `refresh_interval` seconds (0 disables it), so queries never
+    walk the vault themselves.
+    """
+
+    def __init__(self, vault_path: str, index_path: str = DEFAULT_INDEX_PATH, refresh_interval: float = 5.0):
+        self.vault_path = os.path.abspath(os.path.expanduser(vault_path))
+        self.index_path = index_path
+        self.refresh_interval = refresh_interval
+        self._refreshed = False
+        self._lock = threading.Lock()           # guards the connection
+        self._refresh_lock = threading.Lock()   # one scan at a time
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+        if os.path.dirname(index_path):
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        self.db = sqlite3.connect(index_path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                length INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                file_id INTEGER NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, file_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_file ON postings(file_id);
+        """)
+        self.db.commit()
+
+    # --- MAINTENANCE ---
+    def _scan(self) -> Dict[str, Tuple[float, int]]:
+        """Walk the vault and return {relative_path: (mtime, size)}."""
+        found = {}
+        for root, dirs, files in os.walk(self.vault_path):
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith(".")]
+            for name in files:
+                if not name.endswith(INDEXED_EXTENSIONS): continue
+                full = os.path.join(root, name)
+                try: st = os.stat(full)
+                except OSError: continue
+                found[os.path.relpath(full, self.vault_path)] = (st.st_mtime, st.st_size)
+        return found
+
+    def refresh(self, force: bool = False) -> Dict[str, int]:
+        """
+        Incrementally sync the index with the vault. Returns change counts.
+        Without `force`, only the first call syncs; later changes are picked
+        up by the background thread.
+        """
+        idle = {"added": 0, "updated": 0, "removed": 0}
+        # Checked without the refresh lock, so searches never wait behind a background rescan
+        if self._refreshed and not force: return idle
+        with self._refresh_lock:
+            if self._refreshed and not force: return idle
+            # The walk and tokenizing run outside the connection lock, so searches go on meanwhile
+            on_disk = self._scan()
+            with self._lock:
+                indexed = {p: (fid, m, s) for fid, p, m, s in self.db.execute("SELECT id, path, mtime, size FROM files")}
+            stats = dict(idle)
+            removed = [fid for path, (fid, _, _) in indexed.items() if path not in on_disk]
+            changed = [(path, mtime, size) for path, (mtime, size) in on_disk.items()
+                       if not (path in indexed and indexed[path][1] == mtime and indexed[path][2] == size)]
+            stats["removed"] = len(removed)
+            stats["updated"] = sum(path in indexed for path, _, _ in changed)
+            stats["added"] = len(changed) - stats["updated"]
+
+            with self._lock, self.db:
+                for fid in removed: self._remove(fid)
+            # Changed files are committed in small batches that searches can interleave with
+            for i in range(0, len(changed), REFRESH_BATCH):
+                batch = [(path, mtime, size, self._tokens(path)) for path, mtime, size in changed[i:i + REFRESH_BATCH]]
+                with self._lock, self.db:
+                    for path, mtime, size, tokens in batch:
+                        if path in indexed: self._remove(indexed[path][0])
+                        if tokens is not None: self._add(path, mtime, size, tokens)
+            self._refreshed = True
+            self._watch()
+        return stats
+
+    def _watch(self):
+        """Starts the background rescan loop once the index has been synced."""
+        if self.refresh_interval <= 0 or self._watcher is not None or self._stop.is_set(): return
+        self._watcher = threading.Thread(target=self._watch_loop, name="vault-index-refresh", daemon=True)
+        self._watcher.start()
+
+    def _watch_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            try: self.refresh(force=True)
+            except Exception as e: print(f"⚠️  Vault index refresh failed: {e}")
+
+    def close(self):
+        self._stop.set()
+        if self._watcher is not None and self._watcher is not threading.current_thread(): self._watcher.join()
+        with self._lock: self.db.close()
+
+    def _remove(self, file_id: int):
+        self.db.execute("DELETE FROM postings WHERE file_id = ?", (file_id,))
+        self.db.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def _tokens(self, path: str) -> Optional[List[str]]:
+        try:
+            with open(os.path.join(self.vault_path, path), "r", encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        except OSError: return None
+        # File name counts as content so "projeto alpha" finds "Projeto Alpha.md"
+        return tokenize(path) + tokenize(text)
+
+    def _add(self, path: str, mtime: float, size: int, tokens: List[str]):
+        cur = self.db.execute("INSERT INTO files (path, mtime, size, length) VALUES (?, ?, ?, ?)", (path, mtime, size, len(tokens)))
+        file_id = cur.lastrowid
+        self.db.executemany(
+            "INSERT INTO postings (term, file_id, tf) VALUES (?, ?, ?)",
+            [(term, file_id, tf) for term, tf in Counter(tokens).items()]
+        )
+
+    # --- QUERY ---
+    def search(self, query: str, limit: int = 10, snippets_per_file: int = 3, snippet_chars: int = 160) -> List[Dict[str, Any]]:
+        """Rank notes by BM25 and return the top `limit` with line-numbered snippets."""
+        self.refresh()
+        words = tokenize(query)
+        terms = list(dict.fromkeys(words))
+        if not terms: return []
+
+        with self._lock:
+            n_docs, total_len = self.db.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM files").fetchone()
+            if n_docs == 0: return []
+            avg_len = total_len / n_docs
+
+            marks = ",".join("?" * len(terms))
+            df = dict(self.db.execute(f"SELECT term, COUNT(*) FROM postings WHERE term IN ({marks}) GROUP BY term", terms))
+            idf = [(t, math.log(1 + (n_docs - df[t] + 0.5) / (df[t] + 0.5))) for t in terms if t in df]
+            if not idf: return []
+            # Scored inside SQLite: one pass over the postings of the query terms
+            top = self.db.execute(f"""
+                WITH q(term, idf) AS (VALUES {",".join(["(?, ?)"] * len(idf))})
+                SELECT f.id, f.path, SUM(q.idf * p.tf * ? / (p.tf + ? * (1 - ? + ? * f.length / ?))) AS score
+                FROM q JOIN postings p ON p.term = q.term JOIN files f ON f.id = p.file_id
+                GROUP BY f.id ORDER BY score DESC LIMIT ?
+            """, [v for pair in idf for v in pair] + [BM25_K1 + 1, BM25_K1, BM25_B, BM25_B, avg_len, limit]).fetchall()
+
+        results = []
+        for _, path, score in top:
+            full = os.path.join(self.vault_path, path)
+            results.append({
+                "path": full,
+                "score": round(score, 3),
+                "snippets": self._snippets(full, terms, words, snippets_per_file, snippet_chars)
+            })
+        return results
+
+    def _snippets(self, path: str, terms: List[str], phrase: List[str], max_snippets: int, max_chars: int) -> List[Tuple[int, str]]:
+        """Pick the lines with the most query terms (exact phrase first), matching whole tokens only."""
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f: text = f.read()
+        except OSError: return []
+        lines, folded = text.split("\n"), fold(text)
+        if folded.count("\n") != len(lines) - 1: folded = "\n".join(fold(line) for line in lines)
+        starts = [0] + [m.end() for m in re.finditer("\n", folded)]
+
+        # Token boundaries as in TOKEN_RE, so "art" does not match inside "party"
+        found: Dict[int, set] = {}
+        for m in re.finditer(rf"(?<!\w)(?:{'|'.join(map(re.escape, terms))})(?!\w)", folded):
+            found.setdefault(bisect.bisect_right(starts, m.start()) - 1, set()).add(m.group())
+        in_phrase = set()
+        if len(phrase) > 1:
+            words = r"[^\w\n]+".join(map(re.escape, phrase))
+            for m in re.finditer(rf"(?<!\w){words}(?!\w)", folded):
+                in_phrase.add(bisect.bisect_right(starts, m.start()) - 1)
+
+        candidates = [(len(hit) + (len(terms) if i in in_phrase else 0), i + 1, lines[i].strip()) for i, hit in found.items()]
+        best = sorted(candidates, key=lambda c: (-c[0], c[1]))[:max_snippets]
+        return [(line_no, text[:max_chars] + ("..." if len(text) > max_chars else "")) for _, line_no, text in sorted(best, key=lambda c: c[1])]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            n_docs, n_postings = self.db.execute("SELECT (SELECT COUNT(*) FROM files), (SELECT COUNT(*) FROM postings)").fetchone()
+        return {"notes": n_docs, "postings": n_postings}
+
+def format_results(query: str, results: List[Dict[str, Any]], elapsed_ms: float) -> str:
+    """Render search results as compact tool output."""
+    if not results:
+        return f"Nenhuma nota encontrada para '{query}'."
+    lines = [f"{len(results)} nota(s) para '{query}' ({elapsed_ms:.0f} ms):"]
+    for i, r in enumerate(results, 1):
+        lines.append(f"{i}. {r['path']} (score {r['score']})")
+        for line_no, text in r["snippets"]:
+            lines.append(f"   L{line_no}: {text}")
+    return "\n".join(lines)
@@ -0,0 +1,353 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+import frontmatter
+
+from vault_index import INDEXED_EXTENSIONS, SKIP_DIRS
+
+# --- CONFIGURATION ---
+DEFAULT_META_PATH = os.path.join(".cache", "vault_meta.sqlite")
+PARALLEL_MIN_FILES = 256   # below this, parsing in-process beats starting a pool
+PARSE_CHUNKSIZE = 64
+# Parse workers never fork the threaded engine process itself (fork would copy its locks mid-use)
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+WRITE_BATCH = 500          # parsed notes written per transaction, so queries interleave with a rescan
+
+FENCE_RE = re.compile(r"^(```|~~~).*?^\1", re.MULTILINE | re.DOTALL)
+INLINE_CODE_RE = re.compile(r"`[^`\n]*`")
+WIKILINK_RE = re.compile(r"!?\[\[([^\]\|#\^]*)(?:[#\^][^\]\|]*)?(?:\|[^\]]*)?\]\]")
+MDLINK_RE = re.compile(r"\[[^\]]*\]\(([^)\s]+?\.md)(?:#[^)]*)?\)")
+TAG_RE = re.compile(r"(?<![\w/#&])#([\w\-/]*[^\W\d][\w\-/]*)")
+HEADING_RE = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$", re.MULTILINE)
+
+# --- PARSING (runs in worker processes) ---
+def note_key(name: str) -> str:
+    """Link target key: file name without folder or extension, case-folded."""
+    name = name.strip().replace("%20", " ").rsplit("/", 1)[-1]
+    if name.lower().endswith(".md"): name = name[:-3]
+    return name.casefold()
+
+def _as_list(value: Any) -> List[str]:
+    if not value: return []
+    if isinstance(value, str): return [v.strip() for v in re.split(r"[,\s]+", value) if v.strip()]
+    if isinstance(value, (list, tuple, set)): return [str(v).strip() for v in value if v]
+    return [str(value)]
+
+def parse_note(args: Tuple[str, str]) -> Dict[str, Any]:
+    """Frontmatter, tags, links and headings of one note (must stay picklable)."""
+    vault_path, rel = args
+    try:
+        with open(os.path.join(vault_path, rel), "r", encoding="utf-8", errors="replace") as f: raw = f.read()
+    except OSError as e:
+        return {"path": rel, "error": str(e)}
+    try:
+        post = frontmatter.loads(raw)
+        meta, body = dict(post.metadata), post.content
+    except Exception:
+        meta, body = {}, raw
+
+    # code blocks contain neither tags nor links; blank them out so line numbers still match the file
+    text = FENCE_RE.sub(lambda m: "\n" * m.group(0).count("\n"), body)
+    text = INLINE_CODE_RE.sub("", text)
+    first_line = raw[:raw.find(body)].count("\n") if body else 0
+    tags = {t.lstrip("#").lower() for t in _as_list(meta.get("tags") or meta.get("tag"))}
+    tags.update(t.lower() for t in TAG_RE.findall(text))
+    links = []
+    for line_no, line in enumerate(text.splitlines(), first_line + 1):
+        if "[[" in line:
+            links.extend((m.group(1).strip(), line_no) for m in WIKILINK_RE.finditer(line) if m.group(1).strip())
+        if "](" in line:
+            links.extend((m.group(1), line_no) for m in MDLINK_RE.finditer(line))
+    headings = []
+    for m in HEADING_RE.finditer(text):
+        headings.append((len(m.group(1)), m.group(2), first_line + text.count("\n", 0, m.start()) + 1))
+    title = next((h[1] for h in headings if h[0] == 1), None) or os.path.splitext(os.path.basename(rel))[0]
+    return {
+        "path": rel,
+        "title": title,
+        "frontmatter": json.dumps(meta, ensure_ascii=False, default=str),
+        "aliases": _as_list(meta.get("aliases") or meta.get("alias")),
+        "tags": sorted(tags),
+        "links": links,
+        "headings": headings,
+        "properties": [(str(k), json.dumps(v, ensure_ascii=False, default=str) if not isinstance(v, str) else v) for k, v in meta.items()],
+    }
+
+# --- INDEX ---
+class VaultMetaIndex:
+    """
+    Structured metadata of every note (frontmatter, tags, wikilinks, headings)
+    in SQLite, so "who links to X", "notes tagged #projeto" or "modified this
+    week" are one query instead of rounds of grep/find/read_file.
+
+    `refresh()` re-parses only notes whose (mtime, size) changed; large batches
+    (the first build) are parsed across a process pool. As in `VaultIndex`,
+    the first query syncs and a background thread rescans every
+    `refresh_interval` seconds (0 disables it), so queries never wait on a scan.
+    """
+
+    def __init__(self, vault_path: str, index_path: str = DEFAULT_META_PATH, refresh_interval: float = 5.0, workers: Optional[int] = None):
+        self.vault_path = os.path.abspath(os.path.expanduser(vault_path))
+        self.index_path = index_path
+        self.refresh_interval = refresh_interval
+        self.workers = workers or os.cpu_count() or 1
+        self._refreshed = False
+        self._lock = threading.Lock()           # guards the connection
+        self._refresh_lock = threading.Lock()   # one scan at a time
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+        if os.path.dirname(index_path):
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        self.db = sqlite3.connect(index_path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS notes (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                key TEXT NOT NULL,
+                title TEXT NOT NULL,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                frontmatter TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS notes_key ON notes(key);
+            CREATE INDEX IF NOT EXISTS notes_mtime ON notes(mtime);
+            CREATE TABLE IF NOT EXISTS aliases (note_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE, key TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS aliases_key ON aliases(key);
+            CREATE TABLE IF NOT EXISTS tags (note_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE, tag TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS tags_tag ON tags(tag);
+            CREATE INDEX IF NOT EXISTS tags_note ON tags(note_id);
+            CREATE TABLE IF NOT EXISTS links (src_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE, target TEXT NOT NULL, key TEXT NOT NULL, line INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS links_key ON links(key);
+            CREATE INDEX IF NOT EXISTS links_src ON links(src_id);
+            CREATE TABLE IF NOT EXISTS headings (note_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE, level INTEGER NOT NULL, title TEXT NOT NULL, line INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS headings_note ON headings(note_id);
+            CREATE TABLE IF NOT EXISTS properties (note_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE, key TEXT NOT NULL, value TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS properties_kv ON properties(key, value);
+        """)
+        self.db.commit()
+
+    # --- MAINTENANCE ---
+    def _scan(self) -> Dict[str, Tuple[float, int]]:
+        found = {}
+        for root, dirs, files in os.walk(self.vault_path):
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith(".")]
+            for name in files:
+                if not name.endswith(INDEXED_EXTENSIONS): continue
+                full = os.path.join(root, name)
+                try: st = os.stat(full)
+                except OSError: continue
+                found[os.path.relpath(full, self.vault_path)] = (st.st_mtime, st.st_size)
+        return found
+
+    def refresh(self, force: bool = False) -> Dict[str, int]:
+        """
+        Incrementally sync with the vault. Returns change counts. Without
+        `force`, only the first call syncs; later changes are picked up by
+        the background thread.
+        """
+        idle = {"added": 0, "updated": 0, "removed": 0}
+        if self._refreshed and not force: return idle
+        with self._refresh_lock:
+            if self._refreshed and not force: return idle
+            # Walking and parsing happen outside the connection lock; queries see the previous state meanwhile
+            on_disk = self._scan()
+            with self._lock:
+                indexed = {p: (nid, m, s) for nid, p, m, s in self.db.execute("SELECT id, path, mtime, size FROM notes")}
+            removed = [nid for p, (nid, _, _) in indexed.items() if p not in on_disk]
+            changed = [p for p, (m, s) in on_disk.items() if not (p in indexed and indexed[p][1] == m and indexed[p][2] == s)]
+            stats = {"added": sum(p not in indexed for p in changed), "updated": sum(p in indexed for p in changed), "removed": len(removed)}
+
+            jobs = [(self.vault_path, p) for p in changed]
+            if len(jobs) >= PARALLEL_MIN_FILES and self.workers > 1:
+                with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(START_METHOD)) as pool:
+                    parsed = list(pool.map(parse_note, jobs, chunksize=PARSE_CHUNKSIZE))
+            else:
+                parsed = [parse_note(job) for job in jobs]
+
+            with self._lock, self.db:
+                for nid in removed: self.db.execute("DELETE FROM notes WHERE id = ?", (nid,))
+            for i in range(0, len(parsed), WRITE_BATCH):
+                with self._lock, self.db:
+                    for note in parsed[i:i + WRITE_BATCH]:
+                        if "error" in note: continue
+                        old = indexed.get(note["path"])
+                        if old: self.db.execute("DELETE FROM notes WHERE id = ?", (old[0],))
+                        self._add(note, *on_disk[note["path"]])
+            self._refreshed = True
+            self._watch()
+        return stats
+
+    def _watch(self):
+        """Starts the background rescan loop once the index has been synced."""
+        if self.refresh_interval <= 0 or self._watcher is not None or self._stop.is_set(): return
+        self._watcher = threading.Thread(target=self._watch_loop, name="vault-meta-refresh", daemon=True)
+        self._watcher.start()
+
+    def _watch_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            try: self.refresh(force=True)
+            except Exception as e: print(f"⚠️  Vault metadata refresh failed: {e}")
+
+    def close(self):
+        self._stop.set()
+        if self._watcher is not None and self._watcher is not threading.current_thread(): self._watcher.join()
+        with self._lock: self.db.close()
+
+    def _add(self, note: Dict[str, Any], mtime: float, size: int):
+        cur = self.db.execute(
+            "INSERT INTO notes (path, key, title, mtime, size, frontmatter) VALUES (?, ?, ?, ?, ?, ?)",
+            (note["path"], note_key(note["path"]), note["title"], mtime, size, note["frontmatter"])
+        )
+        nid = cur.lastrowid
+        self.db.executemany("INSERT INTO aliases VALUES (?, ?)", [(nid, a.casefold()) for a in note["aliases"]])
+        self.db.executemany("INSERT INTO tags VALUES (?, ?)", [(nid, t) for t in note["tags"]])
+        self.db.executemany("INSERT INTO links VALUES (?, ?, ?, ?)", [(nid, t, note_key(t), line) for t, line in note["links"]])
+        self.db.executemany("INSERT INTO headings VALUES (?, ?, ?, ?)", [(nid, lvl, title, line) for lvl, title, line in note["headings"]])
+        self.db.executemany("INSERT INTO properties VALUES (?, ?, ?)", [(nid, k.casefold(), v.casefold()) for k, v in note["properties"]])
+
+    # --- QUERY ---
+    def _resolve(self, name: str) -> List[int]:
+        """Note ids a link/name points to (file name first, then aliases)."""
+        key = note_key(name)
+        ids = [r[0] for r in self.db.execute("SELECT id FROM notes WHERE key = ?", (key,))]
+        if "/" in name and len(ids) > 1:
+            rel = name if name.lower().endswith(".md") else name + ".md"
+            ids = [r[0] for r in self.db.execute("SELECT id FROM notes WHERE path = ?", (rel,))] or ids
+        return ids or [r[0] for r in self.db.execute("SELECT note_id FROM aliases WHERE key = ?", (name.casefold(),))]
+
+    def find(self, tag: Optional[str] = None, links_to: Optional[str] = None, linked_from: Optional[str] = None,
+             modified_within_days: Optional[float] = None, modified_after: Optional[str] = None,
+             prop: Optional[str] = None, folder: Optional[str] = None, title: Optional[str] = None,
+             limit: int = 20) -> Dict[str, Any]:
+        """Notes matching every given filter, newest first."""
+        self.refresh()
+        where, params = [], []
+        if tag:
+            tag = tag.lstrip("#").lower()
+            where.append("n.id IN (SELECT note_id FROM tags WHERE tag = ? OR tag LIKE ? ESCAPE '\\')")
+            params += [tag, tag.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "/%"]
+        with self._lock:
+            if links_to:
+                keys = {note_key(links_to)}
+                keys.update(r[0] for r in self.db.execute(
+                    "SELECT key FROM aliases WHERE note_id IN (SELECT id FROM notes WHERE key = ?)", (note_key(links_to),)))
+                where.append(f"n.id IN (SELECT src_id FROM links WHERE key IN ({','.join('?' * len(keys))}))")
+                params += sorted(keys)
+            if linked_from:
+                src = self._resolve(linked_from)
+                targets = [r[0] for r in self.db.execute(
+                    f"SELECT DISTINCT key FROM links WHERE src_id IN ({','.join('?' * len(src))})", src)] if src else []
+                where.append(f"(n.key IN ({','.join('?' * len(targets)) or 'NULL'}) OR n.id IN (SELECT note_id FROM aliases WHERE key IN ({','.join('?' * len(targets)) or 'NULL'})))")
+                params += targets + targets
+            if modified_within_days is not None:
+                where.append("n.mtime >= ?")
+                params.append(time.time() - float(modified_within_days) * 86400)
+            if modified_after:
+                where.append("n.mtime >= ?")
+                params.append(datetime.fromisoformat(modified_after).timestamp())
+            if prop:
+                key, _, value = prop.partition("=")
+                if value:
+                    where.append("n.id IN (SELECT note_id FROM properties WHERE key = ? AND (value = ? OR value LIKE ?))")
+                    params += [key.strip().casefold(), value.strip().casefold(), f'%"{value.strip().casefold()}"%']
+                else:
+                    where.append("n.id IN (SELECT note_id FROM properties WHERE key = ?)")
+                    params.append(key.strip().casefold())
+            if folder:
+                where.append("n.path LIKE ?")
+                params.append(folder.strip("/") + "/%")
+            if title:
+                where.append("(n.title LIKE ? OR n.path LIKE ?)")
+                params += [f"%{title}%", f"%{title}%"]
+
+            sql = "SELECT n.id, n.path, n.title, n.mtime FROM notes n" + (" WHERE " + " AND ".join(where) if where else "")
+            total = self.db.execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
+            rows = self.db.execute(sql + " ORDER BY n.mtime DESC LIMIT ?", params + [int(limit)]).fetchall()
+            notes = []
+            for nid, path, note_title, mtime in rows:
+                tags = [r[0] for r in self.db.execute("SELECT tag FROM tags WHERE note_id = ? ORDER BY tag", (nid,))]
+                notes.append({"path": os.path.join(self.vault_path, path), "title": note_title, "mtime": mtime, "tags": tags})
+        return {"total": total, "notes": notes}
+
+    def note_info(self, name: str) -> Optional[Dict[str, Any]]:
+        """Frontmatter, tags, headings, outgoing links (resolved) and backlinks of one note."""
+        self.refresh()
+        with self._lock:
+            rel = os.path.relpath(name, self.vault_path) if os.path.isabs(name) else name
+            row = self.db.execute("SELECT id, path, title, mtime, frontmatter FROM notes WHERE path = ?", (rel,)).fetchone()
+            if row is None:
+                ids = self._resolve(name)
+                if not ids: return None
+                row = self.db.execute("SELECT id, path, title, mtime, frontmatter FROM notes WHERE id = ?", (ids[0],)).fetchone()
+            nid, path, title, mtime, fm = row
+            keys = [note_key(path)] + [r[0] for r in self.db.execute("SELECT key FROM aliases WHERE note_id = ?", (nid,))]
+            outgoing = []
+            for target, key, line in self.db.execute("SELECT target, key, line FROM links WHERE src_id = ? ORDER BY line", (nid,)):
+                hit = self.db.execute("SELECT path FROM notes WHERE key = ? LIMIT 1", (key,)).fetchone()
+                outgoing.append({"target": target, "line": line, "path": os.path.join(self.vault_path, hit[0]) if hit else None})
+            backlinks = [
+                {"path": os.path.join(self.vault_path, p), "line": line}
+                for p, line in self.db.execute(
+                    f"SELECT n.path, l.line FROM links l JOIN notes n ON n.id = l.src_id WHERE l.key IN ({','.join('?' * len(keys))}) AND l.src_id != ? ORDER BY n.mtime DESC",
+                    keys + [nid])
+            ]
+            return {
+                "path": os.path.join(self.vault_path, path),
+                "title": title,
+                "mtime": mtime,
+                "frontmatter": json.loads(fm),
+                "tags": [r[0] for r in self.db.execute("SELECT tag FROM tags WHERE note_id = ? ORDER BY tag", (nid,))],
+                "headings": [{"level": lvl, "title": t, "line": line} for lvl, t, line in self.db.execute("SELECT level, title, line FROM headings WHERE note_id = ? ORDER BY line", (nid,))],
+                "links": outgoing,
+                "backlinks": backlinks,
+            }
+
+    def tags(self, prefix: Optional[str] = None, limit: int = 50) -> List[Tuple[str, int]]:
+        self.refresh()
+        with self._lock:
+            if prefix:
+                return self.db.execute("SELECT tag, COUNT(*) c FROM tags WHERE tag LIKE ? GROUP BY tag ORDER BY c DESC, tag LIMIT ?",
+                                       (prefix.lstrip("#").lower() + "%", int(limit))).fetchall()
+            return self.db.execute("SELECT tag, COUNT(*) c FROM tags GROUP BY tag ORDER BY c DESC, tag LIMIT ?", (int(limit),)).fetchall()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            notes, links, tags = self.db.execute("SELECT (SELECT COUNT(*) FROM notes), (SELECT COUNT(*) FROM links), (SELECT COUNT(DISTINCT tag) FROM tags)").fetchone()
+        return {"notes": notes, "links": links, "tags": tags}
+
+# --- FORMATTING ---
+def _date(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
+
+def format_notes(result: Dict[str, Any], elapsed_ms: float) -> str:
+    if not result["notes"]: return "Nenhuma nota encontrada com esses filtros."
+    lines = [f"{result['total']} nota(s) ({elapsed_ms:.0f} ms){', mostrando ' + str(len(result['notes'])) if result['total'] > len(result['notes']) else ''}:"]
+    for n in result["notes"]:
+        tags = f" #{' #'.join(n['tags'])}" if n["tags"] else ""
+        lines.append(f"- {n['path']} | {n['title']} | modificada {_date(n['mtime'])}{tags}")
+    return "\n".join(lines)
+
+def format_note_info(info: Optional[Dict[str, Any]], name: str) -> str:
+    if info is None: return f"Nota '{name}' não encontrada no índice."
+    lines = [f"{info['path']} | {info['title']} | modificada {_date(info['mtime'])}"]
+    if info["frontmatter"]: lines.append("Frontmatter: " + json.dumps(info["frontmatter"], ensure_ascii=False))
+    if info["tags"]: lines.append("Tags: #" + " #".join(info["tags"]))
+    if info["headings"]: lines.append("Títulos: " + " | ".join(f"L{h['line']} {'#' * h['level']} {h['title']}" for h in info["headings"]))
+    if info["links"]:
+        lines.append(f"Links ({len(info['links'])}):")
+        lines.extend(f"  - [[{l['target']}]] L{l['line']} -> {l['path'] or '(não existe)'}" for l in info["links"])
+    lines.append(f"Backlinks ({len(info['backlinks'])}):" if info["backlinks"] else "Backlinks: nenhum")
+    lines.extend(f"  - {b['path']} L{b['line']}" for b in info["backlinks"])
+    return "\n".join(lines)
@@ -0,0 +1,432 @@
+import os
+import re
+import sys
+import glob
+import time
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from vault_index import INDEXED_EXTENSIONS, SKIP_DIRS
+
+# --- CONFIGURATION ---
+DEFAULT_INDEX_DIR = os.path.join(".cache", "vault_embeddings")
+EMBED_BATCH = int(os.getenv("EMBED_BATCH", "32"))
+CHUNK_CHARS = int(os.getenv("EMBED_CHUNK_CHARS", "1200"))
+SNIPPET_CHARS = 160
+BLOCK_ROWS = 16384          # rows scored per matmul
+COMPACT_MIN_DEAD = 4096     # rows orphaned by edits before the matrix is rewritten...
+COMPACT_RATIO = 0.25        # ...and only once they are this share of it
+PUBLISH_INTERVAL = 5.0      # seconds between republishing the matrix while a build runs
+
+HEADING_RE = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$")
+
+# --- EMBEDDERS ---
+class LlamaEmbedder:
+    """GGUF embedding model run through llama.cpp (a second, small `Llama` in embedding mode)."""
+
+    def __init__(self, model_path: str, n_ctx: int = int(os.getenv("EMBED_N_CTX", "512")),
+                 n_gpu_layers: int = int(os.getenv("EMBED_GPU_LAYERS", "-1")), n_threads: int = 8):
+        from llama_cpp import Llama
+        self.name = os.path.basename(model_path)
+        self.llm = Llama(model_path=model_path, embedding=True, n_ctx=n_ctx, n_batch=n_ctx,
+                         n_gpu_layers=n_gpu_layers, n_threads=n_threads, verbose=False)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self.llm.embed(texts, truncate=True)
+
+def _as_matrix(vectors: Any) -> np.ndarray:
+    """(n, dim) float32 with unit rows, so cosine similarity is a dot product."""
+    rows = []
+    for v in vectors:
+        v = np.asarray(v, dtype=np.float32)
+        # models without a pooling layer return one vector per token
+        rows.append(v.mean(axis=0) if v.ndim == 2 else v)
+    matrix = np.vstack(rows)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+def quantize(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 quantization: row ~= q * scale."""
+    scales = np.abs(matrix).max(axis=1) / 127
+    scales[scales == 0] = 1
+    q = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return q, scales.astype(np.float32)
+
+# --- CHUNKING ---
+def chunk_note(text: str, max_chars: int = CHUNK_CHARS) -> List[Tuple[int, int, str, str]]:
+    """
+    Splits a note into (start_line, end_line, heading, text) chunks: a new chunk
+    at every heading, and within a section at paragraph breaks once `max_chars`
+    is reached. Line numbers are 1-based and match the file (frontmatter skipped).
+    """
+    lines = text.splitlines()
+    i = 0
+    if lines and lines[0].strip() == "---":
+        end = next((j for j in range(1, len(lines)) if lines[j].strip() in ("---", "...")), None)
+        if end is not None: i = end + 1
+
+    chunks = []
+    heading, buf, start, size = "", [], i + 1, 0
+
+    def flush(end_line: int):
+        body = "\n".join(buf).strip()
+        if body: chunks.append((start, end_line, heading, body))
+
+    for n in range(i, len(lines)):
+        line = lines[n]
+        m = HEADING_RE.match(line)
+        if m or (size >= max_chars and not line.strip()) or size + len(line) > max_chars * 2:
+            flush(n)
+            buf, start, size = [], n + 1, 0
+            if m: heading = m.group(2)
+        buf.append(line)
+        size += len(line) + 1
+    flush(len(lines))
+    return chunks
+
+# --- INDEX ---
+class SemanticIndex:
+    """
+    Embedding index of the vault's note chunks.
+
+    Vectors are unit-normalized, int8-quantized rows (plus one float32 scale
+    per row) appended to raw files and read back as a memory-mapped (rows, dim)
+    matrix; `chunks.sqlite` maps each row to its note, line range and heading.
+    Edited or deleted notes only drop their rows from the sidecar (the matrix
+    is compacted once enough rows are orphaned), so `refresh()` embeds just
+    the notes whose (mtime, size) changed.
+
+    Embedding never runs inside a query: the first `search()` starts the
+    build on a background thread and answers from whatever is embedded so
+    far (`indexing` tells whether the build is still going); the matrix is
+    republished every PUBLISH_INTERVAL seconds while it grows. After the
+    build, a background rescan runs every `refresh_interval` seconds.
+    """
+
+    def __init__(self, vault_path: str, index_dir: str = DEFAULT_INDEX_DIR, embedder: Optional[Any] = None,
+                 batch_size: int = EMBED_BATCH, chunk_chars: int = CHUNK_CHARS, refresh_interval: float = 30.0):
+        self.vault_path = os.path.abspath(os.path.expanduser(vault_path))
+        self.index_dir = index_dir
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.chunk_chars = chunk_chars
+        self.refresh_interval = refresh_interval
+        self._refreshed = False
+        self._lock = threading.Lock()           # guards the connection and the published matrix
+        self._refresh_lock = threading.Lock()   # one refresh at a time
+        self._embed_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._builder: Optional[threading.Thread] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._view: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+        os.makedirs(index_dir, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(index_dir, "chunks.sqlite"), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime REAL NOT NULL, size INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                path TEXT NOT NULL,
+                start_line INTEGER NOT NULL,
+                end_line INTEGER NOT NULL,
+                heading TEXT NOT NULL,
+                snippet TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_path ON chunks(path);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        """)
+        self.db.commit()
+        meta = dict(self.db.execute("SELECT key, value FROM meta"))
+        self.model = meta.get("model")
+        self.dim = int(meta["dim"]) if "dim" in meta else None
+        self.rows = int(meta.get("rows", 0))
+        self.generation = int(meta.get("generation", 0))
+        self._recover()
+        self._open()
+
+    # --- STORAGE ---
+    def _paths(self, generation: Optional[int] = None) -> Tuple[str, str]:
+        gen = self.generation if generation is None else generation
+        return os.path.join(self.index_dir, f"vectors.{gen}.i8"), os.path.join(self.index_dir, f"scales.{gen}.f32")
+
+    def _recover(self):
+        """Drops rows appended after the last committed batch and files of old generations."""
+        current = self._paths()
+        for path in glob.glob(os.path.join(self.index_dir, "vectors.*")) + glob.glob(os.path.join(self.index_dir, "scales.*")):
+            if path not in current: os.remove(path)
+        if not self.dim: return
+        for path, row_bytes in zip(current, (self.dim, 4)):
+            if os.path.exists(path) and os.path.getsize(path) != self.rows * row_bytes:
+                with open(path, "r+b") as f: f.truncate(self.rows * row_bytes)
+
+    def _open(self):
+        """(Re)maps the matrix and rebuilds the mask of rows still referenced by a chunk."""
+        if not self.rows or not self.dim:
+            self.matrix, self.scales, self.live = None, None, None
+            self._view = None
+            return
+        vectors, scales = self._paths()
+        self.matrix = np.memmap(vectors, dtype=np.int8, mode="r", shape=(self.rows, self.dim))
+        self.scales = np.memmap(scales, dtype=np.float32, mode="r", shape=(self.rows,))
+        live = np.zeros(self.rows, dtype=bool)
+        live[np.fromiter((r for (r,) in self.db.execute("SELECT row FROM chunks")), dtype=np.int64)] = True
+        self.live = live
+        # Published as one tuple, so a concurrent search never pairs a matrix with another size's mask
+        self._view = (self.matrix, self.scales, self.live)
+
+    def _set_meta(self, **values: Any):
+        self.db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [(k, str(v)) for k, v in values.items()])
+
+    def _reset(self, model: str):
+        """Embeddings of another model are not comparable: start over."""
+        with self.db:
+            self.db.execute("DELETE FROM chunks")
+            self.db.execute("DELETE FROM files")
+            self.db.execute("DELETE FROM meta")
+            self._set_meta(model=model, rows=0, generation=self.generation + 1)
+        self.model, self.dim, self.rows = model, None, 0
+        self.generation += 1
+        self._recover()
+
+    def append(self, vectors: Any, records: List[Tuple[str, int, int, str, str]], files: List[Tuple[str, float, int]] = ()):
+        """
+        Appends normalized vectors with their (path, start_line, end_line,
+        heading, snippet) records, then marks `files` as indexed. The vector
+        bytes are written before the sidecar commits, so a crash leaves at most
+        unreferenced tail rows, which `_recover()` truncates.
+        """
+        matrix = _as_matrix(vectors)
+        if self.dim is None:
+            self.dim = matrix.shape[1]
+        elif matrix.shape[1] != self.dim:
+            raise ValueError(f"Embedding dim {matrix.shape[1]} != index dim {self.dim}")
+        quantized, scales = quantize(matrix)
+        vectors_path, scales_path = self._paths()
+        with open(vectors_path, "ab") as f: f.write(quantized.tobytes())
+        with open(scales_path, "ab") as f: f.write(scales.tobytes())
+        with self.db:
+            self.db.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+                                [(self.rows + i, *rec) for i, rec in enumerate(records)])
+            self.db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", files)
+            self._set_meta(dim=self.dim, rows=self.rows + len(records), generation=self.generation)
+        self.rows += len(records)
+
+    def _compact(self):
+        """Rewrites the matrix without orphaned rows into the next generation files."""
+        keep = [r for (r,) in self.db.execute("SELECT row FROM chunks ORDER BY row")]
+        old = self._paths()
+        for path, target, dtype, shape in zip(old, self._paths(self.generation + 1), (np.int8, np.float32), ((self.rows, self.dim), (self.rows,))):
+            data = np.memmap(path, dtype=dtype, mode="r", shape=shape)
+            with open(target, "wb") as f:
+                for i in range(0, len(keep), BLOCK_ROWS):
+                    f.write(np.ascontiguousarray(data[keep[i:i + BLOCK_ROWS]]).tobytes())
+            del data
+        # renumbering in ascending order never collides: every new row <= its old row
+        with self.db:
+            self.db.executemany("UPDATE chunks SET row = ? WHERE row = ?", [(new, old_row) for new, old_row in enumerate(keep) if new != old_row])
+            self._set_meta(rows=len(keep), generation=self.generation + 1)
+        self.rows = len(keep)
+        self.generation += 1
+        self._recover()
+
+    # --- MAINTENANCE ---
+    def _embedder(self) -> Any:
+        if self.embedder is None:
+            model_path = os.getenv("EMBED_MODEL_PATH")
+            if not model_path or not os.path.exists(model_path):
+                raise ValueError("EMBED_MODEL_PATH não configurado ou inexistente.")
+            self.embedder = LlamaEmbedder(model_path)
+        return self.embedder
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        embedder = self._embedder()
+        with self._embed_lock:
+            return _as_matrix(embedder.embed(texts))
+
+    def _scan(self) -> Dict[str, Tuple[float, int]]:
+        found = {}
+        for root, dirs, files in os.walk(self.vault_path):
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith(".")]
+            for name in files:
+                if not name.endswith(INDEXED_EXTENSIONS): continue
+                full = os.path.join(root, name)
+                try: st = os.stat(full)
+                except OSError: continue
+                found[os.path.relpath(full, self.vault_path)] = (st.st_mtime, st.st_size)
+        return found
+
+    def refresh(self, force: bool = False) -> Dict[str, int]:
+        """
+        Embeds new and changed notes in batches of `batch_size` chunks. Returns
+        change counts. Without `force`, only the first call does anything.
+        """
+        idle = {"added": 0, "updated": 0, "removed": 0, "chunks": 0}
+        if self._refreshed and not force: return idle
+        with self._refresh_lock:
+            if self._refreshed and not force: return idle
+
+            model = getattr(self._embedder(), "name", type(self.embedder).__name__)
+            if model != self.model:
+                with self._lock:
+                    self._reset(model)
+                    self._open()
+
+            # Only the bookkeeping takes the connection lock; walking, chunking and embedding run beside searches
+            on_disk = self._scan()
+            with self._lock:
+                known = {p: (m, s) for p, m, s in self.db.execute("SELECT path, mtime, size FROM files")}
+            removed = [p for p in known if p not in on_disk]
+            changed = sorted(p for p, stat in on_disk.items() if known.get(p) != stat)
+            with self._lock, self.db:
+                for path in removed + changed:
+                    self.db.execute("DELETE FROM chunks WHERE path = ?", (path,))
+                    self.db.execute("DELETE FROM files WHERE path = ?", (path,))
+
+            pending: List[Tuple[str, Tuple[int, int, str, str], Optional[Tuple[float, int]]]] = []
+            embedded = 0
+            published = time.monotonic()
+            for path in changed:
+                title = os.path.splitext(os.path.basename(path))[0]
+                try:
+                    with open(os.path.join(self.vault_path, path), "r", encoding="utf-8", errors="replace") as f:
+                        chunks = chunk_note(f.read(), self.chunk_chars)
+                except OSError:
+                    continue
+                if not chunks:
+                    with self._lock, self.db: self.db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", (path, *on_disk[path]))
+                # a note is marked indexed together with its last chunk
+                for i, chunk in enumerate(chunks):
+                    pending.append((path, (title,) + chunk, on_disk[path] if i == len(chunks) - 1 else None))
+                while len(pending) >= self.batch_size:
+                    embedded += self._flush(pending[:self.batch_size])
+                    del pending[:self.batch_size]
+                if time.monotonic() - published >= PUBLISH_INTERVAL:
+                    with self._lock: self._open()  # searches see the notes embedded so far
+                    published = time.monotonic()
+            if pending: embedded += self._flush(pending)
+
+            with self._lock:
+                dead = self.rows - self.db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+                if dead >= COMPACT_MIN_DEAD and dead >= self.rows * COMPACT_RATIO: self._compact()
+                self._open()
+            self._refreshed = True
+            self._watch()
+            return {"added": sum(p not in known for p in changed), "updated": sum(p in known for p in changed),
+                    "removed": len(removed), "chunks": embedded}
+
+    def start(self):
+        """Starts the first build in the background (once); raises right away if no embedder is configured."""
+        if self._refreshed or self._builder is not None: return
+        self._embedder()
+        with self._lock:
+            if self._builder is not None: return
+            self._builder = threading.Thread(target=self._build, name="vault-semantic-build", daemon=True)
+            self._builder.start()
+
+    def _build(self):
+        try: self.refresh()
+        except Exception as e: print(f"⚠️  Semantic index build failed: {e}")
+        finally:
+            if not self._refreshed: self._builder = None  # the next search tries again
+
+    @property
+    def indexing(self) -> bool:
+        return not self._refreshed and self._builder is not None
+
+    def _watch(self):
+        if not 0 < self.refresh_interval < float("inf") or self._watcher is not None or self._stop.is_set(): return
+        self._watcher = threading.Thread(target=self._watch_loop, name="vault-semantic-refresh", daemon=True)
+        self._watcher.start()
+
+    def _watch_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            try: self.refresh(force=True)
+            except Exception as e: print(f"⚠️  Semantic index refresh failed: {e}")
+
+    def close(self):
+        """Stops the background threads after their current batch."""
+        self._stop.set()
+        for thread in (self._builder, self._watcher):
+            if thread is not None and thread is not threading.current_thread(): thread.join()
+        with self._lock: self.db.close()
+
+    def _flush(self, batch: List[Tuple[str, Tuple[str, int, int, str, str], Optional[Tuple[float, int]]]]) -> int:
+        texts = [f"{title} > {heading}\n{body}" if heading else f"{title}\n{body}" for _, (title, _, _, heading, body), _ in batch]
+        vectors = self.embed(texts)
+        records = [(path, start, end, heading, " ".join(body.split())[:SNIPPET_CHARS]) for path, (_, start, end, heading, body), _ in batch]
+        files = [(path, *stat) for path, _, stat in batch if stat is not None]
+        with self._lock: self.append(vectors, records, files)
+        return len(batch)
+
+    # --- QUERY ---
+    def search(self, query: str, limit: int = 10, per_note: int = 1) -> List[Dict[str, Any]]:
+        """Chunks most similar to `query`, at most `per_note` per note, best first, among the notes embedded so far."""
+        self.start()
+        if self._view is None: return []
+        q = self.embed([query])[0]
+        results, seen = [], {}
+        # Scored and looked up under one lock hold, so a compaction cannot renumber the rows in between
+        with self._lock:
+            if self._view is None: return []
+            rows, scores = top_k(*self._view[:2], q, self._view[2], limit * max(per_note, 3))
+            for row, score in zip(rows.tolist(), scores.tolist()):
+                rec = self.db.execute("SELECT path, start_line, end_line, heading, snippet FROM chunks WHERE row = ?", (row,)).fetchone()
+                if rec is None or seen.get(rec[0], 0) >= per_note: continue
+                seen[rec[0]] = seen.get(rec[0], 0) + 1
+                results.append({"path": os.path.join(self.vault_path, rec[0]), "start_line": rec[1], "end_line": rec[2],
+                                "heading": rec[3], "snippet": rec[4], "score": round(score, 4)})
+                if len(results) >= limit: break
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            notes, chunks = self.db.execute("SELECT (SELECT COUNT(*) FROM files), (SELECT COUNT(*) FROM chunks)").fetchone()
+        return {"notes": notes, "chunks": chunks, "rows": self.rows, "dim": self.dim, "model": self.model, "indexing": self.indexing,
+                "bytes": sum(os.path.getsize(p) for p in self._paths() if os.path.exists(p))}
+
+def top_k(matrix: np.ndarray, scales: np.ndarray, query: np.ndarray, live: Optional[np.ndarray], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Rows of the int8 `matrix` (times their `scales`) with the highest dot
+    product with `query`, scored in blocks of BLOCK_ROWS so a query touches
+    the mapped pages once and never holds a float copy of the whole matrix.
+    """
+    query = query.astype(np.float32)
+    cand_rows, cand_scores = [], []
+    for start in range(0, matrix.shape[0], BLOCK_ROWS):
+        scores = (matrix[start:start + BLOCK_ROWS] @ query) * scales[start:start + BLOCK_ROWS]
+        if live is not None: scores[~live[start:start + BLOCK_ROWS]] = -np.inf
+        idx = np.argpartition(scores, -k)[-k:] if len(scores) > k else np.arange(len(scores))
+        cand_rows.append(idx + start)
+        cand_scores.append(scores[idx])
+    rows, scores = np.concatenate(cand_rows), np.concatenate(cand_scores)
+    order = np.argsort(-scores)[:k]
+    keep = np.isfinite(scores[order])
+    return rows[order][keep], scores[order][keep]
+
+def format_results(query: str, results: List[Dict[str, Any]], elapsed_ms: float) -> str:
+    if not results: return f"Nenhuma nota semanticamente próxima de '{query}'."
+    lines = [f"{len(results)} nota(s) próximas de '{query}' ({elapsed_ms:.0f} ms):"]
+    for r in results:
+        section = f" [{r['heading']}]" if r["heading"] else ""
+        lines.append(f"- {r['path']}:{r['start_line']}-{r['end_line']}{section} (similaridade {r['score']:.2f}) {r['snippet']}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    # Usage: python vault_semantic.py index | python vault_semantic.py "consulta"
+    from dotenv import load_dotenv
+    load_dotenv()
+    vault = os.getenv("OBSIDIAN_VAULT_PATH")
+    if not vault or len(sys.argv) < 2: sys.exit('Usage: python vault_semantic.py index | "consulta"  (OBSIDIAN_VAULT_PATH, EMBED_MODEL_PATH)')
+    index = SemanticIndex(vault, index_dir=os.getenv("EMBED_INDEX_DIR", DEFAULT_INDEX_DIR))
+    if sys.argv[1] == "index":
+        start = time.perf_counter()
+        print(index.refresh(force=True), f"{time.perf_counter() - start:.1f}s", index.stats())
+    else:
+        start = time.perf_counter()
+        results = index.search(" ".join(sys.argv[1:]))
+        print(format_results(" ".join(sys.argv[1:]), results, (time.perf_counter() - start) * 1000))